@@ -0,0 +1,260 @@
+from collections import defaultdict
+from datetime import date as date_type, datetime, timedelta, time
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import Count, Sum, Q, F
+from django.db.models.functions import TruncWeek
+from django.utils import timezone
+from .models import (
+    Appointment, ArchivedAppointment, VeterinarianSchedule, AppointmentBlock, AgendaChange,
+    DailyUtilization, DailyCapacity, RollupCursor
+)
+from .availability import day_of_week, merge_intervals, to_local_naive
+from .changes import changes_since
+
+CURSOR_NAME = 'utilization'
+
+def _minutes(start, end):
+    return int((end - start).total_seconds() // 60)
+
+def _dates(start_date, end_date):
+    return [start_date + timedelta(days=offset) for offset in range((end_date - start_date).days + 1)]
+
+def _capacity(veterinarian_ids, start_date, end_date):
+    """{(veterinarian_id, fecha): (minutos de jornada, minutos bloqueados)} de los días con horario"""
+    schedules = {
+        (schedule.veterinarian_id, schedule.day_of_week): schedule
+        for schedule in VeterinarianSchedule.objects.filter(veterinarian_id__in=veterinarian_ids, is_active=True)
+    }
+    blocks = defaultdict(list)
+    for block in AppointmentBlock.objects.filter(
+        veterinarian_id__in=veterinarian_ids,
+        is_active=True,
+        start_datetime__lt=timezone.make_aware(datetime.combine(end_date + timedelta(days=1), time.min)),
+        end_datetime__gt=timezone.make_aware(datetime.combine(start_date, time.min))
+    ):
+        blocks[block.veterinarian_id].append(
+            (to_local_naive(block.start_datetime), to_local_naive(block.end_datetime))
+        )
+
+    capacity = {}
+    for veterinarian_id in veterinarian_ids:
+        for date in _dates(start_date, end_date):
+            schedule = schedules.get((veterinarian_id, day_of_week(date)))
+            if schedule is None:
+                continue
+            work_start = datetime.combine(date, schedule.start_time)
+            work_end = datetime.combine(date, schedule.end_time)
+            blocked = merge_intervals(
+                (max(start, work_start), min(end, work_end))
+                for start, end in blocks[veterinarian_id]
+                if start < work_end and end > work_start
+            )
+            capacity[(veterinarian_id, date)] = (
+                _minutes(work_start, work_end),
+                sum(_minutes(start, end) for start, end in blocked)
+            )
+    return capacity
+
+def refresh_days(vet_days):
+    """Recalcular el resumen de los (veterinario, fecha) indicados con agregados agrupados"""
+    vet_days = set(vet_days)
+    if not vet_days:
+        return 0
+    veterinarian_ids = sorted({vet_id for vet_id, _ in vet_days})
+    start_date = min(date for _, date in vet_days)
+    end_date = max(date for _, date in vet_days)
+
+    # Los días viejos pueden tener citas en la tabla de archivo
+    usage = [
+        row
+        for model in (Appointment, ArchivedAppointment)
+        for row in model.objects.filter(
+            veterinarian_id__in=veterinarian_ids,
+            appointment_date__range=(start_date, end_date)
+        ).values('veterinarian_id', 'appointment_date', 'appointment_type').annotate(
+            total=Count('id'),
+            booked=Sum('duration_minutes', filter=~Q(status=Appointment.Status.CANCELLED)),
+            no_show_count=Count('id', filter=Q(status=Appointment.Status.NO_SHOW)),
+            cancellation_count=Count('id', filter=Q(status=Appointment.Status.CANCELLED)),
+        ).order_by()
+    ]
+    capacity = _capacity(veterinarian_ids, start_date, end_date)
+
+    totals = defaultdict(lambda: [0, 0, 0, 0])
+    for row in usage:
+        if (row['veterinarian_id'], row['appointment_date']) not in vet_days:
+            continue
+        total = totals[(row['veterinarian_id'], row['appointment_date'], row['appointment_type'])]
+        total[0] += row['total']
+        total[1] += row['booked'] or 0
+        total[2] += row['no_show_count']
+        total[3] += row['cancellation_count']
+
+    utilization_rows = [
+        DailyUtilization(
+            veterinarian_id=vet_id,
+            date=date,
+            appointment_type=appointment_type,
+            appointments=appointments,
+            booked_minutes=booked,
+            no_shows=no_shows,
+            cancellations=cancellations,
+        )
+        for (vet_id, date, appointment_type), (appointments, booked, no_shows, cancellations) in totals.items()
+    ]
+    capacity_rows = [
+        DailyCapacity(
+            veterinarian_id=vet_id, date=date, scheduled_minutes=scheduled, blocked_minutes=blocked
+        )
+        for (vet_id, date), (scheduled, blocked) in capacity.items()
+        if (vet_id, date) in vet_days
+    ]
+
+    dates_by_veterinarian = defaultdict(list)
+    for vet_id, date in vet_days:
+        dates_by_veterinarian[vet_id].append(date)
+
+    # Upsert en vez de borrar e insertar: otro refresco de los mismos días
+    # puede insertar entre ambos pasos y el insert fallaría por la clave única
+    with transaction.atomic():
+        _upsert(DailyUtilization, utilization_rows, ['veterinarian_id', 'date', 'appointment_type'],
+                ['appointments', 'booked_minutes', 'no_shows', 'cancellations'])
+        _upsert(DailyCapacity, capacity_rows, ['veterinarian_id', 'date'], ['scheduled_minutes', 'blocked_minutes'])
+        # Solo se borran los tipos y días que ya no tienen citas ni horario
+        kept_types = {(row.veterinarian_id, row.date, row.appointment_type) for row in utilization_rows}
+        kept_days = {(row.veterinarian_id, row.date) for row in capacity_rows}
+        for vet_id, dates in dates_by_veterinarian.items():
+            stale = [
+                row_id for row_id, date, appointment_type in DailyUtilization.objects.filter(
+                    veterinarian_id=vet_id, date__in=dates
+                ).values_list('id', 'date', 'appointment_type')
+                if (vet_id, date, appointment_type) not in kept_types
+            ]
+            if stale:
+                DailyUtilization.objects.filter(id__in=stale).delete()
+            DailyCapacity.objects.filter(veterinarian_id=vet_id, date__in=[
+                date for date in dates if (vet_id, date) not in kept_days
+            ]).delete()
+    return len(vet_days)
+
+def _upsert(model, rows, unique_fields, update_fields):
+    # MySQL resuelve el conflicto con cualquier clave única y no acepta unique_fields
+    model.objects.bulk_create(
+        rows, update_conflicts=True, update_fields=update_fields,
+        unique_fields=unique_fields if connection.features.supports_update_conflicts_with_target else None
+    )
+
+def refresh_range(start_date, end_date, veterinarian_ids=None):
+    """Resumir todos los días del rango; sin IDs, los veterinarios con horario o citas"""
+    if veterinarian_ids is None:
+        veterinarian_ids = set(
+            VeterinarianSchedule.objects.filter(is_active=True).values_list('veterinarian_id', flat=True)
+        )
+        for model in (Appointment, ArchivedAppointment):
+            veterinarian_ids |= set(
+                model.objects.filter(appointment_date__range=(start_date, end_date))
+                .order_by().values_list('veterinarian_id', flat=True).distinct()
+            )
+    dates = _dates(start_date, end_date)
+    return refresh_days((vet_id, date) for vet_id in veterinarian_ids for date in dates)
+
+def refresh_pending():
+    """
+    Aplicar los cambios de agenda posteriores al cursor del resumen. Solo se
+    recalculan los días afectados; un cambio de horario recalcula los días ya
+    resumidos del veterinario desde hoy.
+    """
+    cursor, _ = RollupCursor.objects.get_or_create(name=CURSOR_NAME)
+    changes = changes_since(cursor.last_change_id)
+    if not changes:
+        return 0
+
+    vet_days = set()
+    today = date_type.today()
+    for change in changes:
+        if change.entity == AgendaChange.Entity.SCHEDULE:
+            vet_days.update(
+                (change.veterinarian_id, date)
+                for date in DailyCapacity.objects.filter(
+                    veterinarian_id=change.veterinarian_id, date__gte=today
+                ).values_list('date', flat=True)
+            )
+        elif change.start_date:
+            vet_days.update((change.veterinarian_id, date) for date in _dates(change.start_date, change.end_date))
+
+    refresh_days(vet_days)
+    cursor.last_change_id = changes[-1].sequence
+    cursor.save()
+    return len(changes)
+
+def _rate(part, total):
+    return round(part / total, 4) if total else 0.0
+
+def utilization_report(start_date, end_date, veterinarian_ids=None, group_by='day'):
+    """
+    Minutos reservados y libres, tasa de inasistencia y de cancelación por
+    veterinario y día o semana, y por tipo de cita. Tres consultas agrupadas
+    sobre el resumen diario, sin importar la longitud del rango.
+    """
+    period = TruncWeek('date') if group_by == 'week' else F('date')
+    utilization = DailyUtilization.objects.filter(date__range=(start_date, end_date))
+    capacity = DailyCapacity.objects.filter(date__range=(start_date, end_date))
+    if veterinarian_ids is not None:
+        utilization = utilization.filter(veterinarian_id__in=veterinarian_ids)
+        capacity = capacity.filter(veterinarian_id__in=veterinarian_ids)
+
+    totals = dict(
+        appointments=Sum('appointments'),
+        booked=Sum('booked_minutes'),
+        no_show_count=Sum('no_shows'),
+        cancellation_count=Sum('cancellations'),
+    )
+
+    periods = defaultdict(lambda: {
+        'scheduled_minutes': 0, 'blocked_minutes': 0, 'booked_minutes': 0,
+        'appointments': 0, 'no_shows': 0, 'cancellations': 0,
+    })
+    for row in capacity.annotate(period=period).values('veterinarian_id', 'period').annotate(
+        scheduled=Sum('scheduled_minutes'), blocked=Sum('blocked_minutes')
+    ).order_by():
+        entry = periods[(row['veterinarian_id'], row['period'])]
+        entry['scheduled_minutes'] = row['scheduled']
+        entry['blocked_minutes'] = row['blocked']
+    for row in utilization.annotate(period=period).values('veterinarian_id', 'period').annotate(**totals).order_by():
+        entry = periods[(row['veterinarian_id'], row['period'])]
+        entry['booked_minutes'] = row['booked']
+        entry['appointments'] = row['appointments']
+        entry['no_shows'] = row['no_show_count']
+        entry['cancellations'] = row['cancellation_count']
+
+    results = []
+    for (vet_id, period_start), entry in sorted(periods.items()):
+        if isinstance(period_start, datetime):
+            period_start = period_start.date()
+        attended = entry['appointments'] - entry['cancellations']
+        available = entry['scheduled_minutes'] - entry['blocked_minutes']
+        results.append({
+            'veterinarian_id': vet_id,
+            'period': period_start,
+            **entry,
+            'free_minutes': max(available - entry['booked_minutes'], 0),
+            'utilization_rate': _rate(entry['booked_minutes'], available),
+            'no_show_rate': _rate(entry['no_shows'], attended),
+            'cancellation_rate': _rate(entry['cancellations'], entry['appointments']),
+        })
+
+    by_type = []
+    for row in utilization.values('veterinarian_id', 'appointment_type').annotate(**totals).order_by(
+        'veterinarian_id', 'appointment_type'
+    ):
+        by_type.append({
+            'veterinarian_id': row['veterinarian_id'],
+            'appointment_type': row['appointment_type'],
+            'appointments': row['appointments'],
+            'booked_minutes': row['booked'],
+            'no_show_rate': _rate(row['no_show_count'], row['appointments'] - row['cancellation_count']),
+            'cancellation_rate': _rate(row['cancellation_count'], row['appointments']),
+        })
+
+    return {'results': results, 'by_appointment_type': by_type}
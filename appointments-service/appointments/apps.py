@@ -4,4 +4,7 @@ from django.apps import AppConfig
 class AppointmentsConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'appointments'
-    verbose_name = 'Citas Médicas' 
\ No newline at end of file
+    verbose_name = 'Citas Médicas'
+
+    def ready(self):
+        from . import signals  # noqa: F401
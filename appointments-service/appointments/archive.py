@@ -0,0 +1,67 @@
+from datetime import date, timedelta
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connection, transaction
+from django.db.models import Max
+from .models import Appointment, ArchivedAppointment, WaitlistEntry
+
+WATERMARK_KEY = 'appointments:archive:watermark'
+
+# Solo se archivan citas que ya no pueden cambiar de estado
+ARCHIVABLE_STATUSES = (
+    Appointment.Status.COMPLETED,
+    Appointment.Status.CANCELLED,
+    Appointment.Status.NO_SHOW,
+)
+
+def archive_cutoff(after_days=None):
+    """Primer día que se conserva en la tabla de citas vigentes"""
+    after_days = settings.APPOINTMENT_ARCHIVE_AFTER_DAYS if after_days is None else after_days
+    return date.today() - timedelta(days=after_days)
+
+def archive_watermark():
+    """Fecha de la cita archivada más reciente, o None si el archivo está vacío"""
+    value = cache.get(WATERMARK_KEY)
+    if value is None:
+        latest = ArchivedAppointment.objects.aggregate(latest=Max('appointment_date'))['latest']
+        value = latest.isoformat() if latest else ''
+        cache.set(WATERMARK_KEY, value, timeout=None)
+    return date.fromisoformat(value) if value else None
+
+def _advance_watermark(latest):
+    current = archive_watermark()
+    if current is None or latest > current:
+        cache.set(WATERMARK_KEY, latest.isoformat(), timeout=None)
+
+def archive_batch(cutoff, batch_size):
+    """
+    Mover a la tabla de archivo hasta `batch_size` citas finalizadas anteriores
+    a `cutoff`, las más antiguas primero. Devuelve cuántas se movieron.
+    """
+    fields = [field.attname for field in Appointment._meta.concrete_fields]
+    with transaction.atomic():
+        appointments = list(Appointment.objects.select_for_update(skip_locked=True).filter(
+            appointment_date__lt=cutoff,
+            status__in=ARCHIVABLE_STATUSES
+        ).order_by('appointment_date', 'appointment_time')[:batch_size])
+        if not appointments:
+            return 0
+
+        ids = [appointment.id for appointment in appointments]
+        ArchivedAppointment.objects.bulk_create([
+            ArchivedAppointment(**{field: getattr(appointment, field) for field in fields})
+            for appointment in appointments
+        ])
+        # Lo que haría on_delete=SET_NULL, que el borrado directo no aplica
+        WaitlistEntry.objects.filter(offered_appointment_id__in=ids).update(offered_appointment=None)
+        # SQL directo en vez de delete(): las señales post_delete recalcularían
+        # agenda y ocupación, y archivar no cambia ninguna de las dos
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'DELETE FROM {connection.ops.quote_name(Appointment._meta.db_table)} '
+                f'WHERE id IN ({", ".join(["%s"] * len(ids))})',
+                ids
+            )
+
+    _advance_watermark(max(appointment.appointment_date for appointment in appointments))
+    return len(ids)
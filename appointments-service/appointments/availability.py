@@ -0,0 +1,266 @@
+import heapq
+from collections import defaultdict
+from itertools import islice
+from datetime import datetime, timedelta, time
+from django.conf import settings
+from django.utils import timezone
+from .models import Appointment, VeterinarianSchedule, AppointmentBlock
+from .schedules import schedule_cache
+
+# Estados de cita que ocupan el horario del veterinario
+ACTIVE_STATUSES = (
+    Appointment.Status.SCHEDULED,
+    Appointment.Status.CONFIRMED,
+    Appointment.Status.IN_PROGRESS,
+)
+
+def day_of_week(date):
+    """Día de la semana de VeterinarianSchedule para una fecha"""
+    return VeterinarianSchedule.DayOfWeek.values[date.weekday()]
+
+def to_local_naive(value):
+    """Convertir un datetime con zona horaria a hora local sin zona"""
+    if timezone.is_aware(value):
+        return timezone.localtime(value).replace(tzinfo=None)
+    return value
+
+def merge_intervals(intervals):
+    """Unir intervalos (inicio, fin) solapados o contiguos; devuelve una lista ordenada"""
+    merged = []
+    for start, end in sorted(intervals):
+        if merged and start <= merged[-1][1]:
+            if end > merged[-1][1]:
+                merged[-1] = (merged[-1][0], end)
+        else:
+            merged.append((start, end))
+    return merged
+
+def free_intervals(work_start, work_end, busy):
+    """
+    Barrido sobre intervalos ocupados ordenados por inicio: devuelve los huecos
+    libres dentro de la jornada [work_start, work_end)
+    """
+    free = []
+    cursor = work_start
+    for start, end in busy:
+        if start >= work_end:
+            break
+        if start > cursor:
+            free.append((cursor, start))
+        if end > cursor:
+            cursor = end
+    if cursor < work_end:
+        free.append((cursor, work_end))
+    return free
+
+class AvailabilityEngine:
+    """
+    Calcula la disponibilidad de uno o varios veterinarios en un rango de fechas.
+
+    Las citas del rango se cargan con una consulta; los horarios salen del
+    caché del proceso (schedules.py) y los bloqueos del índice en caché de
+    cada veterinario (blocks.py). Después todo se resuelve en memoria, así
+    que el número de consultas no depende de la duración de la jornada ni de
+    la cantidad de días.
+
+    Con `fresh_blocks` los bloqueos se leen de la base de datos en vez del
+    caché, para verificar reservas bajo el bloqueo del día del veterinario.
+    """
+
+    def __init__(self, veterinarian_ids, start_date, end_date=None, fresh_blocks=False):
+        # None: todos los veterinarios con horario, citas o bloqueos en el rango
+        self.veterinarian_ids = (
+            None if veterinarian_ids is None
+            else sorted({int(vet_id) for vet_id in veterinarian_ids})
+        )
+        self.start_date = start_date
+        self.end_date = end_date or start_date
+        self.fresh_blocks = fresh_blocks
+        self._load()
+
+    def _filter(self, queryset):
+        if self.veterinarian_ids is None:
+            return queryset
+        return queryset.filter(veterinarian_id__in=self.veterinarian_ids)
+
+    def _load(self):
+        # Horarios de todos los veterinarios desde la memoria del proceso
+        self.schedules = schedule_cache.all()
+
+        self.appointments = defaultdict(list)
+        for appointment in self._filter(Appointment.objects.filter(
+            appointment_date__range=(self.start_date, self.end_date)
+        )).order_by('appointment_date', 'appointment_time'):
+            self.appointments[(appointment.veterinarian_id, appointment.appointment_date)].append(appointment)
+
+        # Índice de bloqueos por veterinario: del caché si se conocen los
+        # veterinarios; si no, se arma con los bloqueos del rango
+        from .blocks import BlockIndex, get_block_indexes
+        if self.veterinarian_ids is not None and not self.fresh_blocks:
+            self.blocks = get_block_indexes(self.veterinarian_ids)
+        else:
+            range_start = timezone.make_aware(datetime.combine(self.start_date, time.min))
+            range_end = timezone.make_aware(datetime.combine(self.end_date + timedelta(days=1), time.min))
+            blocks = defaultdict(list)
+            for block in self._filter(AppointmentBlock.objects.filter(
+                is_active=True,
+                start_datetime__lt=range_end,
+                end_datetime__gt=range_start
+            )):
+                blocks[block.veterinarian_id].append(block)
+            self.blocks = {vet_id: BlockIndex.from_blocks(vet_blocks) for vet_id, vet_blocks in blocks.items()}
+
+        if self.veterinarian_ids is None:
+            self.veterinarian_ids = sorted(
+                {vet_id for vet_id, _ in self.schedules}
+                | {vet_id for vet_id, _ in self.appointments}
+                | {vet_id for vet_id, index in self.blocks.items() if index.intervals}
+            )
+
+    def dates(self):
+        current = self.start_date
+        while current <= self.end_date:
+            yield current
+            current += timedelta(days=1)
+
+    def working_hours(self, veterinarian_id, date):
+        """Jornada (inicio, fin) del veterinario en la fecha, o None si no trabaja"""
+        schedule = self.schedules.get((int(veterinarian_id), day_of_week(date)))
+        if schedule is None:
+            return None
+        return (
+            datetime.combine(date, schedule.start_time),
+            datetime.combine(date, schedule.end_time),
+        )
+
+    def appointments_for(self, veterinarian_id, date):
+        return self.appointments.get((int(veterinarian_id), date), [])
+
+    def blocks_for(self, veterinarian_id, date):
+        """Bloqueos del veterinario que tocan la fecha, como (inicio, fin, razón) en hora local"""
+        index = self.blocks.get(int(veterinarian_id))
+        if index is None:
+            return []
+        day_start = datetime.combine(date, time.min)
+        day_end = day_start + timedelta(days=1)
+        return [
+            (max(start, day_start), min(end, day_end), reason)
+            for start, end, reason in index.overlapping(day_start, day_end)
+        ]
+
+    def busy_intervals(self, veterinarian_id, date):
+        """Intervalos ocupados por citas activas y bloqueos, unidos y ordenados"""
+        busy = []
+        for appointment in self.appointments_for(veterinarian_id, date):
+            if appointment.status in ACTIVE_STATUSES:
+                start = datetime.combine(date, appointment.appointment_time)
+                busy.append((start, start + timedelta(minutes=appointment.duration_minutes)))
+        busy.extend((start, end) for start, end, _ in self.blocks_for(veterinarian_id, date))
+        return merge_intervals(busy)
+
+    def slot_conflict(self, veterinarian_id, date, start_time, duration_minutes, exclude_ids=()):
+        """Motivo por el que el horario no se puede reservar, o None si está libre"""
+        hours = self.working_hours(veterinarian_id, date)
+        if hours is None:
+            return 'El veterinario no tiene horario configurado para este día'
+
+        start = datetime.combine(date, start_time)
+        end = start + timedelta(minutes=duration_minutes)
+        if start < hours[0] or end > hours[1]:
+            return (
+                f'El veterinario no está disponible a esta hora. '
+                f'Horario: {hours[0].time()}-{hours[1].time()}'
+            )
+
+        for appointment in self.appointments_for(veterinarian_id, date):
+            if appointment.status not in ACTIVE_STATUSES or appointment.id in exclude_ids:
+                continue
+            existing_start = datetime.combine(date, appointment.appointment_time)
+            existing_end = existing_start + timedelta(minutes=appointment.duration_minutes)
+            if start < existing_end and existing_start < end:
+                return f'Conflicto con cita existente de {appointment.appointment_time} a {appointment.end_time}'
+
+        for block_start, block_end, _ in self.blocks_for(veterinarian_id, date):
+            if start < block_end and block_start < end:
+                return 'El veterinario tiene el horario bloqueado en este momento'
+        return None
+
+    def free_intervals(self, veterinarian_id, date):
+        hours = self.working_hours(veterinarian_id, date)
+        if hours is None:
+            return []
+        return free_intervals(hours[0], hours[1], self.busy_intervals(veterinarian_id, date))
+
+    def available_slots(self, veterinarian_id, date, duration_minutes=None, step_minutes=None):
+        """
+        Horas de inicio en las que cabe una cita de `duration_minutes`. Los
+        inicios se alinean a una grilla de `step_minutes` desde el inicio de la jornada.
+        """
+        hours = self.working_hours(veterinarian_id, date)
+        if hours is None:
+            return []
+
+        duration = timedelta(minutes=duration_minutes or settings.APPOINTMENT_DURATION_MINUTES)
+        step = timedelta(minutes=step_minutes or settings.APPOINTMENT_DURATION_MINUTES)
+        work_start = hours[0]
+
+        slots = []
+        for free_start, free_end in self.free_intervals(veterinarian_id, date):
+            # Primer punto de la grilla dentro del intervalo libre
+            steps = -((work_start - free_start) // step)
+            current = work_start + steps * step
+            while current + duration <= free_end:
+                slots.append(current.time())
+                current += step
+        return slots
+
+    def day_agenda(self, veterinarian_id, date, duration_minutes=None):
+        """Citas, horarios disponibles y bloqueos del veterinario en la fecha"""
+        return {
+            'appointments': self.appointments_for(veterinarian_id, date),
+            'available_slots': self.available_slots(veterinarian_id, date, duration_minutes),
+            'blocked_periods': self.blocked_periods(veterinarian_id, date),
+        }
+
+    def blocked_periods(self, veterinarian_id, date):
+        return [
+            {
+                'start': start.time(),
+                'end': end.time() if end.date() == date else time.max,
+                'reason': reason
+            }
+            for start, end, reason in self.blocks_for(veterinarian_id, date)
+        ]
+
+def next_available_slots(veterinarian_ids, duration_minutes, limit, start, horizon_days, window_days=7):
+    """
+    Primeros `limit` inicios libres (datetime, veterinario) a partir de `start`.
+
+    El horizonte se recorre en ventanas de `window_days`; en cada ventana se
+    mezclan con un heap los flujos ordenados de cada veterinario y la búsqueda
+    termina en cuanto se reúnen los resultados pedidos.
+    """
+    results = []
+    window_start = start.date()
+    horizon_end = window_start + timedelta(days=horizon_days - 1)
+
+    while window_start <= horizon_end and len(results) < limit:
+        window_end = min(window_start + timedelta(days=window_days - 1), horizon_end)
+        engine = AvailabilityEngine(veterinarian_ids, window_start, window_end)
+
+        streams = [
+            _slot_stream(engine, veterinarian_id, duration_minutes, start)
+            for veterinarian_id in engine.veterinarian_ids
+        ]
+        results.extend(islice(heapq.merge(*streams), limit - len(results)))
+        window_start = window_end + timedelta(days=1)
+
+    return results
+
+def _slot_stream(engine, veterinarian_id, duration_minutes, not_before):
+    """Flujo perezoso y ordenado de inicios libres de un veterinario"""
+    for date in engine.dates():
+        for slot in engine.available_slots(veterinarian_id, date, duration_minutes):
+            slot_datetime = datetime.combine(date, slot)
+            if slot_datetime >= not_before:
+                yield (slot_datetime, veterinarian_id)
@@ -0,0 +1,184 @@
+import logging
+from bisect import bisect_right
+from collections import defaultdict
+from datetime import timedelta
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from .models import AppointmentBlock
+from .availability import to_local_naive
+from .booking import lock_veterinarian_days
+from .events import blocks_changed
+
+logger = logging.getLogger(__name__)
+
+REASON_MAX_LENGTH = AppointmentBlock._meta.get_field('reason').max_length
+
+def _index_key(veterinarian_id):
+    return f'blocks:index:{veterinarian_id}'
+
+def _merge_reasons(reasons):
+    """Razones distintas en orden de aparición, unidas y recortadas al largo del campo"""
+    unique = list(dict.fromkeys(reason for reason in reasons if reason))
+    return ' / '.join(unique)[:REASON_MAX_LENGTH]
+
+class BlockIndex:
+    """
+    Bloqueos activos de un veterinario como intervalos (inicio, fin, razón) en
+    hora local, ordenados y sin solapes: una búsqueda binaria sobre los fines
+    encuentra los bloqueos que tocan un rango sin recorrer la lista.
+    """
+
+    def __init__(self, intervals=()):
+        self.intervals = list(intervals)
+        self._ends = [end for _, end, _ in self.intervals]
+
+    @classmethod
+    def from_blocks(cls, blocks):
+        """
+        Construir el índice desde bloqueos del modelo. Los bloqueos se fusionan
+        al guardarse; aquí solo se cubren los datos anteriores a la fusión.
+        """
+        intervals = []
+        for block in sorted(blocks, key=lambda block: block.start_datetime):
+            start = to_local_naive(block.start_datetime)
+            end = to_local_naive(block.end_datetime)
+            if intervals and start <= intervals[-1][1]:
+                last_start, last_end, last_reason = intervals[-1]
+                intervals[-1] = (last_start, max(last_end, end), _merge_reasons([last_reason, block.reason]))
+            else:
+                intervals.append((start, end, block.reason))
+        return cls(intervals)
+
+    def overlapping(self, start, end):
+        """Intervalos que se solapan con [start, end)"""
+        result = []
+        position = bisect_right(self._ends, start)
+        while position < len(self.intervals) and self.intervals[position][0] < end:
+            result.append(self.intervals[position])
+            position += 1
+        return result
+
+def get_block_indexes(veterinarian_ids):
+    """
+    Índices {veterinario: BlockIndex} desde el caché de Django; los faltantes se
+    cargan con una sola consulta y se guardan.
+    """
+    veterinarian_ids = sorted({int(vet_id) for vet_id in veterinarian_ids})
+    keys = {_index_key(vet_id): vet_id for vet_id in veterinarian_ids}
+    try:
+        cached = cache.get_many(keys)
+    except Exception as e:
+        logger.error(f"Error al leer índices de bloqueos: {e}")
+        cached = {}
+
+    indexes = {keys[key]: BlockIndex(intervals) for key, intervals in cached.items()}
+    missing = [vet_id for vet_id in veterinarian_ids if vet_id not in indexes]
+    if missing:
+        blocks = defaultdict(list)
+        for block in AppointmentBlock.objects.filter(veterinarian_id__in=missing, is_active=True):
+            blocks[block.veterinarian_id].append(block)
+        loaded = {vet_id: BlockIndex.from_blocks(blocks[vet_id]) for vet_id in missing}
+        indexes.update(loaded)
+        try:
+            cache.set_many(
+                {_index_key(vet_id): index.intervals for vet_id, index in loaded.items()},
+                timeout=settings.BLOCK_INDEX_CACHE_TIMEOUT
+            )
+        except Exception as e:
+            logger.error(f"Error al guardar índices de bloqueos: {e}")
+    return indexes
+
+def invalidate_block_indexes(veterinarian_ids):
+    """Descartar los índices de los veterinarios ahora y al confirmar la transacción"""
+    keys = [_index_key(vet_id) for vet_id in set(veterinarian_ids) if vet_id is not None]
+
+    def invalidate():
+        try:
+            cache.delete_many(keys)
+        except Exception as e:
+            logger.error(f"Error al invalidar índices de bloqueos: {e}")
+    invalidate()
+    transaction.on_commit(invalidate)
+
+def create_blocks(veterinarian_ids, start_datetime, end_datetime, reason, created_by, keep=None):
+    """
+    Bloquear el mismo periodo para varios veterinarios (festivos, capacitaciones).
+
+    Los bloqueos activos que se solapan o tocan el periodo se fusionan en uno
+    solo: el primero se extiende y el resto se desactiva. Con `keep` (un bloqueo
+    ya guardado) ese es el que se conserva. Devuelve el bloqueo resultante de
+    cada veterinario, en el orden de `veterinarian_ids`.
+    """
+    veterinarian_ids = list(dict.fromkeys(int(vet_id) for vet_id in veterinarian_ids))
+    first_day = to_local_naive(start_datetime).date()
+    last_day = to_local_naive(end_datetime).date()
+    days = [first_day + timedelta(days=offset) for offset in range((last_day - first_day).days + 1)]
+    with transaction.atomic():
+        # Sin bloqueos previos no hay filas que tomar con select_for_update: se
+        # serializa con los bloqueos por veterinario y día que usan las reservas.
+        # Dos periodos que se solapan o se tocan comparten al menos un día.
+        for veterinarian_id in sorted(veterinarian_ids):
+            lock_veterinarian_days(veterinarian_id, days)
+
+        overlapping = defaultdict(list)
+        for block in AppointmentBlock.objects.select_for_update().filter(
+            veterinarian_id__in=veterinarian_ids,
+            is_active=True,
+            start_datetime__lte=end_datetime,
+            end_datetime__gte=start_datetime
+        ).order_by('start_datetime', 'id'):
+            overlapping[block.veterinarian_id].append(block)
+
+        created, extended, absorbed, results, periods = [], [], [], {}, []
+        for veterinarian_id in veterinarian_ids:
+            blocks = overlapping[veterinarian_id]
+            if not blocks:
+                block = AppointmentBlock(
+                    veterinarian_id=veterinarian_id,
+                    start_datetime=start_datetime,
+                    end_datetime=end_datetime,
+                    reason=reason,
+                    created_by=created_by
+                )
+                created.append(block)
+                results[veterinarian_id] = block
+                periods.append((veterinarian_id, start_datetime, end_datetime))
+                continue
+
+            keeper = next((block for block in blocks if keep is not None and block.id == keep.id), blocks[0])
+            merged_start = min([start_datetime] + [block.start_datetime for block in blocks])
+            merged_end = max([end_datetime] + [block.end_datetime for block in blocks])
+            merged_reason = _merge_reasons([keeper.reason] + [block.reason for block in blocks] + [reason])
+            others = [block for block in blocks if block is not keeper]
+            if (others or (keeper.start_datetime, keeper.end_datetime, keeper.reason)
+                    != (merged_start, merged_end, merged_reason)):
+                keeper.start_datetime = merged_start
+                keeper.end_datetime = merged_end
+                keeper.reason = merged_reason
+                extended.append(keeper)
+                periods.append((veterinarian_id, merged_start, merged_end))
+            absorbed.extend(block.id for block in others)
+            results[veterinarian_id] = keeper
+
+        AppointmentBlock.objects.bulk_create(created)
+        if created and created[0].id is None:
+            # MySQL no devuelve los IDs de bulk_create; los veterinarios de `created`
+            # no tenían bloqueos activos en el periodo y sus días siguen bloqueados,
+            # así que el nuevo es el único
+            ids = dict(AppointmentBlock.objects.filter(
+                veterinarian_id__in=[block.veterinarian_id for block in created],
+                is_active=True,
+                start_datetime=start_datetime,
+                end_datetime=end_datetime
+            ).values_list('veterinarian_id', 'id'))
+            for block in created:
+                block.id = ids[block.veterinarian_id]
+        if extended:
+            AppointmentBlock.objects.bulk_update(extended, ['start_datetime', 'end_datetime', 'reason'])
+        if absorbed:
+            AppointmentBlock.objects.filter(id__in=absorbed).update(is_active=False)
+        if periods:
+            blocks_changed.send(sender=AppointmentBlock, periods=periods)
+
+    return [results[veterinarian_id] for veterinarian_id in veterinarian_ids]
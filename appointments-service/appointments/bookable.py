@@ -0,0 +1,195 @@
+import heapq
+import logging
+import time
+from datetime import date, datetime, timedelta
+from itertools import islice
+
+import redis
+from django.conf import settings
+from .occupancy import occupancy_cache, bitmap_slots
+from .schedules import schedule_cache
+
+logger = logging.getLogger(__name__)
+
+EPOCH = datetime(1970, 1, 1)
+# Segundos sin intentar Redis después de un error
+RETRY_SECONDS = 30
+# Un Redis lento no debe frenar las escrituras que actualizan el modelo
+SOCKET_TIMEOUT = 1
+
+def _score(value):
+    """Minutos desde 1970 de un datetime en hora local sin zona"""
+    return int((value - EPOCH).total_seconds() // 60)
+
+def _slot_key(veterinarian_id, appointment_type):
+    return f'bookable:{veterinarian_id}:{appointment_type}'
+
+def _built_key(veterinarian_id):
+    return f'bookable:built:{veterinarian_id}'
+
+def _day_score(day):
+    return _score(datetime.combine(day, datetime.min.time()))
+
+def _days(start, end):
+    return [start.date() + timedelta(days=offset) for offset in range((end.date() - start.date()).days + 1)]
+
+def type_duration(appointment_type):
+    return settings.APPOINTMENT_TYPE_DURATIONS.get(appointment_type, settings.APPOINTMENT_DURATION_MINUTES)
+
+class BookableSlots:
+    """
+    Modelo de lectura de horarios reservables para la reserva en línea.
+
+    Por veterinario y tipo de cita hay un sorted set `bookable:{vet}:{tipo}` con
+    los inicios libres de los próximos `horizon_days` días: miembro
+    'AAAA-MM-DDTHH:MM' y puntaje en minutos, así que una consulta por rango es
+    un ZRANGEBYSCORE. Los días se reescriben desde los mapas de ocupación cuando
+    cambian citas o bloqueos; leer no toca la base de datos.
+
+    `bookable:built:{vet}` marca los días ya escritos. Un día sin marca (Redis
+    vaciado, veterinario nuevo, día que acaba de entrar al horizonte) se
+    resuelve desde los mapas y se escribe en ese momento.
+    """
+
+    def __init__(self, redis_url, horizon_days, appointment_types):
+        self.horizon_days = horizon_days
+        self.appointment_types = list(appointment_types)
+        self._redis = redis.Redis.from_url(
+            redis_url, socket_timeout=SOCKET_TIMEOUT, socket_connect_timeout=SOCKET_TIMEOUT
+        ) if redis_url else None
+        self._retry_at = 0
+
+    def _client(self):
+        if self._redis is None or time.time() < self._retry_at:
+            return None
+        return self._redis
+
+    def _failed(self, action, error):
+        logger.error(f"Error al {action} horarios reservables en Redis: {error}")
+        self._retry_at = time.time() + RETRY_SECONDS
+
+    def horizon(self):
+        """Primer y último día del modelo de lectura"""
+        today = date.today()
+        return today, today + timedelta(days=self.horizon_days - 1)
+
+    def refresh(self, veterinarian_id, dates):
+        """Reescribir los días indicados del veterinario; los días fuera del horizonte se ignoran"""
+        client = self._client()
+        if client is None:
+            return False
+        first_day, last_day = self.horizon()
+        dates = sorted({day for day in dates if first_day <= day <= last_day})
+        if not dates:
+            return True
+
+        veterinarian_id = int(veterinarian_id)
+        bitmaps = occupancy_cache.get_bitmaps([veterinarian_id], dates)
+        # MULTI/EXEC: nadie lee un día a medio reescribir ni lo ve marcado antes de tiempo
+        pipeline = client.pipeline()
+        built_key = _built_key(veterinarian_id)
+        pipeline.zremrangebyscore(built_key, '-inf', _day_score(first_day) - 1)
+        pipeline.zadd(built_key, {day.isoformat(): _day_score(day) for day in dates})
+        for appointment_type in self.appointment_types:
+            key = _slot_key(veterinarian_id, appointment_type)
+            duration = type_duration(appointment_type)
+            pipeline.zremrangebyscore(key, '-inf', _day_score(first_day) - 1)
+            for day in dates:
+                pipeline.zremrangebyscore(key, _day_score(day), _day_score(day + timedelta(days=1)) - 1)
+                slots = {
+                    f'{day.isoformat()}T{slot:%H:%M}': _score(datetime.combine(day, slot))
+                    for slot in bitmap_slots(bitmaps[(veterinarian_id, day)], day, duration)
+                }
+                if slots:
+                    pipeline.zadd(key, slots)
+        try:
+            pipeline.execute()
+        except redis.RedisError as e:
+            self._failed('actualizar', e)
+            return False
+        return True
+
+    def rebuild(self, veterinarian_ids=None):
+        """
+        Reescribir el horizonte completo de los veterinarios indicados o, sin
+        ellos, de todos los que tienen horario. Devuelve cuántos se reescribieron.
+        """
+        if veterinarian_ids is None:
+            veterinarian_ids = sorted({vet_id for vet_id, _ in schedule_cache.all()})
+        first_day, _ = self.horizon()
+        dates = [first_day + timedelta(days=offset) for offset in range(self.horizon_days)]
+        return sum(1 for veterinarian_id in veterinarian_ids if self.refresh(veterinarian_id, dates))
+
+    def slots(self, appointment_type, start, end, veterinarian_ids=None, limit=None):
+        """
+        Inicios reservables [(datetime, veterinario)] en orden entre `start` y
+        `end`. Si Redis no responde, o para los días que el modelo todavía no
+        tiene, se resuelven desde los mapas de ocupación.
+        """
+        if veterinarian_ids is None:
+            veterinarian_ids = sorted({vet_id for vet_id, _ in schedule_cache.all()})
+        veterinarian_ids = [int(vet_id) for vet_id in veterinarian_ids]
+        days = _days(start, end)
+        read = self._read(appointment_type, start, end, veterinarian_ids, limit)
+        if read is None:
+            found = self._compute(appointment_type, start, end, {vet_id: days for vet_id in veterinarian_ids})
+        else:
+            found, missing = read
+            if missing:
+                found += self._compute(appointment_type, start, end, missing)
+                for veterinarian_id, missing_days in missing.items():
+                    self.refresh(veterinarian_id, missing_days)
+        return list(islice(heapq.merge(*found), limit))
+
+    def _read(self, appointment_type, start, end, veterinarian_ids, limit):
+        """
+        Inicios guardados de cada veterinario y {veterinario: días} del rango
+        sin marca de construidos, o None si Redis no responde.
+        """
+        client = self._client()
+        if client is None:
+            return None
+        days = _days(start, end)
+        try:
+            pipeline = client.pipeline(transaction=False)
+            for veterinarian_id in veterinarian_ids:
+                pipeline.zrangebyscore(_built_key(veterinarian_id), _day_score(days[0]), _day_score(days[-1]))
+                pipeline.zrangebyscore(
+                    _slot_key(veterinarian_id, appointment_type), _score(start), _score(end),
+                    start=0 if limit else None, num=limit
+                )
+            results = pipeline.execute()
+        except redis.RedisError as e:
+            self._failed('leer', e)
+            return None
+
+        streams, missing = [], {}
+        for veterinarian_id, built, members in zip(veterinarian_ids, results[::2], results[1::2]):
+            built = {date.fromisoformat(day.decode()) for day in built}
+            streams.append([(datetime.fromisoformat(member.decode()), veterinarian_id) for member in members])
+            missing_days = [day for day in days if day not in built]
+            if missing_days:
+                missing[veterinarian_id] = missing_days
+        return streams, missing
+
+    def _compute(self, appointment_type, start, end, days_by_veterinarian):
+        bitmaps = occupancy_cache.get_bitmaps(
+            list(days_by_veterinarian), sorted({day for days in days_by_veterinarian.values() for day in days})
+        )
+        duration = type_duration(appointment_type)
+        streams = []
+        for veterinarian_id, days in days_by_veterinarian.items():
+            stream = []
+            for day in days:
+                for slot in bitmap_slots(bitmaps[(veterinarian_id, day)], day, duration):
+                    slot_datetime = datetime.combine(day, slot)
+                    if start <= slot_datetime <= end:
+                        stream.append((slot_datetime, veterinarian_id))
+            streams.append(stream)
+        return streams
+
+bookable_slots = BookableSlots(
+    redis_url=settings.BOOKABLE_SLOTS_REDIS_URL,
+    horizon_days=settings.BOOKABLE_SLOTS_HORIZON_DAYS,
+    appointment_types=settings.BOOKABLE_APPOINTMENT_TYPES,
+)
@@ -0,0 +1,84 @@
+from datetime import datetime, timedelta
+from django.db import transaction
+from django.utils import timezone
+from rest_framework import serializers
+from .models import Appointment, AppointmentBlock, VeterinarianDayLock
+from .availability import ACTIVE_STATUSES
+
+def lock_veterinarian_day(veterinarian_id, date):
+    """
+    Tomar el bloqueo de fila del veterinario en la fecha. Debe llamarse dentro
+    de una transacción; se libera al confirmarla o revertirla.
+    """
+    VeterinarianDayLock.objects.get_or_create(veterinarian_id=veterinarian_id, date=date)
+    return VeterinarianDayLock.objects.select_for_update().get(
+        veterinarian_id=veterinarian_id, date=date
+    )
+
+def lock_veterinarian_days(veterinarian_id, dates):
+    """Bloquear varios días del veterinario en orden de fecha, con dos consultas"""
+    dates = sorted(set(dates))
+    VeterinarianDayLock.objects.bulk_create(
+        [VeterinarianDayLock(veterinarian_id=veterinarian_id, date=date) for date in dates],
+        ignore_conflicts=True
+    )
+    return list(VeterinarianDayLock.objects.select_for_update().filter(
+        veterinarian_id=veterinarian_id, date__in=dates
+    ).order_by('date'))
+
+def find_conflict(veterinarian_id, date, start_time, duration_minutes, exclude_id=None):
+    """Cita activa o bloqueo que se solape con el horario; None si está libre"""
+    start = datetime.combine(date, start_time)
+    end = start + timedelta(minutes=duration_minutes)
+
+    appointments = Appointment.objects.filter(
+        veterinarian_id=veterinarian_id,
+        appointment_date=date,
+        status__in=ACTIVE_STATUSES
+    ).exclude(id=exclude_id)
+    for appointment in appointments:
+        existing_start = datetime.combine(date, appointment.appointment_time)
+        existing_end = existing_start + timedelta(minutes=appointment.duration_minutes)
+        if start < existing_end and existing_start < end:
+            return appointment
+
+    return AppointmentBlock.objects.filter(
+        veterinarian_id=veterinarian_id,
+        is_active=True,
+        start_datetime__lt=timezone.make_aware(end),
+        end_datetime__gt=timezone.make_aware(start)
+    ).first()
+
+def book_appointment(serializer, **save_kwargs):
+    """
+    Guardar la cita del serializer sin permitir solapamientos. Solo se
+    serializan las reservas del mismo veterinario y día; el resto avanza en paralelo.
+    """
+    data = serializer.validated_data
+    instance = serializer.instance
+
+    def current(field):
+        return data.get(field, getattr(instance, field, None))
+
+    veterinarian_id = current('veterinarian_id')
+    date = current('appointment_date')
+    start_time = current('appointment_time')
+    duration_minutes = current('duration_minutes') or Appointment._meta.get_field('duration_minutes').default
+    appointment_status = current('status') or Appointment.Status.SCHEDULED
+
+    with transaction.atomic():
+        if appointment_status in ACTIVE_STATUSES:
+            lock_veterinarian_day(veterinarian_id, date)
+            conflict = find_conflict(
+                veterinarian_id, date, start_time, duration_minutes,
+                exclude_id=instance.id if instance else None
+            )
+            if isinstance(conflict, Appointment):
+                raise serializers.ValidationError({
+                    'appointment_time': f'Conflicto con cita existente de {conflict.appointment_time} a {conflict.end_time}'
+                })
+            if conflict is not None:
+                raise serializers.ValidationError({
+                    'appointment_time': 'El veterinario tiene el horario bloqueado en este momento'
+                })
+        return serializer.save(**save_kwargs)
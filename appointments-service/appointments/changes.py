@@ -0,0 +1,144 @@
+import hashlib
+import logging
+import time
+from datetime import timedelta
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import F, Max
+from django.utils import timezone
+from .models import AgendaChange, AgendaCommit
+
+logger = logging.getLogger(__name__)
+
+CURSOR_KEY = 'agenda:cursor'
+
+def _day_key(veterinarian_id, date):
+    return f'agenda:day:{veterinarian_id}:{date.isoformat()}'
+
+def _veterinarian_key(veterinarian_id):
+    return f'agenda:veterinarian:{veterinarian_id}'
+
+def record_change(entity, action, veterinarian_id, start_date=None, end_date=None, object_id=None):
+    """
+    Registrar un cambio de agenda en la transacción actual. Al confirmarla el
+    cambio recibe su AgendaCommit, cuyo ID pasa a ser la versión de los días
+    afectados (ETag de las agendas) y el cursor del feed.
+    """
+    change = AgendaChange.objects.create(
+        veterinarian_id=veterinarian_id,
+        entity=entity,
+        action=action,
+        object_id=object_id,
+        start_date=start_date,
+        end_date=end_date or start_date,
+    )
+    transaction.on_commit(lambda: _publish(change))
+    return change
+
+def _publish(change):
+    try:
+        commit, _ = AgendaCommit.objects.get_or_create(change=change)
+    except Exception as e:
+        # changes_since lo confirma en la próxima lectura
+        logger.error(f"Error al confirmar cambio de agenda: {e}")
+        return
+    _publish_versions([(change, commit.id)])
+
+def _publish_versions(committed):
+    """Guardar en caché el cursor y la versión de los días de cambios ya confirmados"""
+    values = {}
+    for change, sequence in committed:
+        days = (change.end_date - change.start_date).days + 1 if change.start_date else None
+        if days is None or days > settings.OCCUPANCY_MAX_REFRESH_DAYS:
+            values[_veterinarian_key(change.veterinarian_id)] = sequence
+        else:
+            for offset in range(days):
+                values[_day_key(change.veterinarian_id, change.start_date + timedelta(days=offset))] = sequence
+    values[CURSOR_KEY] = max(sequence for _, sequence in committed)
+    try:
+        cache.set_many(values, timeout=None)
+    except Exception as e:
+        logger.error(f"Error al publicar cambio de agenda: {e}")
+
+def current_cursor():
+    """Último cursor publicado; si no está en caché se toma de la base de datos"""
+    cursor = cache.get(CURSOR_KEY)
+    if cursor is None:
+        cursor = AgendaCommit.objects.aggregate(last=Max('id'))['last'] or 0
+        cache.add(CURSOR_KEY, cursor, timeout=None)
+    return cursor
+
+def agenda_etag(path, veterinarian_ids, dates):
+    """
+    ETag de una agenda a partir de las versiones en caché de sus días y
+    veterinarios, sin consultar la base de datos. Una versión ausente se
+    inicializa con el cursor actual, que no puede ser anterior al último cambio del día.
+    Sin veterinarian_ids (todos) se usa el cursor global.
+    """
+    if veterinarian_ids is None:
+        versions = [current_cursor()]
+    else:
+        keys = [_veterinarian_key(vet_id) for vet_id in veterinarian_ids]
+        keys += [_day_key(vet_id, date) for vet_id in veterinarian_ids for date in dates]
+        found = cache.get_many(keys)
+        missing = [key for key in keys if key not in found]
+        if missing:
+            cursor = current_cursor()
+            for key in missing:
+                cache.add(key, cursor, timeout=None)
+            found.update(cache.get_many(missing))
+        versions = [found.get(key) for key in keys]
+
+    digest = hashlib.md5(f'{path}|{versions}'.encode()).hexdigest()
+    return f'"{digest}"'
+
+def _commit_pending():
+    """
+    Confirmar los cambios visibles sin AgendaCommit: los de transacciones ya
+    confirmadas cuyo on_commit no llegó a ejecutarse (el proceso terminó antes).
+    """
+    pending = list(AgendaChange.objects.filter(commit__isnull=True).order_by('id')[
+        :settings.AGENDA_CHANGES_PAGE_SIZE
+    ])
+    if not pending:
+        return
+    AgendaCommit.objects.bulk_create([AgendaCommit(change=change) for change in pending], ignore_conflicts=True)
+    sequences = dict(AgendaCommit.objects.filter(change__in=pending).values_list('change_id', 'id'))
+    _publish_versions([(change, sequences[change.id]) for change in pending])
+
+def changes_since(cursor, veterinarian_ids=None, limit=None):
+    """
+    Cambios confirmados después del cursor, en orden de confirmación, con el
+    cursor de cada uno en `sequence`. Las confirmaciones son inserciones de una
+    sola sentencia; AGENDA_CHANGES_SETTLE_SECONDS cubre las que aún no terminan.
+    """
+    _commit_pending()
+    queryset = AgendaChange.objects.filter(
+        commit__id__gt=cursor,
+        commit__created_at__lte=timezone.now() - timedelta(seconds=settings.AGENDA_CHANGES_SETTLE_SECONDS)
+    ).annotate(sequence=F('commit__id'))
+    if veterinarian_ids is not None:
+        queryset = queryset.filter(veterinarian_id__in=veterinarian_ids)
+    return list(queryset.order_by('commit__id')[:limit or settings.AGENDA_CHANGES_PAGE_SIZE])
+
+def wait_for_changes(cursor, veterinarian_ids=None, timeout=0):
+    """
+    Long-poll: esperar hasta `timeout` segundos a que haya cambios posteriores
+    al cursor. Mientras tanto solo se consulta el cursor en caché.
+    """
+    deadline = time.monotonic() + timeout
+    while True:
+        if current_cursor() > cursor:
+            changes = changes_since(cursor, veterinarian_ids)
+            if changes:
+                return changes
+        if time.monotonic() >= deadline:
+            return []
+        time.sleep(settings.AGENDA_CHANGES_POLL_INTERVAL)
+
+def prune_changes():
+    """Eliminar cambios más antiguos que AGENDA_CHANGES_RETENTION_DAYS"""
+    limit = timezone.now() - timedelta(days=settings.AGENDA_CHANGES_RETENTION_DAYS)
+    deleted, _ = AgendaChange.objects.filter(created_at__lt=limit).delete()
+    return deleted
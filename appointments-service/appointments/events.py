@@ -0,0 +1,10 @@
+from django.dispatch import Signal
+
+# Cambios de citas aplicados en lote con queryset.update(), que no dispara
+# post_save. Argumentos: appointment_ids, status (None si no cambia) y
+# vet_days ({(veterinarian_id, fecha)} afectados)
+appointments_changed = Signal()
+
+# Bloqueos creados o fusionados en lote (blocks.create_blocks), sin post_save.
+# Argumento: periods ([(veterinarian_id, inicio, fin)] afectados)
+blocks_changed = Signal()
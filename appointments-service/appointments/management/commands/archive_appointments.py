@@ -0,0 +1,41 @@
+import time
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from appointments.archive import archive_batch, archive_cutoff
+
+class Command(BaseCommand):
+    help = 'Mover a la tabla de archivo las citas finalizadas anteriores al horizonte de archivo'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--older-than-days', type=int, default=settings.APPOINTMENT_ARCHIVE_AFTER_DAYS,
+            help='Archivar citas con más de estos días de antigüedad'
+        )
+        parser.add_argument('--batch-size', type=int, default=settings.APPOINTMENT_ARCHIVE_BATCH_SIZE)
+        parser.add_argument(
+            '--sleep', type=float, default=settings.APPOINTMENT_ARCHIVE_PAUSE_SECONDS,
+            help='Segundos de pausa entre lotes'
+        )
+        parser.add_argument('--max-batches', type=int, default=0, help='Máximo de lotes; 0 sin límite')
+
+    def handle(self, *args, **options):
+        if options['older_than_days'] < 1:
+            raise CommandError('older-than-days debe ser al menos 1')
+        if options['batch_size'] < 1:
+            raise CommandError('batch-size debe ser al menos 1')
+
+        cutoff = archive_cutoff(options['older_than_days'])
+        archived = batches = 0
+        # Lotes cortos con pausa para no competir con el tráfico de la agenda
+        while not options['max_batches'] or batches < options['max_batches']:
+            moved = archive_batch(cutoff, options['batch_size'])
+            if not moved:
+                break
+            archived += moved
+            batches += 1
+            if options['sleep']:
+                time.sleep(options['sleep'])
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Citas archivadas: {archived} en {batches} lotes (anteriores a {cutoff})'
+        ))
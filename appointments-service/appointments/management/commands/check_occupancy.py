@@ -0,0 +1,30 @@
+from datetime import date, timedelta
+from django.core.management.base import BaseCommand, CommandError
+from appointments.availability import AvailabilityEngine
+from appointments.occupancy import occupancy_cache
+
+class Command(BaseCommand):
+    help = 'Verificar que los mapas de ocupación en caché coincidan con la base de datos'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--start-date', type=date.fromisoformat, default=None, help='Fecha inicial (YYYY-MM-DD), por defecto hoy')
+        parser.add_argument('--days', type=int, default=60, help='Número de días a verificar')
+        parser.add_argument('--veterinarian-ids', default='', help='IDs separados por comas; por defecto todos')
+        parser.add_argument('--fix', action='store_true', help='Corregir los mapas inconsistentes')
+
+    def handle(self, *args, **options):
+        start_date = options['start_date'] or date.today()
+        end_date = start_date + timedelta(days=options['days'] - 1)
+        veterinarian_ids = [int(v) for v in options['veterinarian_ids'].split(',') if v] or None
+
+        engine = AvailabilityEngine(veterinarian_ids, start_date, end_date)
+        mismatches = occupancy_cache.check(engine.veterinarian_ids, list(engine.dates()), fix=options['fix'])
+
+        for veterinarian_id, day in mismatches:
+            self.stdout.write(f'Inconsistente: veterinario {veterinarian_id} - {day}')
+
+        if mismatches and not options['fix']:
+            raise CommandError(f'{len(mismatches)} mapas de ocupación inconsistentes')
+        self.stdout.write(self.style.SUCCESS(
+            f'{len(mismatches)} mapas corregidos' if mismatches else 'Mapas de ocupación consistentes'
+        ))
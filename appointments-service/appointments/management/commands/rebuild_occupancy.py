@@ -0,0 +1,28 @@
+from datetime import date, timedelta
+from django.core.management.base import BaseCommand
+from appointments.availability import AvailabilityEngine
+from appointments.occupancy import occupancy_cache
+
+class Command(BaseCommand):
+    help = 'Reconstruir los mapas de ocupación en caché de los veterinarios'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--start-date', type=date.fromisoformat, default=None, help='Fecha inicial (YYYY-MM-DD), por defecto hoy')
+        parser.add_argument('--days', type=int, default=60, help='Número de días a reconstruir')
+        parser.add_argument('--veterinarian-ids', default='', help='IDs separados por comas; por defecto todos')
+
+    def handle(self, *args, **options):
+        start_date = options['start_date'] or date.today()
+        end_date = start_date + timedelta(days=options['days'] - 1)
+        veterinarian_ids = [int(v) for v in options['veterinarian_ids'].split(',') if v] or None
+
+        engine = AvailabilityEngine(veterinarian_ids, start_date, end_date)
+        dates = list(engine.dates())
+        for veterinarian_id in engine.veterinarian_ids:
+            occupancy_cache.invalidate_veterinarian(veterinarian_id)
+            occupancy_cache.refresh(veterinarian_id, dates)
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Mapas reconstruidos: {len(engine.veterinarian_ids)} veterinarios, '
+            f'{start_date} a {end_date}'
+        ))
@@ -0,0 +1,30 @@
+from datetime import date, timedelta
+from django.core.management.base import BaseCommand, CommandError
+from appointments.analytics import refresh_range
+
+class Command(BaseCommand):
+    help = 'Reconstruir el resumen diario de uso de los veterinarios'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--start-date', type=date.fromisoformat, required=True, help='Fecha inicial (YYYY-MM-DD)')
+        parser.add_argument('--end-date', type=date.fromisoformat, default=None, help='Fecha final (YYYY-MM-DD), por defecto hoy')
+        parser.add_argument('--veterinarian-ids', default='', help='IDs separados por comas; por defecto todos')
+
+    def handle(self, *args, **options):
+        start_date = options['start_date']
+        end_date = options['end_date'] or date.today()
+        if end_date < start_date:
+            raise CommandError('end-date debe ser igual o posterior a start-date')
+        veterinarian_ids = [int(v) for v in options['veterinarian_ids'].split(',') if v] or None
+
+        # Por meses para acotar la memoria de cada pasada
+        refreshed = 0
+        current = start_date
+        while current <= end_date:
+            chunk_end = min(current + timedelta(days=30), end_date)
+            refreshed += refresh_range(current, chunk_end, veterinarian_ids)
+            current = chunk_end + timedelta(days=1)
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Resumen reconstruido: {refreshed} días de veterinario, {start_date} a {end_date}'
+        ))
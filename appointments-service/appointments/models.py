@@ -4,7 +4,11 @@ from django.utils.translation import gettext_lazy as _
 from django.core.exceptions import ValidationError
 from datetime import datetime, timedelta
 
-class Appointment(models.Model):
+class AppointmentRecord(models.Model):
+    """
+    Campos comunes de las citas vigentes y archivadas. Ambas tablas tienen las
+    mismas columnas en el mismo orden, así que se pueden unir con UNION.
+    """
     class Status(models.TextChoices):
         SCHEDULED = 'AGENDADA', _('Agendada')
         CONFIRMED = 'CONFIRMADA', _('Confirmada')
@@ -79,11 +83,44 @@ class Appointment(models.Model):
     confirmation_required = models.BooleanField(default=True, verbose_name=_('Requiere confirmación'))
     confirmed_at = models.DateTimeField(null=True, blank=True, verbose_name=_('Confirmado en'))
 
+    class Meta:
+        abstract = True
+
+    @property
+    def end_time(self):
+        """Calcula la hora de finalización de la cita"""
+        appointment_datetime = datetime.combine(self.appointment_date, self.appointment_time)
+        end_datetime = appointment_datetime + timedelta(minutes=self.duration_minutes)
+        return end_datetime.time()
+
+    @property
+    def is_past(self):
+        """Determina si la cita ya pasó"""
+        appointment_datetime = datetime.combine(self.appointment_date, self.appointment_time)
+        return appointment_datetime < datetime.now()
+
+class Appointment(AppointmentRecord):
+    # Serie de citas recurrentes a la que pertenece
+    series = models.ForeignKey(
+        'AppointmentSeries',
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name='appointments',
+        verbose_name=_('Serie')
+    )
+
     class Meta:
         verbose_name = _('Cita')
         verbose_name_plural = _('Citas')
         ordering = ['appointment_date', 'appointment_time']
         unique_together = ['patient_id', 'appointment_date', 'appointment_time']
+        indexes = [
+            # Agenda, disponibilidad y filtros por veterinario/fecha/estado
+            models.Index(fields=['veterinarian_id', 'appointment_date', 'status'], name='appt_vet_date_status_idx'),
+            # Listados por rango de fechas con el orden por defecto
+            models.Index(fields=['appointment_date', 'appointment_time'], name='appt_date_time_idx'),
+        ]
 
     def __str__(self):
         return f"Cita {self.id} - Paciente {self.patient_id} - {self.appointment_date} {self.appointment_time}"
@@ -104,18 +141,34 @@ class Appointment(models.Model):
             if not (start_time <= self.appointment_time <= end_time):
                 raise ValidationError(f'Las citas deben estar entre {start_time} y {end_time}')
 
-    @property
-    def end_time(self):
-        """Calcula la hora de finalización de la cita"""
-        appointment_datetime = datetime.combine(self.appointment_date, self.appointment_time)
-        end_datetime = appointment_datetime + timedelta(minutes=self.duration_minutes)
-        return end_datetime.time()
+class ArchivedAppointment(AppointmentRecord):
+    """
+    Citas finalizadas fuera del horizonte de archivo (archive.py). Conservan el
+    ID original y no se modifican.
+    """
+    # Sin restricción de clave foránea: la serie puede eliminarse después
+    series = models.ForeignKey(
+        'AppointmentSeries',
+        on_delete=models.DO_NOTHING,
+        db_constraint=False,
+        null=True,
+        blank=True,
+        related_name='+',
+        verbose_name=_('Serie')
+    )
 
-    @property
-    def is_past(self):
-        """Determina si la cita ya pasó"""
-        appointment_datetime = datetime.combine(self.appointment_date, self.appointment_time)
-        return appointment_datetime < datetime.now()
+    class Meta:
+        verbose_name = _('Cita archivada')
+        verbose_name_plural = _('Citas archivadas')
+        ordering = ['appointment_date', 'appointment_time']
+        indexes = [
+            models.Index(fields=['appointment_date', 'appointment_time'], name='archived_date_time_idx'),
+            models.Index(fields=['patient_id', 'appointment_date'], name='archived_patient_date_idx'),
+            models.Index(fields=['veterinarian_id', 'appointment_date'], name='archived_vet_date_idx'),
+        ]
+
+    def __str__(self):
+        return f"Cita archivada {self.id} - Paciente {self.patient_id} - {self.appointment_date} {self.appointment_time}"
 
 class VeterinarianSchedule(models.Model):
     class DayOfWeek(models.TextChoices):
@@ -160,6 +213,280 @@ class AppointmentBlock(models.Model):
         verbose_name = _('Bloqueo de Horario')
         verbose_name_plural = _('Bloqueos de Horarios')
         ordering = ['start_datetime']
+        indexes = [
+            models.Index(fields=['veterinarian_id', 'is_active', 'start_datetime'], name='block_vet_active_start_idx'),
+        ]
+
+    def __str__(self):
+        return f"Bloqueo Veterinario {self.veterinarian_id} - {self.start_datetime} a {self.end_datetime}"
+
+class VeterinarianDayLock(models.Model):
+    """
+    Fila de bloqueo por veterinario y día. Las reservas toman un bloqueo de fila
+    sobre ella para serializar solo las citas que pueden solaparse.
+    """
+    veterinarian_id = models.IntegerField(verbose_name=_('ID del Veterinario'))
+    date = models.DateField(verbose_name=_('Fecha'))
+
+    class Meta:
+        verbose_name = _('Bloqueo de Agenda Diaria')
+        verbose_name_plural = _('Bloqueos de Agenda Diaria')
+        unique_together = ['veterinarian_id', 'date']
+
+    def __str__(self):
+        return f"Veterinario {self.veterinarian_id} - {self.date}"
+
+class AppointmentSeries(models.Model):
+    """Citas recurrentes (fisioterapia semanal, refuerzos de vacunas...)"""
+
+    class Frequency(models.TextChoices):
+        DAILY = 'DIARIA', _('Diaria')
+        WEEKLY = 'SEMANAL', _('Semanal')
+        MONTHLY = 'MENSUAL', _('Mensual')
+
+    # Datos comunes a todas las citas de la serie
+    patient_id = models.IntegerField(verbose_name=_('ID del Paciente'))
+    owner_id = models.IntegerField(verbose_name=_('ID del Propietario'))
+    veterinarian_id = models.IntegerField(verbose_name=_('ID del Veterinario'))
+    appointment_time = models.TimeField(verbose_name=_('Hora de la cita'))
+    duration_minutes = models.IntegerField(
+        default=30,
+        validators=[MinValueValidator(15), MaxValueValidator(240)],
+        verbose_name=_('Duración (minutos)')
+    )
+    appointment_type = models.CharField(
+        max_length=15,
+        choices=Appointment.AppointmentType.choices,
+        default=Appointment.AppointmentType.FOLLOW_UP,
+        verbose_name=_('Tipo de cita')
+    )
+    priority = models.CharField(
+        max_length=10,
+        choices=Appointment.Priority.choices,
+        default=Appointment.Priority.NORMAL,
+        verbose_name=_('Prioridad')
+    )
+    reason = models.TextField(verbose_name=_('Motivo de la consulta'))
+    notes = models.TextField(blank=True, verbose_name=_('Notas adicionales'))
+    contact_phone = models.CharField(max_length=15, verbose_name=_('Teléfono de contacto'))
+
+    # Regla de recurrencia
+    frequency = models.CharField(
+        max_length=10,
+        choices=Frequency.choices,
+        default=Frequency.WEEKLY,
+        verbose_name=_('Frecuencia')
+    )
+    interval = models.IntegerField(
+        default=1,
+        validators=[MinValueValidator(1), MaxValueValidator(12)],
+        verbose_name=_('Intervalo')
+    )
+    start_date = models.DateField(verbose_name=_('Fecha de inicio'))
+    end_date = models.DateField(null=True, blank=True, verbose_name=_('Fecha de fin'))
+    occurrence_count = models.IntegerField(
+        null=True,
+        blank=True,
+        validators=[MinValueValidator(1)],
+        verbose_name=_('Número de citas')
+    )
+
+    # Metadatos
+    is_active = models.BooleanField(default=True, verbose_name=_('Activa'))
+    created_at = models.DateTimeField(auto_now_add=True, verbose_name=_('Fecha de creación'))
+    updated_at = models.DateTimeField(auto_now=True, verbose_name=_('Fecha de actualización'))
+    created_by = models.IntegerField(verbose_name=_('Creado por (ID usuario)'))
+
+    class Meta:
+        verbose_name = _('Serie de Citas')
+        verbose_name_plural = _('Series de Citas')
+        ordering = ['-created_at']
+
+    def __str__(self):
+        return f"Serie {self.id} - Paciente {self.patient_id} ({self.frequency} cada {self.interval})"
+
+class WaitlistEntry(models.Model):
+    """Pacientes en espera de que se libere un horario por cancelación"""
+
+    class Status(models.TextChoices):
+        WAITING = 'ESPERANDO', _('Esperando')
+        OFFERED = 'OFERTADA', _('Ofertada')
+        ACCEPTED = 'ACEPTADA', _('Aceptada')
+        DECLINED = 'RECHAZADA', _('Rechazada')
+        EXPIRED = 'EXPIRADA', _('Expirada')
+        CANCELLED = 'CANCELADA', _('Cancelada')
+
+    patient_id = models.IntegerField(verbose_name=_('ID del Paciente'))
+    owner_id = models.IntegerField(verbose_name=_('ID del Propietario'))
+    # Sin veterinario: cualquiera
+    veterinarian_id = models.IntegerField(null=True, blank=True, verbose_name=_('ID del Veterinario preferido'))
+    appointment_type = models.CharField(
+        max_length=15,
+        choices=Appointment.AppointmentType.choices,
+        default=Appointment.AppointmentType.CONSULTATION,
+        verbose_name=_('Tipo de cita')
+    )
+    duration_minutes = models.IntegerField(
+        default=30,
+        validators=[MinValueValidator(15), MaxValueValidator(240)],
+        verbose_name=_('Duración (minutos)')
+    )
+    reason = models.TextField(verbose_name=_('Motivo de la consulta'))
+    contact_phone = models.CharField(max_length=15, verbose_name=_('Teléfono de contacto'))
+
+    # Ventana aceptable: fechas y rango de hora de inicio
+    earliest_date = models.DateField(verbose_name=_('Desde la fecha'))
+    latest_date = models.DateField(verbose_name=_('Hasta la fecha'))
+    earliest_time = models.TimeField(null=True, blank=True, verbose_name=_('Desde la hora'))
+    latest_time = models.TimeField(null=True, blank=True, verbose_name=_('Hasta la hora'))
+
+    status = models.CharField(
+        max_length=10,
+        choices=Status.choices,
+        default=Status.WAITING,
+        verbose_name=_('Estado')
+    )
+    offered_appointment = models.OneToOneField(
+        Appointment,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name='waitlist_entry',
+        verbose_name=_('Cita ofertada')
+    )
+    offered_at = models.DateTimeField(null=True, blank=True, verbose_name=_('Ofertada en'))
+    offer_expires_at = models.DateTimeField(null=True, blank=True, verbose_name=_('Vence la oferta'))
+
+    created_at = models.DateTimeField(auto_now_add=True, verbose_name=_('Fecha de creación'))
+    updated_at = models.DateTimeField(auto_now=True, verbose_name=_('Fecha de actualización'))
+    created_by = models.IntegerField(verbose_name=_('Creado por (ID usuario)'))
+
+    class Meta:
+        verbose_name = _('Lista de Espera')
+        verbose_name_plural = _('Lista de Espera')
+        ordering = ['created_at']
+        indexes = [
+            # Búsqueda de candidatos para un horario liberado
+            models.Index(fields=['status', 'veterinarian_id', 'latest_date', 'created_at'], name='waitlist_match_idx'),
+            # Ofertas vencidas
+            models.Index(fields=['offer_expires_at'], name='waitlist_offer_expiry_idx'),
+        ]
+
+    def __str__(self):
+        return f"Espera {self.id} - Paciente {self.patient_id} ({self.earliest_date} a {self.latest_date})"
+
+class AgendaChange(models.Model):
+    """
+    Registro de cambios de agenda para el feed de recepción. El ID es el cursor:
+    crece con cada cambio y los clientes piden solo los posteriores al último visto.
+    """
+
+    class Entity(models.TextChoices):
+        APPOINTMENT = 'CITA', _('Cita')
+        BLOCK = 'BLOQUEO', _('Bloqueo')
+        SCHEDULE = 'HORARIO', _('Horario')
+
+    class Action(models.TextChoices):
+        CREATED = 'CREADO', _('Creado')
+        UPDATED = 'ACTUALIZADO', _('Actualizado')
+        DELETED = 'ELIMINADO', _('Eliminado')
+
+    veterinarian_id = models.IntegerField(verbose_name=_('ID del Veterinario'))
+    entity = models.CharField(max_length=10, choices=Entity.choices, verbose_name=_('Entidad'))
+    action = models.CharField(max_length=12, choices=Action.choices, verbose_name=_('Acción'))
+    # Sin ID en los cambios en lote
+    object_id = models.IntegerField(null=True, blank=True, verbose_name=_('ID del objeto'))
+    # Días afectados; sin fechas los cambios de horario afectan a todos
+    start_date = models.DateField(null=True, blank=True, verbose_name=_('Desde'))
+    end_date = models.DateField(null=True, blank=True, verbose_name=_('Hasta'))
+    created_at = models.DateTimeField(auto_now_add=True, verbose_name=_('Fecha de creación'))
+
+    class Meta:
+        verbose_name = _('Cambio de Agenda')
+        verbose_name_plural = _('Cambios de Agenda')
+        ordering = ['id']
+        indexes = [
+            models.Index(fields=['veterinarian_id', 'id'], name='agenda_change_vet_idx'),
+            models.Index(fields=['created_at'], name='agenda_change_created_idx'),
+        ]
+
+    def __str__(self):
+        return f"Cambio {self.id} - {self.entity} {self.action} (Veterinario {self.veterinarian_id})"
+
+class AgendaCommit(models.Model):
+    """
+    Orden de confirmación de los cambios de agenda; su ID es el cursor del feed.
+    La fila se crea cuando el cambio ya está confirmado, así que un cambio de
+    una transacción larga (con ID de cambio menor) no queda detrás del cursor.
+    """
+    change = models.OneToOneField(
+        AgendaChange,
+        on_delete=models.CASCADE,
+        related_name='commit',
+        verbose_name=_('Cambio')
+    )
+    created_at = models.DateTimeField(auto_now_add=True, verbose_name=_('Fecha de confirmación'))
+
+    class Meta:
+        verbose_name = _('Confirmación de Cambio de Agenda')
+        verbose_name_plural = _('Confirmaciones de Cambios de Agenda')
+
+    def __str__(self):
+        return f"Confirmación {self.id} - Cambio {self.change_id}"
+
+class DailyUtilization(models.Model):
+    """Resumen diario de citas por veterinario y tipo de cita (analítica de uso)"""
+    veterinarian_id = models.IntegerField(verbose_name=_('ID del Veterinario'))
+    date = models.DateField(verbose_name=_('Fecha'))
+    appointment_type = models.CharField(
+        max_length=15,
+        choices=Appointment.AppointmentType.choices,
+        verbose_name=_('Tipo de cita')
+    )
+    appointments = models.IntegerField(default=0, verbose_name=_('Citas'))
+    # Minutos de citas no canceladas
+    booked_minutes = models.IntegerField(default=0, verbose_name=_('Minutos reservados'))
+    no_shows = models.IntegerField(default=0, verbose_name=_('Inasistencias'))
+    cancellations = models.IntegerField(default=0, verbose_name=_('Cancelaciones'))
+
+    class Meta:
+        verbose_name = _('Uso Diario')
+        verbose_name_plural = _('Uso Diario')
+        unique_together = ['veterinarian_id', 'date', 'appointment_type']
+        indexes = [
+            models.Index(fields=['date'], name='utilization_date_idx'),
+        ]
+
+    def __str__(self):
+        return f"Veterinario {self.veterinarian_id} - {self.date} {self.appointment_type}"
+
+class DailyCapacity(models.Model):
+    """Minutos de jornada y bloqueados por veterinario y día, según el horario vigente ese día"""
+    veterinarian_id = models.IntegerField(verbose_name=_('ID del Veterinario'))
+    date = models.DateField(verbose_name=_('Fecha'))
+    scheduled_minutes = models.IntegerField(default=0, verbose_name=_('Minutos de jornada'))
+    blocked_minutes = models.IntegerField(default=0, verbose_name=_('Minutos bloqueados'))
+
+    class Meta:
+        verbose_name = _('Capacidad Diaria')
+        verbose_name_plural = _('Capacidad Diaria')
+        unique_together = ['veterinarian_id', 'date']
+        indexes = [
+            models.Index(fields=['date'], name='capacity_date_idx'),
+        ]
+
+    def __str__(self):
+        return f"Veterinario {self.veterinarian_id} - {self.date}: {self.scheduled_minutes} min"
+
+class RollupCursor(models.Model):
+    """Último cambio de agenda aplicado a un resumen incremental (cursor de AgendaCommit)"""
+    name = models.CharField(max_length=50, unique=True, verbose_name=_('Nombre'))
+    last_change_id = models.BigIntegerField(default=0, verbose_name=_('Último cambio aplicado'))
+    updated_at = models.DateTimeField(auto_now=True, verbose_name=_('Fecha de actualización'))
+
+    class Meta:
+        verbose_name = _('Cursor de Resumen')
+        verbose_name_plural = _('Cursores de Resumen')
 
     def __str__(self):
-        return f"Bloqueo Veterinario {self.veterinarian_id} - {self.start_datetime} a {self.end_datetime}" 
\ No newline at end of file
+        return f"{self.name}: {self.last_change_id}"
@@ -0,0 +1,303 @@
+import logging
+import time
+from collections import defaultdict
+from contextlib import ExitStack, contextmanager
+from datetime import datetime, timedelta
+from django.conf import settings
+from django.core.cache import cache
+from .availability import AvailabilityEngine, ACTIVE_STATUSES, day_of_week
+from .models import Appointment
+from .schedules import schedule_cache
+from .blocks import get_block_indexes
+
+logger = logging.getLogger(__name__)
+
+QUANTUM_MINUTES = settings.OCCUPANCY_QUANTUM_MINUTES
+QUANTA_PER_DAY = 24 * 60 // QUANTUM_MINUTES
+# Segundos que un proceso puede retener el mapa de un día mientras lo modifica
+UPDATE_LOCK_SECONDS = 5
+# Espera entre intentos de tomar el bloqueo de un día
+LOCK_POLL_SECONDS = 0.01
+
+def _minutes(value, day_start):
+    return int((value - day_start).total_seconds() // 60)
+
+def _mask(start, end):
+    """Bits [start, end) encendidos"""
+    if end <= start:
+        return 0
+    return ((1 << (end - start)) - 1) << start
+
+def _busy_mask(start, end, day_start):
+    """Quanta que toca [start, end) dentro del día, redondeado hacia afuera"""
+    busy_start = max(_minutes(start, day_start) // QUANTUM_MINUTES, 0)
+    busy_end = min(-(-_minutes(end, day_start) // QUANTUM_MINUTES), QUANTA_PER_DAY)
+    return _mask(busy_start, busy_end)
+
+def build_bitmap(engine, veterinarian_id, date):
+    """
+    Mapa de bits del día: (quantum de inicio de la jornada, bits libres).
+    Cada bit representa QUANTUM_MINUTES; un bit encendido es tiempo reservable.
+    La jornada se redondea hacia adentro y lo ocupado hacia afuera.
+    """
+    hours = engine.working_hours(veterinarian_id, date)
+    if hours is None:
+        return (0, 0)
+
+    day_start = datetime.combine(date, datetime.min.time())
+    work_start = -(-_minutes(hours[0], day_start) // QUANTUM_MINUTES)
+    work_end = _minutes(hours[1], day_start) // QUANTUM_MINUTES
+    free = _mask(work_start, work_end)
+
+    for start, end in engine.busy_intervals(veterinarian_id, date):
+        free &= ~_busy_mask(start, end, day_start)
+
+    return (work_start, free)
+
+def bitmap_slots(bitmap, date, duration_minutes=None, step_minutes=None):
+    """Horas de inicio en las que cabe `duration_minutes`, resuelto con operaciones de bits"""
+    work_start, free = bitmap
+    if not free:
+        return []
+
+    duration = -(-(duration_minutes or settings.APPOINTMENT_DURATION_MINUTES) // QUANTUM_MINUTES)
+    step = max((step_minutes or settings.APPOINTMENT_DURATION_MINUTES) // QUANTUM_MINUTES, 1)
+    last_free = free.bit_length()
+    slot_mask = (1 << duration) - 1
+    day_start = datetime.combine(date, datetime.min.time())
+
+    slots = []
+    for quantum in range(work_start, last_free - duration + 1, step):
+        if (free >> quantum) & slot_mask == slot_mask:
+            slots.append((day_start + timedelta(minutes=quantum * QUANTUM_MINUTES)).time())
+    return slots
+
+class OccupancyCache:
+    """
+    Mapas de ocupación por veterinario y día guardados en el caché de Django.
+
+    Las claves incluyen una versión por veterinario: un cambio de horario
+    incrementa la versión e invalida de una vez todos sus días.
+    """
+
+    def __init__(self, timeout):
+        self.timeout = timeout
+
+    @staticmethod
+    def _version_key(veterinarian_id):
+        return f'occupancy:version:{veterinarian_id}'
+
+    def _versions(self, veterinarian_ids):
+        keys = {self._version_key(vet_id): vet_id for vet_id in veterinarian_ids}
+        found = cache.get_many(keys)
+        versions = {}
+        for key, vet_id in keys.items():
+            if key not in found:
+                cache.add(key, 1, timeout=None)
+                found[key] = cache.get(key, 1)
+            versions[vet_id] = found[key]
+        return versions
+
+    def _keys(self, veterinarian_ids, dates):
+        versions = self._versions(veterinarian_ids)
+        return {
+            f'occupancy:{versions[vet_id]}:{vet_id}:{date.isoformat()}': (vet_id, date)
+            for vet_id in veterinarian_ids
+            for date in dates
+        }
+
+    def get_bitmaps(self, veterinarian_ids, dates, engine=None):
+        """
+        Mapas de bits {(veterinario, fecha): bitmap}; los faltantes se calculan
+        y guardan. Con `engine` (que ya cubre esos días) se calculan desde él
+        sin volver a consultar la base de datos.
+        """
+        veterinarian_ids = [int(vet_id) for vet_id in veterinarian_ids]
+        try:
+            keys = self._keys(veterinarian_ids, dates)
+            cached = cache.get_many(keys)
+        except Exception as e:
+            logger.error(f"Error al leer mapas de ocupación: {e}")
+            return self._compute({(vet_id, date) for vet_id in veterinarian_ids for date in dates}, engine)
+
+        bitmaps = {keys[key]: tuple(value) for key, value in cached.items()}
+        missing = [key for key in keys if key not in cached]
+        if missing:
+            computed = self._compute({keys[key] for key in missing}, engine)
+            bitmaps.update(computed)
+            # add: si mientras tanto `apply` o `refresh` guardaron el día, su valor es más nuevo
+            for key in missing:
+                self._add(key, computed[keys[key]])
+        return bitmaps
+
+    def available_slots(self, veterinarian_id, date, duration_minutes=None):
+        bitmap = self.get_bitmaps([veterinarian_id], [date])[(int(veterinarian_id), date)]
+        return bitmap_slots(bitmap, date, duration_minutes)
+
+    @contextmanager
+    def _locked(self, key):
+        """
+        Bloqueo del mapa de un día para leerlo o recalcularlo y escribirlo.
+        Espera a que otro proceso lo suelte (vence a los UPDATE_LOCK_SECONDS);
+        entrega False si no lo consiguió, y entonces el mapa no debe escribirse.
+        """
+        lock_key = f'{key}:lock'
+        deadline = time.monotonic() + 2 * UPDATE_LOCK_SECONDS
+        acquired = cache.add(lock_key, 1, timeout=UPDATE_LOCK_SECONDS)
+        while not acquired and time.monotonic() < deadline:
+            time.sleep(LOCK_POLL_SECONDS)
+            acquired = cache.add(lock_key, 1, timeout=UPDATE_LOCK_SECONDS)
+        try:
+            yield acquired
+        finally:
+            if acquired:
+                cache.delete(lock_key)
+
+    def refresh(self, veterinarian_id, dates):
+        """
+        Recalcular y guardar los días indicados del veterinario. Toma el mismo
+        bloqueo que `apply`: un recálculo que se cruza con una actualización no
+        la pisa con datos leídos antes de ella.
+        """
+        dates = sorted(set(dates))
+        if not dates:
+            return
+        keys = self._keys([int(veterinarian_id)], dates)
+        with ExitStack() as stack:
+            # En orden de fecha, igual que cualquier otro proceso
+            locked = {key: stack.enter_context(self._locked(key)) for key in sorted(keys)}
+            computed = self._compute({keys[key] for key in locked if locked[key]})
+            self._store({key: computed[keys[key]] for key in locked if locked[key]})
+            self._discard([key for key in locked if not locked[key]])
+
+    def apply(self, changes):
+        """
+        Actualizar los mapas en caché con intervalos que cambiaron, sin
+        recalcular el día: `changes` es una lista de (veterinario, fecha,
+        inicio, fin, ocupado) en hora local.
+
+        Ocupar solo apaga los bits del intervalo. Liberar los enciende dentro de
+        la jornada y vuelve a apagar lo que sigue ocupado en ese tramo (otra
+        cita o un bloqueo que se solapaba), leído ya confirmado. Los días sin
+        mapa en caché se calculan completos.
+        """
+        by_day = defaultdict(list)
+        for veterinarian_id, date, start, end, busy in changes:
+            by_day[(int(veterinarian_id), date)].append((start, end, busy))
+
+        for (veterinarian_id, date), intervals in sorted(by_day.items()):
+            key = next(iter(self._keys([veterinarian_id], [date])))
+            # Lectura-modificación-escritura: un proceso a la vez por día
+            with self._locked(key) as acquired:
+                if not acquired:
+                    self._discard([key])
+                    continue
+                bitmap = cache.get(key)
+                if bitmap is None:
+                    # Sin mapa previo no hay nada que ajustar: se calcula completo
+                    self._store({key: self._compute({(veterinarian_id, date)})[(veterinarian_id, date)]})
+                    continue
+                day_start = datetime.combine(date, datetime.min.time())
+                work_start, free = bitmap
+                released = 0
+                for start, end, busy in intervals:
+                    if busy:
+                        free &= ~_busy_mask(start, end, day_start)
+                    else:
+                        released |= _busy_mask(start, end, day_start)
+                if released:
+                    free = self._release(veterinarian_id, date, free, released, intervals)
+                cache.set(key, (work_start, free), timeout=self.timeout)
+
+    def _release(self, veterinarian_id, date, free, released, intervals):
+        schedule = schedule_cache.get(veterinarian_id, day_of_week(date))
+        if schedule is None:
+            return 0
+        day_start = datetime.combine(date, datetime.min.time())
+        work = _mask(
+            -(-_minutes(datetime.combine(date, schedule.start_time), day_start) // QUANTUM_MINUTES),
+            _minutes(datetime.combine(date, schedule.end_time), day_start) // QUANTUM_MINUTES
+        )
+        free |= released & work
+
+        # Lo que sigue ocupado dentro de lo liberado
+        still_busy = [(start, end) for start, end, busy in intervals if busy]
+        for appointment_time, duration_minutes in Appointment.objects.filter(
+            veterinarian_id=veterinarian_id, appointment_date=date, status__in=ACTIVE_STATUSES
+        ).values_list('appointment_time', 'duration_minutes'):
+            start = datetime.combine(date, appointment_time)
+            still_busy.append((start, start + timedelta(minutes=duration_minutes)))
+        index = get_block_indexes([veterinarian_id])[veterinarian_id]
+        still_busy.extend(
+            (start, end) for start, end, _ in index.overlapping(day_start, day_start + timedelta(days=1))
+        )
+        for start, end in still_busy:
+            mask = _busy_mask(start, end, day_start)
+            if mask & released:
+                free &= ~mask
+        return free
+
+    def invalidate_veterinarian(self, veterinarian_id):
+        """Invalidar todos los días del veterinario"""
+        key = self._version_key(veterinarian_id)
+        cache.add(key, 1, timeout=None)
+        cache.incr(key)
+
+    def check(self, veterinarian_ids, dates, fix=False):
+        """
+        Comparar los mapas en caché con los calculados desde la base de datos.
+        Devuelve los (veterinario, fecha) inconsistentes; con `fix` los corrige.
+        """
+        keys = self._keys(veterinarian_ids, dates)
+        cached = cache.get_many(keys)
+        computed = self._compute(set(keys.values()))
+
+        mismatches = []
+        for key, vet_day in keys.items():
+            if key in cached and tuple(cached[key]) != computed[vet_day]:
+                mismatches.append(vet_day)
+        if fix:
+            # Se recalcula bajo el bloqueo de cada día, no con lo leído arriba
+            repaired = defaultdict(list)
+            for veterinarian_id, date in mismatches:
+                repaired[veterinarian_id].append(date)
+            for veterinarian_id, vet_dates in repaired.items():
+                self.refresh(veterinarian_id, vet_dates)
+        return mismatches
+
+    def _compute(self, vet_days, engine=None):
+        if not vet_days:
+            return {}
+        dates = [date for _, date in vet_days]
+        if engine is None:
+            engine = AvailabilityEngine({vet_id for vet_id, _ in vet_days}, min(dates), max(dates))
+        return {
+            (vet_id, date): build_bitmap(engine, vet_id, date)
+            for vet_id, date in vet_days
+        }
+
+    def _store(self, values):
+        if not values:
+            return
+        try:
+            cache.set_many(values, timeout=self.timeout)
+        except Exception as e:
+            logger.error(f"Error al guardar mapas de ocupación: {e}")
+
+    def _add(self, key, value):
+        try:
+            cache.add(key, value, timeout=self.timeout)
+        except Exception as e:
+            logger.error(f"Error al guardar mapas de ocupación: {e}")
+
+    def _discard(self, keys):
+        """Borrar días que no se pudieron actualizar; la próxima lectura los calcula"""
+        if not keys:
+            return
+        logger.warning(f"Mapas de ocupación descartados por bloqueo ocupado: {', '.join(keys)}")
+        try:
+            cache.delete_many(keys)
+        except Exception as e:
+            logger.error(f"Error al descartar mapas de ocupación: {e}")
+
+occupancy_cache = OccupancyCache(timeout=settings.OCCUPANCY_CACHE_TIMEOUT)
@@ -0,0 +1,111 @@
+import logging
+from abc import ABC, abstractmethod
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+from functools import lru_cache
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Q
+from django.template.loader import get_template
+from django.utils import timezone
+from django.utils.module_loading import import_string
+from .models import Appointment
+from .availability import ACTIVE_STATUSES, to_local_naive
+
+logger = logging.getLogger(__name__)
+
+REMINDER_FIELDS = (
+    'id', 'appointment_date', 'appointment_time', 'appointment_type',
+    'status', 'contact_phone', 'confirmation_required'
+)
+
+class ReminderSender(ABC):
+    """Canal de envío de recordatorios (SMS, WhatsApp, correo...)"""
+
+    @abstractmethod
+    def send(self, phone, message):
+        """Enviar `message` a `phone`; una excepción marca el envío como fallido"""
+
+class LoggingReminderSender(ReminderSender):
+    """Envío para desarrollo: solo registra el mensaje en el log, no guarda nada en memoria"""
+
+    def send(self, phone, message):
+        logger.info(f"Recordatorio para {phone}: {message}")
+
+@lru_cache(maxsize=None)
+def get_sender():
+    return import_string(settings.REMINDER_SENDER)()
+
+def due_reminders(now=None):
+    """Citas activas sin recordatorio que comienzan dentro de REMINDER_LEAD_HOURS"""
+    now = to_local_naive(now or timezone.now())
+    until = now + timedelta(hours=settings.REMINDER_LEAD_HOURS)
+    # Rango por fecha (índice appt_date_time_idx) y precisión por hora en los extremos
+    return Appointment.objects.filter(
+        Q(appointment_date__gt=now.date()) | Q(appointment_time__gte=now.time()),
+        Q(appointment_date__lt=until.date()) | Q(appointment_time__lte=until.time()),
+        reminder_sent=False,
+        appointment_date__range=(now.date(), until.date()),
+        status__in=ACTIVE_STATUSES,
+    )
+
+def claim_reminder_batch(now=None, batch_size=None):
+    """
+    Reservar un lote de recordatorios marcándolo con reminder_sent.
+    Las filas bloqueadas por otro worker se omiten, así cada cita se reclama una sola vez.
+    """
+    with transaction.atomic():
+        batch = list(
+            due_reminders(now)
+            .select_for_update(skip_locked=True)
+            .order_by('appointment_date', 'appointment_time')
+            .values(*REMINDER_FIELDS)[:batch_size or settings.REMINDER_BATCH_SIZE]
+        )
+        if batch:
+            Appointment.objects.filter(
+                id__in=[appointment['id'] for appointment in batch], reminder_sent=False
+            ).update(reminder_sent=True, updated_at=timezone.now())
+    return batch
+
+def render_reminder(appointment):
+    return get_template('appointments/reminder.txt').render({
+        'appointment_type': Appointment.AppointmentType(appointment['appointment_type']).label.lower(),
+        'appointment_date': appointment['appointment_date'],
+        'appointment_time': appointment['appointment_time'],
+        'confirmation_pending': (
+            appointment['confirmation_required'] and appointment['status'] == Appointment.Status.SCHEDULED
+        ),
+    }).strip()
+
+def send_reminders(batch, sender=None):
+    """Enviar el lote con concurrencia acotada; devuelve los IDs que fallaron"""
+    sender = sender or get_sender()
+
+    def send(appointment):
+        try:
+            sender.send(appointment['contact_phone'], render_reminder(appointment))
+            return None
+        except Exception as e:
+            logger.error(f"Error al enviar recordatorio de la cita {appointment['id']}: {e}")
+            return appointment['id']
+
+    with ThreadPoolExecutor(max_workers=settings.REMINDER_MAX_CONCURRENCY) as executor:
+        return [appointment_id for appointment_id in executor.map(send, batch) if appointment_id]
+
+def dispatch_due_reminders(now=None, batch_size=None, max_batches=None):
+    """Reclamar y enviar lotes hasta agotar los recordatorios pendientes"""
+    sent = 0
+    failed_ids = []
+    try:
+        for _ in range(max_batches or settings.REMINDER_MAX_BATCHES):
+            batch = claim_reminder_batch(now, batch_size)
+            if not batch:
+                break
+            batch_failed = send_reminders(batch)
+            sent += len(batch) - len(batch_failed)
+            failed_ids.extend(batch_failed)
+    finally:
+        if failed_ids:
+            # Se liberan al final para reintentarlos en la siguiente ejecución
+            Appointment.objects.filter(id__in=failed_ids).update(reminder_sent=False)
+    return {'sent': sent, 'failed': len(failed_ids)}
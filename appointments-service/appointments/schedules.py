@@ -0,0 +1,60 @@
+import logging
+import uuid
+from django.core.cache import cache
+from .models import VeterinarianSchedule
+
+logger = logging.getLogger(__name__)
+
+VERSION_KEY = 'schedules:version'
+
+class ScheduleCache:
+    """
+    Horarios activos de todos los veterinarios en memoria del proceso,
+    {(veterinario, día de la semana): VeterinarianSchedule}.
+
+    Cambian pocas veces al año: cada consulta solo lee la versión compartida en
+    el caché de Django y la tabla se vuelve a cargar cuando la versión cambia.
+    La versión es un token aleatorio, así que un caché vaciado tampoco deja
+    procesos con horarios viejos.
+    """
+
+    def __init__(self):
+        self._loaded = (None, {})
+
+    def _current_version(self):
+        version = cache.get(VERSION_KEY)
+        if version is None:
+            cache.add(VERSION_KEY, uuid.uuid4().hex, timeout=None)
+            version = cache.get(VERSION_KEY)
+        return version
+
+    def all(self):
+        try:
+            version = self._current_version()
+        except Exception as e:
+            logger.error(f"Error al leer la versión de horarios: {e}")
+            version = None
+
+        loaded_version, schedules = self._loaded
+        if version is None or version != loaded_version:
+            # La versión se lee antes de cargar: un cambio posterior siempre fuerza otra carga
+            schedules = {
+                (schedule.veterinarian_id, schedule.day_of_week): schedule
+                for schedule in VeterinarianSchedule.objects.filter(is_active=True)
+            }
+            if version is not None:
+                self._loaded = (version, schedules)
+        return schedules
+
+    def get(self, veterinarian_id, day_of_week):
+        """Horario activo del veterinario para el día, o None"""
+        return self.all().get((int(veterinarian_id), day_of_week))
+
+    def invalidate(self):
+        """Publicar una versión nueva; todos los procesos recargan en su próxima consulta"""
+        try:
+            cache.set(VERSION_KEY, uuid.uuid4().hex, timeout=None)
+        except Exception as e:
+            logger.error(f"Error al invalidar horarios: {e}")
+
+schedule_cache = ScheduleCache()
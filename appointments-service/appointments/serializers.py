@@ -1,8 +1,11 @@
 from rest_framework import serializers
 from django.conf import settings
-from datetime import datetime, timedelta
+from datetime import datetime, timedelta, date
 import requests
-from .models import Appointment, VeterinarianSchedule, AppointmentBlock
+from .models import Appointment, VeterinarianSchedule, AppointmentBlock, AppointmentSeries, WaitlistEntry, AgendaChange
+from .transitions import ALLOWED_TRANSITIONS
+from .blocks import get_block_indexes
+from .schedules import schedule_cache
 
 class AppointmentSerializer(serializers.ModelSerializer):
     end_time = serializers.ReadOnlyField()
@@ -14,7 +17,7 @@ class AppointmentSerializer(serializers.ModelSerializer):
     class Meta:
         model = Appointment
         fields = '__all__'
-        read_only_fields = ('id', 'created_at', 'updated_at', 'reminder_sent')
+        read_only_fields = ('id', 'created_at', 'updated_at', 'reminder_sent', 'series')
 
     def validate(self, data):
         """Validaciones complejas de citas"""
@@ -46,34 +49,22 @@ class AppointmentSerializer(serializers.ModelSerializer):
             'THURSDAY': 'JUEVES', 'FRIDAY': 'VIERNES', 'SATURDAY': 'SABADO', 'SUNDAY': 'DOMINGO'
         }
         
-        try:
-            schedule = VeterinarianSchedule.objects.get(
-                veterinarian_id=vet_id,
-                day_of_week=day_mapping[day_name],
-                is_active=True
-            )
-            
-            if not (schedule.start_time <= time <= schedule.end_time):
-                raise serializers.ValidationError({
-                    'appointment_time': f'El veterinario no está disponible a esta hora. Horario: {schedule.start_time}-{schedule.end_time}'
-                })
-        except VeterinarianSchedule.DoesNotExist:
+        schedule = schedule_cache.get(vet_id, day_mapping[day_name])
+        if schedule is None:
             raise serializers.ValidationError({
                 'veterinarian_id': 'El veterinario no tiene horario configurado para este día'
             })
+        if not (schedule.start_time <= time <= schedule.end_time):
+            raise serializers.ValidationError({
+                'appointment_time': f'El veterinario no está disponible a esta hora. Horario: {schedule.start_time}-{schedule.end_time}'
+            })
 
-        # Verificar bloqueos de horario
+        # Verificar bloqueos de horario en el índice del veterinario
         appointment_datetime = datetime.combine(date, time)
         end_datetime = appointment_datetime + timedelta(minutes=duration)
         
-        blocks = AppointmentBlock.objects.filter(
-            veterinarian_id=vet_id,
-            is_active=True,
-            start_datetime__lt=end_datetime,
-            end_datetime__gt=appointment_datetime
-        )
-        
-        if blocks.exists():
+        index = get_block_indexes([vet_id])[int(vet_id)]
+        if index.overlapping(appointment_datetime, end_datetime):
             raise serializers.ValidationError({
                 'appointment_time': 'El veterinario tiene el horario bloqueado en este momento'
             })
@@ -163,10 +154,116 @@ class AppointmentBlockSerializer(serializers.ModelSerializer):
             })
         return data
 
+class BulkBlockSerializer(serializers.Serializer):
+    """Mismo bloqueo para varios veterinarios (festivos, capacitaciones)"""
+    veterinarian_ids = serializers.ListField(
+        child=serializers.IntegerField(),
+        allow_empty=False,
+        max_length=settings.BULK_BLOCK_MAX_VETERINARIANS
+    )
+    start_datetime = serializers.DateTimeField()
+    end_datetime = serializers.DateTimeField()
+    reason = serializers.CharField(max_length=200)
+
+    def validate(self, data):
+        if data['start_datetime'] >= data['end_datetime']:
+            raise serializers.ValidationError({
+                'end_datetime': 'La fecha de fin debe ser posterior a la fecha de inicio'
+            })
+        return data
+
+class AgendaChangeSerializer(serializers.ModelSerializer):
+    # Cursor del feed: orden de confirmación del cambio
+    sequence = serializers.IntegerField(read_only=True)
+
+    class Meta:
+        model = AgendaChange
+        fields = '__all__'
+
 class AgendaSerializer(serializers.Serializer):
     """Serializer para mostrar la agenda de un veterinario"""
     date = serializers.DateField()
     veterinarian_id = serializers.IntegerField()
     appointments = AppointmentListSerializer(many=True, read_only=True)
     available_slots = serializers.ListField(child=serializers.TimeField(), read_only=True)
-    blocked_periods = serializers.ListField(read_only=True) 
\ No newline at end of file
+    blocked_periods = serializers.ListField(read_only=True)
+
+class BulkTransitionSerializer(serializers.Serializer):
+    """Cambio de estado de varias citas en una sola operación"""
+    ids = serializers.ListField(
+        child=serializers.IntegerField(),
+        allow_empty=False,
+        max_length=settings.BULK_TRANSITION_MAX_SIZE
+    )
+    status = serializers.ChoiceField(choices=[
+        (status, Appointment.Status(status).label) for status in ALLOWED_TRANSITIONS
+    ])
+
+class AppointmentSeriesSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = AppointmentSeries
+        fields = '__all__'
+        read_only_fields = ('id', 'is_active', 'created_at', 'updated_at', 'created_by')
+
+    def validate(self, data):
+        if data['start_date'] < date.today():
+            raise serializers.ValidationError({
+                'start_date': 'La serie no puede comenzar en el pasado'
+            })
+        if data.get('end_date') and data['end_date'] < data['start_date']:
+            raise serializers.ValidationError({
+                'end_date': 'La fecha de fin debe ser posterior a la fecha de inicio'
+            })
+        return data
+
+class SeriesFollowingSerializer(serializers.Serializer):
+    """Fecha desde la que se aplica un cambio a la serie ("esta y las siguientes")"""
+    from_date = serializers.DateField(required=False)
+
+    def validate_from_date(self, value):
+        return max(value, date.today())
+
+class SeriesUpdateSerializer(SeriesFollowingSerializer):
+    veterinarian_id = serializers.IntegerField(required=False)
+    appointment_time = serializers.TimeField(required=False)
+    duration_minutes = serializers.IntegerField(required=False, min_value=15, max_value=240)
+    priority = serializers.ChoiceField(choices=Appointment.Priority.choices, required=False)
+    reason = serializers.CharField(required=False)
+    notes = serializers.CharField(required=False, allow_blank=True)
+    contact_phone = serializers.CharField(required=False, max_length=15)
+
+    def validate(self, data):
+        if len(data.keys() - {'from_date'}) == 0:
+            raise serializers.ValidationError('Debe indicar al menos un campo a modificar')
+        return data
+
+class WaitlistEntrySerializer(serializers.ModelSerializer):
+    offered_appointment = AppointmentListSerializer(read_only=True)
+
+    class Meta:
+        model = WaitlistEntry
+        fields = '__all__'
+        read_only_fields = (
+            'id', 'status', 'offered_at', 'offer_expires_at', 'created_at', 'updated_at', 'created_by'
+        )
+
+    def validate(self, data):
+        # En una actualización parcial los campos omitidos conservan su valor
+        def value(field):
+            return data.get(field, getattr(self.instance, field, None))
+
+        earliest_date, latest_date = value('earliest_date'), value('latest_date')
+        if latest_date < earliest_date:
+            raise serializers.ValidationError({
+                'latest_date': 'La fecha final debe ser posterior a la fecha inicial'
+            })
+        if latest_date < date.today():
+            raise serializers.ValidationError({
+                'latest_date': 'La ventana de espera ya terminó'
+            })
+        earliest_time, latest_time = value('earliest_time'), value('latest_time')
+        if earliest_time and latest_time and latest_time < earliest_time:
+            raise serializers.ValidationError({
+                'latest_time': 'La hora final debe ser posterior a la hora inicial'
+            })
+        return data
@@ -0,0 +1,161 @@
+import calendar
+from datetime import timedelta
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+from rest_framework import serializers
+from .models import Appointment, AppointmentSeries
+from .availability import AvailabilityEngine, ACTIVE_STATUSES
+from .booking import lock_veterinarian_days
+from .events import appointments_changed
+
+# Campos de la serie que se copian a cada cita
+SERIES_FIELDS = (
+    'patient_id', 'owner_id', 'veterinarian_id', 'appointment_time', 'duration_minutes',
+    'appointment_type', 'priority', 'reason', 'notes', 'contact_phone',
+)
+# Campos que cambian la ocupación del veterinario y requieren verificar conflictos
+SCHEDULING_FIELDS = ('veterinarian_id', 'appointment_time', 'duration_minutes')
+
+def _add_months(date, months):
+    month_index = date.month - 1 + months
+    year, month = date.year + month_index // 12, month_index % 12 + 1
+    return date.replace(year=year, month=month, day=min(date.day, calendar.monthrange(year, month)[1]))
+
+def expand_occurrences(series):
+    """
+    Fechas de la serie, generadas bajo demanda. Termina en end_date,
+    occurrence_count o el horizonte SERIES_HORIZON_DAYS, lo que llegue primero.
+    """
+    horizon = series.start_date + timedelta(days=settings.SERIES_HORIZON_DAYS)
+    last_date = min(series.end_date, horizon) if series.end_date else horizon
+    limit = min(series.occurrence_count or settings.SERIES_MAX_OCCURRENCES, settings.SERIES_MAX_OCCURRENCES)
+
+    for index in range(limit):
+        if series.frequency == AppointmentSeries.Frequency.MONTHLY:
+            date = _add_months(series.start_date, index * series.interval)
+        else:
+            days = 7 if series.frequency == AppointmentSeries.Frequency.WEEKLY else 1
+            date = series.start_date + timedelta(days=index * series.interval * days)
+        if date > last_date:
+            return
+        yield date
+
+def _patient_taken(patient_id, dates, appointment_time, exclude_ids=()):
+    """Fechas en las que el paciente ya tiene una cita a esa hora (única por paciente, fecha y hora)"""
+    return set(
+        Appointment.objects.filter(
+            patient_id=patient_id, appointment_date__in=dates, appointment_time=appointment_time
+        ).exclude(id__in=exclude_ids).order_by().values_list('appointment_date', flat=True)
+    )
+
+def check_occurrences(values, dates, exclude_ids=()):
+    """
+    Verificar todas las fechas contra la disponibilidad en una sola pasada.
+    Devuelve {fecha: motivo} de las que no se pueden reservar. Se llama con los
+    días bloqueados, así que los bloqueos se leen de la base de datos: el índice
+    en caché puede no tener uno recién creado.
+    """
+    if not dates:
+        return {}
+    engine = AvailabilityEngine([values['veterinarian_id']], min(dates), max(dates), fresh_blocks=True)
+    taken = _patient_taken(values['patient_id'], dates, values['appointment_time'], exclude_ids)
+
+    rejected = {}
+    for date in dates:
+        if date in taken:
+            rejected[date] = 'El paciente ya tiene una cita agendada a esta hora'
+            continue
+        conflict = engine.slot_conflict(
+            values['veterinarian_id'], date, values['appointment_time'],
+            values['duration_minutes'], exclude_ids
+        )
+        if conflict:
+            rejected[date] = conflict
+    return rejected
+
+def _notify(appointment_ids, status, vet_days):
+    if appointment_ids:
+        appointments_changed.send(
+            sender=Appointment, appointment_ids=appointment_ids, status=status, vet_days=vet_days
+        )
+
+def materialize_series(series):
+    """
+    Crear las citas de la serie. Las fechas con conflicto se omiten y se
+    devuelven como {fecha: motivo}; el resto se inserta con un solo bulk_create.
+    """
+    values = {field: getattr(series, field) for field in SERIES_FIELDS}
+    dates = list(expand_occurrences(series))
+
+    with transaction.atomic():
+        lock_veterinarian_days(series.veterinarian_id, dates)
+        rejected = check_occurrences(values, dates)
+        accepted = [date for date in dates if date not in rejected]
+
+        Appointment.objects.bulk_create([
+            Appointment(
+                series=series, appointment_date=date, created_by=series.created_by, **values
+            )
+            for date in accepted
+        ])
+        # MySQL no devuelve los IDs de bulk_create
+        created = list(Appointment.objects.filter(series=series).order_by().values_list('id', flat=True))
+        _notify(created, Appointment.Status.SCHEDULED, {(series.veterinarian_id, date) for date in accepted})
+
+    return accepted, rejected
+
+def _following(series, from_date):
+    return Appointment.objects.filter(
+        series=series, appointment_date__gte=from_date, status__in=ACTIVE_STATUSES
+    )
+
+def update_following(series, from_date, changes):
+    """
+    Aplicar `changes` a esta cita y las siguientes con un solo UPDATE. Si cambia
+    el horario se verifican todas primero; ante cualquier conflicto no se modifica ninguna.
+    """
+    with transaction.atomic():
+        targets = list(_following(series, from_date).values_list('id', 'veterinarian_id', 'appointment_date'))
+        target_ids = [appointment_id for appointment_id, _, _ in targets]
+        dates = [date for _, _, date in targets]
+        values = {field: changes.get(field, getattr(series, field)) for field in SERIES_FIELDS}
+
+        if targets and any(field in changes for field in SCHEDULING_FIELDS):
+            lock_veterinarian_days(values['veterinarian_id'], dates)
+            rejected = check_occurrences(values, dates, exclude_ids=target_ids)
+            if rejected:
+                raise serializers.ValidationError({
+                    'conflicts': [{'date': date, 'error': error} for date, error in sorted(rejected.items())]
+                })
+
+        updated = Appointment.objects.filter(id__in=target_ids).update(**changes, updated_at=timezone.now())
+        for field, value in changes.items():
+            setattr(series, field, value)
+        series.save()
+
+        _notify(
+            target_ids, None,
+            {(vet_id, date) for _, vet_id, date in targets} | {(values['veterinarian_id'], date) for date in dates}
+        )
+    return updated
+
+def cancel_following(series, from_date):
+    """Cancelar esta cita y las siguientes; la serie termina el día anterior"""
+    with transaction.atomic():
+        targets = list(_following(series, from_date).values_list('id', 'veterinarian_id', 'appointment_date'))
+        cancelled = Appointment.objects.filter(id__in=[target[0] for target in targets]).update(
+            status=Appointment.Status.CANCELLED, updated_at=timezone.now()
+        )
+
+        if from_date <= series.start_date:
+            series.is_active = False
+        else:
+            series.end_date = from_date - timedelta(days=1)
+        series.save()
+
+        _notify(
+            [target[0] for target in targets], Appointment.Status.CANCELLED,
+            {(vet_id, date) for _, vet_id, date in targets}
+        )
+    return cancelled
@@ -0,0 +1,235 @@
+import logging
+from datetime import datetime, timedelta, time
+from django.conf import settings
+from django.db import transaction
+from django.db.models.signals import post_init, post_save, post_delete
+from django.dispatch import receiver
+from .models import Appointment, VeterinarianSchedule, AppointmentBlock, AgendaChange
+from .availability import to_local_naive, ACTIVE_STATUSES
+from .occupancy import occupancy_cache
+from .events import appointments_changed, blocks_changed
+from .changes import record_change
+from .blocks import invalidate_block_indexes
+from .schedules import schedule_cache
+from .bookable import bookable_slots
+
+logger = logging.getLogger(__name__)
+
+def _block_dates(veterinarian_id, start_datetime, end_datetime):
+    start = to_local_naive(start_datetime).date()
+    end = to_local_naive(end_datetime).date()
+    return [(veterinarian_id, start + timedelta(days=offset)) for offset in range((end - start).days + 1)]
+
+def _change_action(kwargs):
+    """Acción del feed de agenda según la señal recibida"""
+    if 'created' not in kwargs:
+        return AgendaChange.Action.DELETED
+    return AgendaChange.Action.CREATED if kwargs['created'] else AgendaChange.Action.UPDATED
+
+def _block_intervals(veterinarian_id, start_datetime, end_datetime):
+    """Un bloqueo como intervalos (veterinario, fecha, inicio, fin) de cada día que toca"""
+    start = to_local_naive(start_datetime)
+    end = to_local_naive(end_datetime)
+    intervals = []
+    for _, date in _block_dates(veterinarian_id, start_datetime, end_datetime):
+        day_start = datetime.combine(date, time.min)
+        intervals.append((veterinarian_id, date, max(start, day_start), min(end, day_start + timedelta(days=1))))
+    return intervals
+
+def _appointment_interval(veterinarian_id, date, appointment_time, duration_minutes, status):
+    """Intervalo (veterinario, fecha, inicio, fin) que ocupa la cita, o None si no ocupa horario"""
+    if veterinarian_id is None or date is None or appointment_time is None or status not in ACTIVE_STATUSES:
+        return None
+    start = datetime.combine(date, appointment_time)
+    return (veterinarian_id, date, start, start + timedelta(minutes=duration_minutes))
+
+def _interval_changes(released, occupied):
+    """Cambios (veterinario, fecha, inicio, fin, ocupado) entre dos conjuntos de intervalos"""
+    released, occupied = set(released), set(occupied)
+    return (
+        [(*interval, False) for interval in released - occupied]
+        + [(*interval, True) for interval in occupied - released]
+    )
+
+def _update_after_commit(vet_days, update):
+    """
+    Una vez confirmada la transacción, actualizar los mapas de los días
+    afectados con `update(veterinario, fechas)` y el modelo de horarios
+    reservables. Un veterinario con demasiados días se invalida entero.
+    """
+    def run():
+        by_veterinarian = {}
+        for veterinarian_id, date in vet_days:
+            by_veterinarian.setdefault(veterinarian_id, set()).add(date)
+        rebuild = []
+        try:
+            for veterinarian_id, dates in by_veterinarian.items():
+                if len(dates) > settings.OCCUPANCY_MAX_REFRESH_DAYS:
+                    occupancy_cache.invalidate_veterinarian(veterinarian_id)
+                    rebuild.append(veterinarian_id)
+                else:
+                    update(veterinarian_id, dates)
+                    # Reutiliza los mapas recién guardados
+                    bookable_slots.refresh(veterinarian_id, dates)
+        except Exception as e:
+            logger.error(f"Error al actualizar mapas de ocupación: {e}")
+        if rebuild:
+            _rebuild_bookable_slots(rebuild)
+    transaction.on_commit(run)
+
+def _refresh_after_commit(vet_days):
+    """Recalcular los días afectados una vez confirmada la transacción"""
+    _update_after_commit(vet_days, occupancy_cache.refresh)
+
+def _apply_after_commit(changes):
+    """Aplicar a los mapas solo los intervalos que cambiaron, una vez confirmada la transacción"""
+    if not changes:
+        return
+
+    def update(veterinarian_id, dates):
+        occupancy_cache.apply([change for change in changes if change[0] == veterinarian_id])
+    _update_after_commit({(change[0], change[1]) for change in changes}, update)
+
+def _rebuild_bookable_slots(veterinarian_ids):
+    """Reescribir el horizonte reservable de los veterinarios fuera del hilo de la petición"""
+    from .tasks import rebuild_bookable_slots
+    try:
+        rebuild_bookable_slots.delay(sorted(veterinarian_ids))
+    except Exception as e:
+        logger.error(f"Error al encolar la reconstrucción de horarios reservables: {e}")
+
+def _match_waitlist_after_commit(appointment_ids):
+    """Buscar reemplazo en la lista de espera fuera del hilo de la petición"""
+    from .tasks import match_waitlist
+
+    def enqueue():
+        try:
+            match_waitlist.delay(list(appointment_ids))
+        except Exception as e:
+            logger.error(f"Error al encolar la lista de espera: {e}")
+    transaction.on_commit(enqueue)
+
+def _current_appointment_interval(instance):
+    return _appointment_interval(
+        instance.veterinarian_id, instance.appointment_date, instance.appointment_time,
+        instance.duration_minutes, instance.status
+    )
+
+@receiver(post_init, sender=Appointment)
+def remember_appointment_day(sender, instance, **kwargs):
+    instance._occupancy_day = (instance.veterinarian_id, instance.appointment_date)
+    # Una cita nueva todavía no ocupa nada en el mapa
+    instance._occupancy_interval = _current_appointment_interval(instance) if instance.pk is not None else None
+    instance._original_status = instance.status
+
+@receiver(post_save, sender=Appointment)
+@receiver(post_delete, sender=Appointment)
+def appointment_changed(sender, instance, **kwargs):
+    vet_days = {(instance.veterinarian_id, instance.appointment_date)}
+    if instance._occupancy_day[0] is not None:
+        vet_days.add(instance._occupancy_day)
+    # Borrada, la cita deja de ocupar su horario
+    current = _current_appointment_interval(instance) if 'created' in kwargs else None
+    _apply_after_commit(_interval_changes(
+        [instance._occupancy_interval] if instance._occupancy_interval else [],
+        [current] if current else []
+    ))
+    for veterinarian_id, date in vet_days:
+        record_change(
+            AgendaChange.Entity.APPOINTMENT, _change_action(kwargs), veterinarian_id, date, object_id=instance.id
+        )
+    instance._occupancy_day = (instance.veterinarian_id, instance.appointment_date)
+    instance._occupancy_interval = current
+
+@receiver(post_save, sender=Appointment)
+def appointment_cancelled(sender, instance, created, **kwargs):
+    if (not created and instance.status == Appointment.Status.CANCELLED
+            and instance._original_status in ACTIVE_STATUSES):
+        _match_waitlist_after_commit([instance.id])
+    instance._original_status = instance.status
+
+@receiver(appointments_changed)
+def appointments_bulk_changed(sender, appointment_ids, status, vet_days, **kwargs):
+    _refresh_after_commit(vet_days)
+    # Un registro por veterinario con el rango de días afectados
+    by_veterinarian = {}
+    for veterinarian_id, date in vet_days:
+        by_veterinarian.setdefault(veterinarian_id, []).append(date)
+    for veterinarian_id, dates in by_veterinarian.items():
+        record_change(
+            AgendaChange.Entity.APPOINTMENT, AgendaChange.Action.UPDATED, veterinarian_id, min(dates), max(dates)
+        )
+    if status == Appointment.Status.CANCELLED:
+        _match_waitlist_after_commit(appointment_ids)
+
+def _active_block_intervals(period, is_active):
+    if not is_active or period[1] is None or period[2] is None:
+        return []
+    return _block_intervals(*period)
+
+@receiver(post_init, sender=AppointmentBlock)
+def remember_block_period(sender, instance, **kwargs):
+    instance._occupancy_period = (instance.veterinarian_id, instance.start_datetime, instance.end_datetime)
+    instance._occupancy_active = instance.is_active and instance.pk is not None
+
+@receiver(post_save, sender=AppointmentBlock)
+@receiver(post_delete, sender=AppointmentBlock)
+def block_changed(sender, instance, **kwargs):
+    vet_days = set(_block_dates(instance.veterinarian_id, instance.start_datetime, instance.end_datetime))
+    if instance._occupancy_period[1] is not None:
+        vet_days.update(_block_dates(*instance._occupancy_period))
+    # Antes de actualizar la ocupación, que puede volver a llenar el índice
+    invalidate_block_indexes({veterinarian_id for veterinarian_id, _ in vet_days})
+    period = (instance.veterinarian_id, instance.start_datetime, instance.end_datetime)
+    _apply_after_commit(_interval_changes(
+        _active_block_intervals(instance._occupancy_period, instance._occupancy_active),
+        _active_block_intervals(period, instance.is_active and 'created' in kwargs)
+    ))
+
+    periods = {(instance.veterinarian_id, instance.start_datetime, instance.end_datetime)}
+    if instance._occupancy_period[1] is not None:
+        periods.add(instance._occupancy_period)
+    for veterinarian_id, start_datetime, end_datetime in periods:
+        record_change(
+            AgendaChange.Entity.BLOCK, _change_action(kwargs), veterinarian_id,
+            to_local_naive(start_datetime).date(), to_local_naive(end_datetime).date(), object_id=instance.id
+        )
+    instance._occupancy_period = period
+    instance._occupancy_active = instance.is_active
+
+@receiver(blocks_changed)
+def blocks_bulk_changed(sender, periods, **kwargs):
+    invalidate_block_indexes({veterinarian_id for veterinarian_id, _, _ in periods})
+    # Los periodos fusionados solo crecen: basta con ocuparlos
+    _apply_after_commit([
+        (*interval, True) for period in periods for interval in _block_intervals(*period)
+    ])
+    for veterinarian_id, start_datetime, end_datetime in periods:
+        record_change(
+            AgendaChange.Entity.BLOCK, AgendaChange.Action.UPDATED, veterinarian_id,
+            to_local_naive(start_datetime).date(), to_local_naive(end_datetime).date()
+        )
+
+@receiver(post_init, sender=VeterinarianSchedule)
+def remember_schedule_veterinarian(sender, instance, **kwargs):
+    instance._occupancy_veterinarian = instance.veterinarian_id
+
+@receiver(post_save, sender=VeterinarianSchedule)
+@receiver(post_delete, sender=VeterinarianSchedule)
+def schedule_changed(sender, instance, **kwargs):
+    veterinarian_ids = {instance.veterinarian_id, instance._occupancy_veterinarian} - {None}
+
+    def invalidate():
+        schedule_cache.invalidate()
+        try:
+            for veterinarian_id in veterinarian_ids:
+                occupancy_cache.invalidate_veterinarian(veterinarian_id)
+        except Exception as e:
+            logger.error(f"Error al invalidar mapas de ocupación: {e}")
+        _rebuild_bookable_slots(veterinarian_ids)
+    # También antes de confirmar, para que este proceso vea su propio cambio
+    schedule_cache.invalidate()
+    transaction.on_commit(invalidate)
+    for veterinarian_id in veterinarian_ids:
+        record_change(AgendaChange.Entity.SCHEDULE, _change_action(kwargs), veterinarian_id, object_id=instance.id)
+    instance._occupancy_veterinarian = instance.veterinarian_id
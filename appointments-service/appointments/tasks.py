@@ -0,0 +1,44 @@
+from datetime import date, timedelta
+from django.conf import settings
+from celery import shared_task
+from .reminders import dispatch_due_reminders
+from .waitlist import match_freed_appointments, expire_offers
+from .changes import prune_changes
+from .analytics import refresh_pending, refresh_range
+from .bookable import bookable_slots
+
+@shared_task
+def dispatch_reminders():
+    """Enviar los recordatorios de citas próximas (programada en CELERY_BEAT_SCHEDULE)"""
+    return dispatch_due_reminders()
+
+@shared_task
+def match_waitlist(appointment_ids):
+    """Ofrecer a la lista de espera los horarios de citas canceladas"""
+    return match_freed_appointments(appointment_ids)
+
+@shared_task
+def expire_waitlist_offers():
+    """Vencer ofertas de lista de espera no aceptadas (programada en CELERY_BEAT_SCHEDULE)"""
+    return expire_offers()
+
+@shared_task
+def prune_agenda_changes():
+    """Eliminar cambios de agenda fuera del período de retención"""
+    return prune_changes()
+
+@shared_task
+def refresh_utilization():
+    """Aplicar al resumen de uso los cambios de agenda pendientes"""
+    return refresh_pending()
+
+@shared_task
+def rollup_utilization_window():
+    """Resumir ayer, hoy y los próximos días aunque no hayan tenido cambios"""
+    today = date.today()
+    return refresh_range(today - timedelta(days=1), today + timedelta(days=settings.UTILIZATION_FORWARD_DAYS))
+
+@shared_task
+def rebuild_bookable_slots(veterinarian_ids=None):
+    """Reescribir el horizonte de horarios reservables (todos los veterinarios sin `veterinarian_ids`)"""
+    return bookable_slots.rebuild(veterinarian_ids)
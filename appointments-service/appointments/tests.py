@@ -0,0 +1,1576 @@
+from datetime import date, time, datetime, timedelta
+import threading
+from io import StringIO
+import jwt
+import redis
+from django.conf import settings
+from django.core.cache import cache
+from django.core.management import call_command, CommandError
+from django.db import connection
+from django.db.models import Sum
+from unittest import skipUnless
+from unittest.mock import Mock, patch
+from django.test import TestCase, TransactionTestCase, skipUnlessDBFeature, override_settings
+from django.test.utils import CaptureQueriesContext
+from rest_framework.exceptions import AuthenticationFailed
+from rest_framework.exceptions import ValidationError
+from django.utils import timezone
+from rest_framework.test import APIRequestFactory, APITestCase
+from rest_framework import status
+from appointments_service.authentication import AuthenticatedUser, JWTAuthentication, get_token_backend
+from appointments_service.celery import app as celery_app
+from .models import (
+    Appointment, ArchivedAppointment, VeterinarianSchedule, AppointmentBlock, AppointmentSeries, WaitlistEntry,
+    DailyUtilization, VeterinarianDayLock, AgendaChange
+)
+from .availability import AvailabilityEngine, next_available_slots
+from .occupancy import occupancy_cache, build_bitmap, bitmap_slots
+from .booking import book_appointment
+from .series import expand_occurrences
+from .waitlist import offer_slot, expire_offers
+from .analytics import refresh_pending, refresh_range
+from .blocks import BlockIndex, create_blocks, get_block_indexes
+from .schedules import schedule_cache
+from .bookable import bookable_slots
+from .archive import archive_watermark, archive_batch, archive_cutoff
+from .events import appointments_changed
+from .changes import changes_since, current_cursor, record_change
+from .reminders import (
+    ReminderSender, get_sender, due_reminders, claim_reminder_batch, dispatch_due_reminders,
+    render_reminder
+)
+from .serializers import AppointmentCreateSerializer
+
+# Las tareas de Celery se ejecutan en el proceso de pruebas
+celery_app.conf.task_always_eager = True
+
+# Lunes
+MONDAY = date(2030, 1, 7)
+
+def booking_data(appointment_time, patient_id, veterinarian_id=1, **kwargs):
+    data = {
+        'patient_id': patient_id,
+        'owner_id': 1,
+        'veterinarian_id': veterinarian_id,
+        'appointment_date': MONDAY.isoformat(),
+        'appointment_time': appointment_time.strftime('%H:%M'),
+        'reason': 'Control',
+        'contact_phone': '5550000000',
+        'created_by': 1,
+    }
+    data.update(kwargs)
+    return data
+
+def create_appointment(veterinarian_id=1, appointment_date=MONDAY, appointment_time=time(9, 0), **kwargs):
+    data = {
+        'patient_id': kwargs.pop('patient_id', Appointment.objects.count() + 1),
+        'owner_id': 1,
+        'veterinarian_id': veterinarian_id,
+        'appointment_date': appointment_date,
+        'appointment_time': appointment_time,
+        'reason': 'Control',
+        'contact_phone': '5550000000',
+        'created_by': 1,
+    }
+    data.update(kwargs)
+    return Appointment.objects.create(**data)
+
+def query_plans(captured, table):
+    """Planes de ejecución de las consultas SELECT capturadas que leen `table`"""
+    explain = 'EXPLAIN QUERY PLAN ' if connection.vendor == 'sqlite' else 'EXPLAIN '
+    quoted = connection.ops.quote_name(table)
+    plans = []
+    with connection.cursor() as cursor:
+        for query in captured:
+            if query['sql'].startswith('SELECT') and quoted in query['sql']:
+                cursor.execute(explain + query['sql'])
+                plans.append(str(cursor.fetchall()))
+    return plans
+
+@override_settings(
+    JWT_VERIFICATION_MODE='local', JWT_REVOCATION_CHECK_METHODS=['DELETE'],
+    JWT_SIGNING_KEY='clave-de-firma-de-pruebas-de-32-bytes'
+)
+class LocalTokenVerificationTest(TestCase):
+    """Verificación local de tokens de acceso emitidos por auth-service"""
+
+    def setUp(self):
+        # El backend se construye una vez por proceso con la llave de settings
+        get_token_backend.cache_clear()
+        self.addCleanup(get_token_backend.cache_clear)
+
+    def make_token(self, key=None, **claims):
+        payload = {
+            'token_type': 'access',
+            'user_id': 5,
+            'role': 'Veterinario',
+            'is_active': True,
+            'exp': timezone.now() + timedelta(minutes=5),
+        }
+        payload.update(claims)
+        payload = {claim: value for claim, value in payload.items() if value is not None}
+        return jwt.encode(payload, key or settings.JWT_SIGNING_KEY, algorithm=settings.JWT_ALGORITHM)
+
+    def authenticate(self, token, method='get'):
+        request = getattr(APIRequestFactory(), method)('/', HTTP_AUTHORIZATION=f'Bearer {token}')
+        return JWTAuthentication().authenticate(request)
+
+    @patch('appointments_service.authentication.get_client')
+    def test_valid_token_without_remote_call(self, get_client):
+        """Test un token válido se acepta sin consultar a auth-service"""
+        user, _ = self.authenticate(self.make_token())
+        self.assertEqual((user['id'], user['role']), (5, 'Veterinario'))
+        get_client.assert_not_called()
+
+    def test_rejects_invalid_tokens(self):
+        """Test firma incorrecta, vencido, claims faltantes o token de refresco"""
+        invalid = {
+            'firma': self.make_token(key='otra-clave-de-firma-de-al-menos-32-bytes'),
+            'vencido': self.make_token(exp=timezone.now() - timedelta(seconds=1)),
+            'sin usuario': self.make_token(user_id=None),
+            'sin tipo': self.make_token(token_type=None),
+            'refresco': self.make_token(token_type='refresh'),
+            'inactivo': self.make_token(is_active=False),
+            'basura': 'no-es-un-jwt',
+        }
+        for case, token in invalid.items():
+            with self.subTest(case):
+                with self.assertRaises(AuthenticationFailed):
+                    self.authenticate(token)
+
+    @patch('appointments_service.authentication.get_client')
+    def test_revocation_check_methods_ask_auth_service(self, get_client):
+        """Test los métodos configurados se verifican con auth-service aunque el token sea válido"""
+        get_client.return_value.post.return_value = Mock(status_code=401)
+        with self.assertRaises(AuthenticationFailed):
+            self.authenticate(self.make_token(jti='revocado'), method='delete')
+        get_client.return_value.post.assert_called_once()
+
+class AvailabilityEngineTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        VeterinarianSchedule.objects.create(
+            veterinarian_id=1,
+            day_of_week=VeterinarianSchedule.DayOfWeek.MONDAY,
+            start_time=time(8, 0),
+            end_time=time(12, 0)
+        )
+
+    def test_slots_skip_appointments_and_blocks(self):
+        """Test los slots excluyen citas activas y bloqueos, no las canceladas"""
+        create_appointment(appointment_time=time(9, 0), duration_minutes=60)
+        create_appointment(appointment_time=time(8, 0), status=Appointment.Status.CANCELLED)
+        AppointmentBlock.objects.create(
+            veterinarian_id=1,
+            start_datetime=timezone.make_aware(datetime.combine(MONDAY, time(11, 0))),
+            end_datetime=timezone.make_aware(datetime.combine(MONDAY, time(11, 30))),
+            reason='Reunión',
+            created_by=1
+        )
+
+        engine = AvailabilityEngine([1], MONDAY)
+        self.assertEqual(
+            engine.available_slots(1, MONDAY),
+            [time(8, 0), time(8, 30), time(10, 0), time(10, 30), time(11, 30)]
+        )
+
+    def test_slots_with_longer_duration(self):
+        """Test una cirugía de 90 minutos solo cabe en huecos suficientes"""
+        create_appointment(appointment_time=time(10, 0))
+
+        engine = AvailabilityEngine([1], MONDAY)
+        self.assertEqual(
+            engine.available_slots(1, MONDAY, duration_minutes=90),
+            [time(8, 0), time(8, 30), time(10, 30)]
+        )
+
+    def test_no_schedule_no_slots(self):
+        """Test sin horario activo no hay disponibilidad"""
+        engine = AvailabilityEngine([1], date(2030, 1, 8))
+        self.assertEqual(engine.available_slots(1, date(2030, 1, 8)), [])
+
+class AgendaAPITest(APITestCase):
+    def setUp(self):
+        cache.clear()
+        self.client.force_authenticate(user=AuthenticatedUser({'id': 1, 'role': 'Admin'}))
+        VeterinarianSchedule.objects.create(
+            veterinarian_id=1,
+            day_of_week=VeterinarianSchedule.DayOfWeek.MONDAY,
+            start_time=time(7, 0),
+            end_time=time(19, 0)
+        )
+
+    def test_agenda_constant_queries(self):
+        """Test la agenda no hace consultas por slot"""
+        with self.captureOnCommitCallbacks(execute=True):
+            for hour in range(8, 18, 2):
+                create_appointment(appointment_time=time(hour, 0))
+
+        # Solo las citas: horarios y bloqueos salen de los cachés
+        with self.assertNumQueries(1):
+            response = self.client.get(
+                '/api/appointments/agenda/',
+                {'veterinarian_id': 1, 'date': MONDAY.isoformat(), 'duration': 90}
+            )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(response.data['appointments']), 5)
+        self.assertIn(time(17, 30), response.data['available_slots'])
+
+    def test_agenda_invalid_duration(self):
+        """Test duración fuera de rango"""
+        response = self.client.get(
+            '/api/appointments/agenda/',
+            {'veterinarian_id': 1, 'date': MONDAY.isoformat(), 'duration': 5}
+        )
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_non_numeric_veterinarian_is_bad_request(self):
+        """Test un veterinarian_id no numérico responde 400 en las agendas"""
+        cases = [
+            ('/api/appointments/agenda/', {'veterinarian_id': 'abc', 'date': MONDAY.isoformat()}),
+            ('/api/appointments/weekly_agenda/', {'veterinarian_id': 'abc', 'week_start': MONDAY.isoformat()}),
+            ('/api/appointments/range_agenda/', {
+                'veterinarian_ids': '1,abc', 'start_date': MONDAY.isoformat(), 'end_date': MONDAY.isoformat()
+            }),
+        ]
+        for url, params in cases:
+            with self.subTest(url):
+                self.assertEqual(self.client.get(url, params).status_code, status.HTTP_400_BAD_REQUEST)
+
+class RangeAgendaAPITest(APITestCase):
+    def setUp(self):
+        cache.clear()
+        self.client.force_authenticate(user=AuthenticatedUser({'id': 1, 'role': 'Admin'}))
+        for veterinarian_id in (1, 2, 3):
+            for day in VeterinarianSchedule.DayOfWeek.values[:5]:
+                VeterinarianSchedule.objects.create(
+                    veterinarian_id=veterinarian_id,
+                    day_of_week=day,
+                    start_time=time(8, 0),
+                    end_time=time(18, 0)
+                )
+
+    def test_range_agenda_constant_queries(self):
+        """Test la agenda de toda la clínica en la semana usa dos consultas"""
+        with self.captureOnCommitCallbacks(execute=True):
+            for offset in range(5):
+                create_appointment(veterinarian_id=offset % 3 + 1, appointment_date=date(2030, 1, 7 + offset))
+
+        with self.assertNumQueries(2):
+            response = self.client.get('/api/appointments/range_agenda/', {
+                'start_date': '2030-01-07',
+                'end_date': '2030-01-13',
+            })
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(set(response.data['veterinarians']), {'1', '2', '3'})
+        week = response.data['veterinarians']['1']
+        self.assertEqual(len(week), 7)
+        self.assertEqual(len(week['2030-01-07']['appointments']), 1)
+        self.assertNotIn(time(9, 0), week['2030-01-07']['available_slots'])
+        self.assertEqual(week['2030-01-12']['available_slots'], [])
+
+    def test_range_agenda_filters_veterinarians(self):
+        """Test filtrar por lista de veterinarios"""
+        response = self.client.get('/api/appointments/range_agenda/', {
+            'start_date': '2030-01-07',
+            'end_date': '2030-01-08',
+            'veterinarian_ids': '1,3',
+        })
+        self.assertEqual(set(response.data['veterinarians']), {'1', '3'})
+
+    def test_range_agenda_limit(self):
+        """Test el rango no puede exceder el máximo configurado"""
+        response = self.client.get('/api/appointments/range_agenda/', {
+            'start_date': '2030-01-01',
+            'end_date': '2030-06-01',
+        })
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+class NextAvailableAPITest(APITestCase):
+    def setUp(self):
+        cache.clear()
+        self.client.force_authenticate(user=AuthenticatedUser({'id': 1, 'role': 'Admin'}))
+        for veterinarian_id, start in ((1, time(8, 0)), (2, time(9, 0))):
+            for day in VeterinarianSchedule.DayOfWeek.values:
+                VeterinarianSchedule.objects.create(
+                    veterinarian_id=veterinarian_id,
+                    day_of_week=day,
+                    start_time=start,
+                    end_time=time(12, 0)
+                )
+
+    def test_merges_veterinarians_in_time_order(self):
+        """Test los horarios se ordenan entre veterinarios y se detiene al llegar al límite"""
+        start = datetime.combine(MONDAY, time(8, 0))
+        slots = next_available_slots(None, 60, 3, start=start, horizon_days=30)
+        self.assertEqual(slots, [
+            (datetime.combine(MONDAY, time(8, 0)), 1),
+            (datetime.combine(MONDAY, time(8, 30)), 1),
+            (datetime.combine(MONDAY, time(9, 0)), 1),
+        ])
+
+    def test_skips_busy_time(self):
+        """Test una cirugía salta al siguiente hueco suficiente"""
+        create_appointment(veterinarian_id=1, appointment_time=time(9, 0))
+        create_appointment(veterinarian_id=2, appointment_time=time(10, 0))
+        start = datetime.combine(MONDAY, time(8, 0))
+        slots = next_available_slots([1, 2], 120, 2, start=start, horizon_days=30)
+        self.assertEqual(slots, [
+            (datetime.combine(MONDAY, time(9, 30)), 1),
+            (datetime.combine(MONDAY, time(10, 0)), 1),
+        ])
+
+    def test_endpoint_uses_type_duration(self):
+        """Test el tipo de cita define la duración por defecto"""
+        response = self.client.get('/api/appointments/next_available/', {
+            'appointment_type': 'CIRUGIA',
+            'limit': 2,
+        })
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['duration_minutes'], 120)
+        self.assertEqual(len(response.data['slots']), 2)
+
+class OccupancyCacheTest(APITestCase):
+    def setUp(self):
+        cache.clear()
+        self.client.force_authenticate(user=AuthenticatedUser({'id': 1, 'role': 'Admin'}))
+        VeterinarianSchedule.objects.create(
+            veterinarian_id=1,
+            day_of_week=VeterinarianSchedule.DayOfWeek.MONDAY,
+            start_time=time(8, 0),
+            end_time=time(12, 0)
+        )
+
+    def test_bitmap_matches_engine(self):
+        """Test los slots del mapa de bits coinciden con el cálculo por intervalos"""
+        create_appointment(appointment_time=time(9, 15), duration_minutes=45)
+        AppointmentBlock.objects.create(
+            veterinarian_id=1,
+            start_datetime=timezone.make_aware(datetime.combine(MONDAY, time(11, 0))),
+            end_datetime=timezone.make_aware(datetime.combine(MONDAY, time(11, 30))),
+            reason='Reunión',
+            created_by=1
+        )
+        engine = AvailabilityEngine([1], MONDAY)
+        bitmap = build_bitmap(engine, 1, MONDAY)
+        for duration in (30, 60, 90):
+            self.assertEqual(
+                bitmap_slots(bitmap, MONDAY, duration),
+                engine.available_slots(1, MONDAY, duration)
+            )
+
+    def test_availability_served_from_cache(self):
+        """Test con el caché caliente la disponibilidad no consulta la base de datos"""
+        url = '/api/appointments/availability/'
+        params = {'veterinarian_id': 1, 'date': MONDAY.isoformat()}
+        self.client.get(url, params)
+
+        with self.assertNumQueries(0):
+            response = self.client.get(url, params)
+        self.assertEqual(len(response.data['available_slots']), 8)
+
+    def test_signals_update_bitmap(self):
+        """Test crear y cancelar una cita actualiza el mapa del día"""
+        self.assertIn(time(9, 0), occupancy_cache.available_slots(1, MONDAY))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            appointment = create_appointment(appointment_time=time(9, 0))
+        self.assertNotIn(time(9, 0), occupancy_cache.available_slots(1, MONDAY))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            appointment.status = Appointment.Status.CANCELLED
+            appointment.save()
+        self.assertIn(time(9, 0), occupancy_cache.available_slots(1, MONDAY))
+
+    def test_incremental_updates(self):
+        """Test ocupar y liberar intervalos ajusta los bits sin perder solapes"""
+        self.assertIn(time(9, 0), occupancy_cache.available_slots(1, MONDAY))
+        with self.assertNumQueries(0):
+            occupancy_cache.apply([(1, MONDAY, datetime.combine(MONDAY, time(10, 0)),
+                                    datetime.combine(MONDAY, time(10, 30)), True)])
+        self.assertNotIn(time(10, 0), occupancy_cache.available_slots(1, MONDAY))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            block = AppointmentBlock.objects.create(
+                veterinarian_id=1,
+                start_datetime=timezone.make_aware(datetime.combine(MONDAY, time(9, 0))),
+                end_datetime=timezone.make_aware(datetime.combine(MONDAY, time(9, 30))),
+                reason='Reunión',
+                created_by=1
+            )
+            appointment = create_appointment(appointment_time=time(9, 0), duration_minutes=60)
+        self.assertNotIn(time(9, 30), occupancy_cache.available_slots(1, MONDAY))
+
+        # La cita se libera, pero el bloqueo sigue ocupando 9:00-9:30
+        with self.captureOnCommitCallbacks(execute=True):
+            appointment.status = Appointment.Status.CANCELLED
+            appointment.save()
+        slots = occupancy_cache.available_slots(1, MONDAY)
+        self.assertNotIn(time(9, 0), slots)
+        self.assertIn(time(9, 30), slots)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            block.delete()
+        self.assertIn(time(9, 0), occupancy_cache.available_slots(1, MONDAY))
+        # 10:00 se ocupó solo en el caché: el verificador lo detecta
+        with self.assertRaises(CommandError):
+            call_command('check_occupancy', '--start-date', MONDAY.isoformat(), '--days', '1', stdout=StringIO())
+
+    def test_refresh_does_not_overwrite_concurrent_apply(self):
+        """Test un recálculo en curso no pisa una actualización que llega mientras tanto"""
+        self.assertIn(time(10, 0), occupancy_cache.available_slots(1, MONDAY))
+        # Lo que el recálculo leyó de la base antes de que se confirmara la cita
+        stale = occupancy_cache._compute({(1, MONDAY)})
+        computing, resume = threading.Event(), threading.Event()
+
+        def slow_compute(days, engine=None):
+            computing.set()
+            resume.wait(5)
+            return stale
+
+        def booked():
+            occupancy_cache.apply([(1, MONDAY, datetime.combine(MONDAY, time(10, 0)),
+                                    datetime.combine(MONDAY, time(10, 30)), True)])
+
+        with patch.object(occupancy_cache, '_compute', side_effect=slow_compute):
+            refresher = threading.Thread(target=occupancy_cache.refresh, args=(1, [MONDAY]))
+            refresher.start()
+            self.assertTrue(computing.wait(5))
+            updater = threading.Thread(target=booked)
+            updater.start()
+            # La actualización espera a que el recálculo suelte el día
+            updater.join(0.2)
+            self.assertTrue(updater.is_alive())
+            resume.set()
+            refresher.join(5)
+            updater.join(5)
+
+        self.assertNotIn(time(10, 0), occupancy_cache.available_slots(1, MONDAY))
+
+    def test_schedule_change_invalidates(self):
+        """Test un cambio de horario invalida los días en caché"""
+        self.assertEqual(len(occupancy_cache.available_slots(1, MONDAY)), 8)
+        with self.captureOnCommitCallbacks(execute=True):
+            VeterinarianSchedule.objects.filter(veterinarian_id=1).get().delete()
+        self.assertEqual(occupancy_cache.available_slots(1, MONDAY), [])
+
+    def test_check_command_detects_and_fixes(self):
+        """Test el verificador detecta cambios hechos sin señales y los corrige"""
+        occupancy_cache.available_slots(1, MONDAY)
+        # update() no dispara señales
+        create_appointment(appointment_time=time(9, 0), status=Appointment.Status.CANCELLED)
+        Appointment.objects.update(status=Appointment.Status.SCHEDULED)
+
+        args = ['--start-date', MONDAY.isoformat(), '--days', '1']
+        with self.assertRaises(CommandError):
+            call_command('check_occupancy', *args, stdout=StringIO())
+        call_command('check_occupancy', *args, '--fix', stdout=StringIO())
+        call_command('check_occupancy', *args, stdout=StringIO())
+        self.assertNotIn(time(9, 0), occupancy_cache.available_slots(1, MONDAY))
+
+def aware(day, hour, minute=0):
+    return timezone.make_aware(datetime.combine(day, time(hour, minute)))
+
+class ScheduleCacheTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.schedule = VeterinarianSchedule.objects.create(
+            veterinarian_id=1,
+            day_of_week=VeterinarianSchedule.DayOfWeek.MONDAY,
+            start_time=time(8, 0),
+            end_time=time(12, 0)
+        )
+
+    def test_served_from_process_memory(self):
+        """Test con la versión vigente los horarios no consultan la base de datos"""
+        schedule_cache.all()
+        with self.assertNumQueries(0):
+            self.assertEqual(schedule_cache.get(1, VeterinarianSchedule.DayOfWeek.MONDAY).end_time, time(12, 0))
+            self.assertIsNone(schedule_cache.get(1, VeterinarianSchedule.DayOfWeek.TUESDAY))
+
+    def test_version_bump_reloads(self):
+        """Test un cambio sin señales se ve solo al publicar una versión nueva"""
+        schedule_cache.all()
+        VeterinarianSchedule.objects.update(end_time=time(14, 0))
+        self.assertEqual(schedule_cache.get(1, VeterinarianSchedule.DayOfWeek.MONDAY).end_time, time(12, 0))
+
+        schedule_cache.invalidate()
+        self.assertEqual(schedule_cache.get(1, VeterinarianSchedule.DayOfWeek.MONDAY).end_time, time(14, 0))
+
+    def test_save_and_flush_invalidate(self):
+        """Test guardar un horario o vaciar el caché compartido fuerza la recarga"""
+        schedule_cache.all()
+        self.schedule.is_active = False
+        self.schedule.save()
+        self.assertIsNone(schedule_cache.get(1, VeterinarianSchedule.DayOfWeek.MONDAY))
+
+        VeterinarianSchedule.objects.update(is_active=True)
+        cache.clear()
+        self.assertIsNotNone(schedule_cache.get(1, VeterinarianSchedule.DayOfWeek.MONDAY))
+
+def redis_available():
+    try:
+        return redis.Redis.from_url(settings.BOOKABLE_SLOTS_REDIS_URL, socket_connect_timeout=0.2).ping()
+    except (redis.RedisError, TypeError, ValueError):
+        return False
+
+class BookableSlotsTest(APITestCase):
+    def setUp(self):
+        cache.clear()
+        self.client.force_authenticate(user=AuthenticatedUser({'id': 1, 'role': 'Admin'}))
+        for veterinarian_id, start in ((1, time(8, 0)), (2, time(9, 0))):
+            for day in VeterinarianSchedule.DayOfWeek.values:
+                VeterinarianSchedule.objects.create(
+                    veterinarian_id=veterinarian_id,
+                    day_of_week=day,
+                    start_time=start,
+                    end_time=time(12, 0)
+                )
+        self.day = date.today() + timedelta(days=1)
+        self.url = '/api/appointments/bookable_slots/'
+        self.params = {'appointment_type': 'CONSULTA', 'start_date': self.day.isoformat(), 'end_date': self.day.isoformat()}
+
+    def test_slots_merged_across_veterinarians_with_cache_headers(self):
+        """Test los horarios se ordenan entre veterinarios y la respuesta es cacheable"""
+        create_appointment(veterinarian_id=1, appointment_date=self.day, appointment_time=time(8, 0))
+        response = self.client.get(self.url, {**self.params, 'limit': 4})
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response['Cache-Control'], f'public, max-age={settings.BOOKABLE_SLOTS_MAX_AGE}')
+        self.assertEqual(
+            [(slot['veterinarian_id'], slot['time']) for slot in response.data['slots']],
+            [(1, time(8, 30)), (1, time(9, 0)), (2, time(9, 0)), (1, time(9, 30))]
+        )
+
+    def test_validation(self):
+        """Test solo tipos reservables en línea y fechas dentro del horizonte"""
+        response = self.client.get(self.url, {**self.params, 'appointment_type': 'CIRUGIA'})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+        too_far = date.today() + timedelta(days=settings.BOOKABLE_SLOTS_HORIZON_DAYS)
+        response = self.client.get(self.url, {**self.params, 'end_date': too_far.isoformat()})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    @skipUnless(redis_available(), 'Requiere un servidor Redis')
+    def test_read_model_refreshed_on_booking(self):
+        """Test el modelo en Redis se construye, se lee sin la base de datos y sigue las reservas"""
+        client = redis.Redis.from_url(settings.BOOKABLE_SLOTS_REDIS_URL)
+        client.delete(*client.keys('bookable:*'))
+        bookable_slots._retry_at = 0
+        self.assertEqual(bookable_slots.rebuild([1, 2]), 2)
+
+        with self.assertNumQueries(0):
+            response = self.client.get(self.url, {**self.params, 'veterinarian_ids': '1', 'limit': 1})
+        self.assertEqual(response.data['slots'][0]['time'], time(8, 0))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            create_appointment(veterinarian_id=1, appointment_date=self.day, appointment_time=time(8, 0))
+        response = self.client.get(self.url, {**self.params, 'veterinarian_ids': '1', 'limit': 1})
+        self.assertEqual(response.data['slots'][0]['time'], time(8, 30))
+
+    @skipUnless(redis_available(), 'Requiere un servidor Redis')
+    def test_days_missing_from_read_model_are_computed(self):
+        """Test tras vaciar Redis, una reserva no deja sin horarios al resto de veterinarios y días"""
+        client = redis.Redis.from_url(settings.BOOKABLE_SLOTS_REDIS_URL)
+        client.delete(*client.keys('bookable:*'))
+        bookable_slots._retry_at = 0
+        with self.captureOnCommitCallbacks(execute=True):
+            create_appointment(veterinarian_id=1, appointment_date=self.day, appointment_time=time(8, 0))
+
+        params = {**self.params, 'end_date': (self.day + timedelta(days=1)).isoformat(), 'limit': 100}
+        expected = [(slot['veterinarian_id'], slot['date'], slot['time']) for slot in
+                    self.client.get(self.url, params).data['slots']]
+        self.assertIn((2, self.day, time(9, 0)), expected)
+        self.assertIn((1, self.day + timedelta(days=1), time(8, 0)), expected)
+        self.assertNotIn((1, self.day, time(8, 0)), expected)
+
+        # Los días resueltos desde los mapas quedaron escritos en Redis
+        with self.assertNumQueries(0):
+            response = self.client.get(self.url, params)
+        self.assertEqual(
+            [(slot['veterinarian_id'], slot['date'], slot['time']) for slot in response.data['slots']], expected
+        )
+
+class AppointmentBlockAPITest(APITestCase):
+    def setUp(self):
+        cache.clear()
+        self.client.force_authenticate(user=AuthenticatedUser({'id': 1, 'role': 'Admin'}))
+        for veterinarian_id in (1, 2):
+            VeterinarianSchedule.objects.create(
+                veterinarian_id=veterinarian_id,
+                day_of_week=VeterinarianSchedule.DayOfWeek.MONDAY,
+                start_time=time(8, 0),
+                end_time=time(12, 0)
+            )
+        self.url = '/api/blocks/'
+
+    def block_data(self, start, end, **kwargs):
+        data = {
+            'veterinarian_id': 1,
+            'start_datetime': start.isoformat(),
+            'end_datetime': end.isoformat(),
+            'reason': 'Reunión',
+            'created_by': 1,
+        }
+        data.update(kwargs)
+        return data
+
+    def test_create_takes_day_locks(self):
+        """Test crear bloqueos toma la fila de bloqueo de cada veterinario y día del periodo"""
+        create_blocks([2, 1], aware(MONDAY, 22), aware(MONDAY + timedelta(days=1), 2), 'Guardia', 1)
+        self.assertEqual(
+            sorted(VeterinarianDayLock.objects.values_list('veterinarian_id', 'date')),
+            [(1, MONDAY), (1, MONDAY + timedelta(days=1)), (2, MONDAY), (2, MONDAY + timedelta(days=1))]
+        )
+
+    def test_create_merges_overlapping_and_adjacent(self):
+        """Test los bloqueos que se solapan o tocan quedan fusionados en uno"""
+        first = self.client.post(self.url, self.block_data(aware(MONDAY, 9), aware(MONDAY, 10)), format='json')
+        self.client.post(self.url, self.block_data(aware(MONDAY, 11), aware(MONDAY, 11, 30)), format='json')
+        response = self.client.post(
+            self.url, self.block_data(aware(MONDAY, 10), aware(MONDAY, 11), reason='Capacitación'), format='json'
+        )
+
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(response.data['id'], first.data['id'])
+        active = AppointmentBlock.objects.get(is_active=True)
+        self.assertEqual((active.start_datetime, active.end_datetime), (aware(MONDAY, 9), aware(MONDAY, 11, 30)))
+        self.assertEqual(active.reason, 'Reunión / Capacitación')
+        self.assertEqual(AppointmentBlock.objects.filter(is_active=False).count(), 1)
+
+    def test_bulk_blocks_several_veterinarians(self):
+        """Test un festivo bloquea a varios veterinarios con una sola petición"""
+        AppointmentBlock.objects.create(
+            veterinarian_id=1, start_datetime=aware(MONDAY, 8), end_datetime=aware(MONDAY, 9),
+            reason='Reunión', created_by=1
+        )
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post(f'{self.url}bulk/', {
+                'veterinarian_ids': [1, 2],
+                'start_datetime': aware(MONDAY, 8, 30).isoformat(),
+                'end_datetime': aware(MONDAY + timedelta(days=1), 0).isoformat(),
+                'reason': 'Festivo',
+            }, format='json')
+
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual([block['veterinarian_id'] for block in response.data], [1, 2])
+        self.assertEqual(AppointmentBlock.objects.filter(is_active=True).count(), 2)
+        self.assertEqual(occupancy_cache.available_slots(2, MONDAY), [time(8, 0)])
+        self.assertEqual(AvailabilityEngine([1, 2], MONDAY).available_slots(1, MONDAY), [])
+
+    def test_bulk_returns_ids_without_returning_support(self):
+        """Test los bloqueos nuevos se devuelven con ID aunque la base no los devuelva (MySQL)"""
+        with patch.object(type(connection.features), 'can_return_rows_from_bulk_insert', False):
+            response = self.client.post(f'{self.url}bulk/', {
+                'veterinarian_ids': [1, 2],
+                'start_datetime': aware(MONDAY, 8).isoformat(),
+                'end_datetime': aware(MONDAY, 9).isoformat(),
+                'reason': 'Festivo',
+            }, format='json')
+
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(
+            {block['id'] for block in response.data},
+            set(AppointmentBlock.objects.values_list('id', flat=True))
+        )
+        self.assertNotIn(None, [block['id'] for block in response.data])
+
+    def test_bulk_validation(self):
+        """Test el periodo debe terminar después de empezar"""
+        response = self.client.post(f'{self.url}bulk/', {
+            'veterinarian_ids': [1],
+            'start_datetime': aware(MONDAY, 10).isoformat(),
+            'end_datetime': aware(MONDAY, 9).isoformat(),
+            'reason': 'Festivo',
+        }, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_index_invalidated_on_change(self):
+        """Test el índice en caché se descarta al crear o desactivar un bloqueo"""
+        self.assertEqual(get_block_indexes([1])[1].intervals, [])
+        with self.captureOnCommitCallbacks(execute=True):
+            block = AppointmentBlock.objects.create(
+                veterinarian_id=1, start_datetime=aware(MONDAY, 9), end_datetime=aware(MONDAY, 10),
+                reason='Reunión', created_by=1
+            )
+        self.assertEqual(len(get_block_indexes([1])[1].intervals), 1)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            block.is_active = False
+            block.save()
+        with self.assertNumQueries(0):
+            self.assertEqual(get_block_indexes([1])[1].intervals, [])
+
+    def test_index_overlapping_lookup(self):
+        """Test la búsqueda en el índice devuelve solo los intervalos que tocan el rango"""
+        day = datetime.combine(MONDAY, time.min)
+        index = BlockIndex([
+            (day + timedelta(hours=hour), day + timedelta(hours=hour, minutes=30), 'Reunión')
+            for hour in range(8, 18)
+        ])
+        found = index.overlapping(day + timedelta(hours=10, minutes=15), day + timedelta(hours=12))
+        self.assertEqual([start.hour for start, _, _ in found], [10, 11])
+        self.assertEqual(index.overlapping(day + timedelta(hours=10, minutes=30), day + timedelta(hours=11)), [])
+
+class BookingTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        VeterinarianSchedule.objects.create(
+            veterinarian_id=1,
+            day_of_week=VeterinarianSchedule.DayOfWeek.MONDAY,
+            start_time=time(8, 0),
+            end_time=time(18, 0)
+        )
+
+    def test_conflict_detected_after_validation(self):
+        """Test una cita creada entre la validación y el guardado se detecta bajo bloqueo"""
+        serializer = AppointmentCreateSerializer(data=booking_data(time(9, 0), patient_id=1))
+        self.assertTrue(serializer.is_valid(), serializer.errors)
+
+        create_appointment(appointment_time=time(9, 15), patient_id=2)
+
+        with self.assertRaises(ValidationError):
+            book_appointment(serializer, created_by=1)
+        self.assertEqual(Appointment.objects.count(), 1)
+
+    def test_cancelled_update_skips_conflict_check(self):
+        """Test cancelar por actualización no requiere horario libre"""
+        appointment = create_appointment(appointment_time=time(9, 0), patient_id=1)
+        serializer = AppointmentCreateSerializer(
+            appointment, data={'status': Appointment.Status.CANCELLED}, partial=True
+        )
+        self.assertTrue(serializer.is_valid(), serializer.errors)
+        book_appointment(serializer)
+        appointment.refresh_from_db()
+        self.assertEqual(appointment.status, Appointment.Status.CANCELLED)
+
+@skipUnlessDBFeature('has_select_for_update')
+class ConcurrentBookingTest(TransactionTestCase):
+    """Requiere una base de datos con bloqueos de fila (MySQL en producción)"""
+    THREADS = 16
+    BOOKINGS_PER_THREAD = 10
+
+    def setUp(self):
+        cache.clear()
+        VeterinarianSchedule.objects.create(
+            veterinarian_id=1,
+            day_of_week=VeterinarianSchedule.DayOfWeek.MONDAY,
+            start_time=time(8, 0),
+            end_time=time(18, 0)
+        )
+
+    def test_no_overlaps_under_load(self):
+        """Test reservas concurrentes sobre los mismos horarios nunca se solapan"""
+        barrier = threading.Barrier(self.THREADS)
+
+        def worker(thread_number):
+            try:
+                barrier.wait()
+                for booking in range(self.BOOKINGS_PER_THREAD):
+                    # Horarios desfasados 15 minutos para forzar solapamientos parciales
+                    minutes = (booking * 45 + thread_number * 15) % 540
+                    data = booking_data(
+                        time(8 + minutes // 60, minutes % 60),
+                        patient_id=thread_number * 1000 + booking
+                    )
+                    serializer = AppointmentCreateSerializer(data=data)
+                    if serializer.is_valid():
+                        try:
+                            book_appointment(serializer, created_by=1)
+                        except ValidationError:
+                            pass
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=worker, args=(n,)) for n in range(self.THREADS)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        booked = list(Appointment.objects.filter(veterinarian_id=1).order_by('appointment_time'))
+        self.assertTrue(booked)
+        for previous, current in zip(booked, booked[1:]):
+            self.assertLessEqual(previous.end_time, current.appointment_time)
+
+    @patch.object(type(connection.features), 'can_return_rows_from_bulk_insert', False)
+    def test_concurrent_blocks_merge_into_one(self):
+        """Test bloqueos concurrentes que se solapan terminan en uno solo por veterinario (sin IDs de bulk_create)"""
+        barrier = threading.Barrier(self.THREADS)
+        results, errors = [], []
+
+        def worker(thread_number):
+            try:
+                barrier.wait()
+                start = timezone.make_aware(datetime.combine(MONDAY, time(8, 0))) + timedelta(minutes=thread_number * 10)
+                results.append(create_blocks([1, 2], start, start + timedelta(hours=1), 'Capacitación', 1))
+            except Exception as e:
+                errors.append(e)
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=worker, args=(n,)) for n in range(self.THREADS)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(errors, [])
+        active = {block.veterinarian_id: block for block in AppointmentBlock.objects.filter(is_active=True)}
+        self.assertEqual(sorted(active), [1, 2])
+        first_start = timezone.make_aware(datetime.combine(MONDAY, time(8, 0)))
+        for vet_block in active.values():
+            self.assertEqual(
+                (vet_block.start_datetime, vet_block.end_datetime),
+                (first_start, first_start + timedelta(minutes=(self.THREADS - 1) * 10, hours=1))
+            )
+        for blocks in results:
+            self.assertEqual([block.veterinarian_id for block in blocks], [1, 2])
+            for block in blocks:
+                self.assertEqual(AppointmentBlock.objects.get(id=block.id).veterinarian_id, block.veterinarian_id)
+
+class BulkTransitionAPITest(APITestCase):
+    def setUp(self):
+        cache.clear()
+        self.client.force_authenticate(user=AuthenticatedUser({'id': 1, 'role': 'Admin'}))
+        VeterinarianSchedule.objects.create(
+            veterinarian_id=1,
+            day_of_week=VeterinarianSchedule.DayOfWeek.MONDAY,
+            start_time=time(8, 0),
+            end_time=time(12, 0)
+        )
+        self.url = '/api/appointments/bulk_transition/'
+
+    def test_confirm_batch_with_per_id_results(self):
+        """Test confirmación en lote: lectura + UPDATE, resultado por ID y un solo evento"""
+        scheduled = [create_appointment(appointment_time=time(hour, 0)) for hour in (8, 9, 10)]
+        completed = create_appointment(appointment_time=time(11, 0), status=Appointment.Status.COMPLETED)
+        events = []
+        def receiver(sender, **kwargs):
+            events.append(kwargs)
+        appointments_changed.connect(receiver)
+        self.addCleanup(appointments_changed.disconnect, receiver)
+
+        ids = [appointment.id for appointment in scheduled] + [completed.id, 9999]
+        # Lectura de estados + UPDATE + registro en el feed (más savepoint del atomic)
+        with self.assertNumQueries(5):
+            response = self.client.post(self.url, {'ids': ids, 'status': 'CONFIRMADA'}, format='json')
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['updated'], 3)
+        results = response.data['results']
+        self.assertTrue(all(results[appointment.id]['success'] for appointment in scheduled))
+        self.assertFalse(results[completed.id]['success'])
+        self.assertFalse(results[9999]['success'])
+        self.assertEqual(
+            Appointment.objects.filter(status='CONFIRMADA', confirmed_at__isnull=False).count(), 3
+        )
+        self.assertEqual(len(events), 1)
+        self.assertEqual(events[0]['vet_days'], {(1, MONDAY)})
+
+    def test_invalid_target_status(self):
+        """Test un estado destino sin transición definida se rechaza"""
+        appointment = create_appointment()
+        response = self.client.post(self.url, {'ids': [appointment.id], 'status': 'AGENDADA'}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_cancellation_frees_cached_slots(self):
+        """Test cancelar en lote actualiza los mapas de ocupación tras el commit"""
+        appointment = create_appointment(appointment_time=time(9, 0))
+        self.assertNotIn(time(9, 0), occupancy_cache.available_slots(1, MONDAY))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(self.url, {'ids': [appointment.id], 'status': 'CANCELADA'}, format='json')
+        self.assertIn(time(9, 0), occupancy_cache.available_slots(1, MONDAY))
+
+class FailingReminderSender(ReminderSender):
+    def send(self, phone, message):
+        raise ConnectionError('Proveedor no disponible')
+
+class OutboxReminderSender(ReminderSender):
+    """Guarda los mensajes enviados; get_sender() crea una instancia nueva en cada prueba"""
+
+    def __init__(self):
+        self.outbox = []
+
+    def send(self, phone, message):
+        self.outbox.append((phone, message))
+
+@override_settings(REMINDER_SENDER='appointments.tests.OutboxReminderSender')
+class ReminderDispatchTest(TestCase):
+    def setUp(self):
+        get_sender.cache_clear()
+        self.addCleanup(get_sender.cache_clear)
+        self.now = timezone.make_aware(datetime.combine(MONDAY, time(8, 0)))
+        tuesday = MONDAY + timedelta(days=1)
+        self.due = [
+            create_appointment(appointment_time=time(9, 0)),
+            create_appointment(appointment_date=tuesday, appointment_time=time(7, 30)),
+        ]
+        create_appointment(appointment_time=time(7, 0))
+        create_appointment(appointment_date=tuesday, appointment_time=time(9, 0))
+        create_appointment(appointment_time=time(10, 0), status=Appointment.Status.CANCELLED)
+        create_appointment(appointment_time=time(11, 0), reminder_sent=True)
+
+    def test_window_selects_only_due(self):
+        """Test la ventana incluye solo citas activas sin recordatorio en las próximas 24 horas"""
+        self.assertEqual(
+            set(due_reminders(self.now).values_list('id', flat=True)),
+            {appointment.id for appointment in self.due}
+        )
+
+    def test_claim_uses_index(self):
+        """Test el lote de recordatorios se reclama con el índice de fecha y hora"""
+        with CaptureQueriesContext(connection) as context:
+            claim_reminder_batch(self.now)
+        plans = query_plans(context.captured_queries, Appointment._meta.db_table)
+        self.assertTrue(plans)
+        for plan in plans:
+            self.assertIn('appt_date_time_idx', plan)
+
+    def test_dispatch_claims_in_batches_once(self):
+        """Test cada recordatorio se envía una sola vez aunque se procese en varios lotes"""
+        self.assertEqual(dispatch_due_reminders(self.now, batch_size=1), {'sent': 2, 'failed': 0})
+        self.assertEqual(len(get_sender().outbox), 2)
+        self.assertEqual(Appointment.objects.filter(reminder_sent=True).count(), 3)
+
+        self.assertEqual(dispatch_due_reminders(self.now), {'sent': 0, 'failed': 0})
+        self.assertEqual(len(get_sender().outbox), 2)
+
+    @override_settings(REMINDER_SENDER='appointments.tests.FailingReminderSender')
+    def test_failed_sends_are_released(self):
+        """Test los envíos fallidos quedan pendientes para la siguiente ejecución"""
+        self.assertEqual(dispatch_due_reminders(self.now), {'sent': 0, 'failed': 2})
+        self.assertEqual(due_reminders(self.now).count(), 2)
+
+    def test_default_sender_keeps_nothing_in_memory(self):
+        """Test el canal por defecto solo registra el envío y el canal base exige implementar send"""
+        with override_settings(REMINDER_SENDER='appointments.reminders.LoggingReminderSender'):
+            get_sender.cache_clear()
+            with self.assertLogs('appointments.reminders', 'INFO'):
+                self.assertEqual(dispatch_due_reminders(self.now), {'sent': 2, 'failed': 0})
+            self.assertFalse(hasattr(get_sender(), 'outbox'))
+        with self.assertRaises(TypeError):
+            ReminderSender()
+
+    def test_render_asks_for_confirmation(self):
+        """Test el mensaje pide confirmación solo a citas agendadas que la requieren"""
+        values = {
+            'appointment_date': MONDAY, 'appointment_time': time(9, 0), 'appointment_type': 'VACUNACION',
+            'status': 'AGENDADA', 'confirmation_required': True,
+        }
+        message = render_reminder(values)
+        self.assertIn('vacunación el 07/01/2030 a las 09:00', message)
+        self.assertIn('confirme', message)
+        self.assertNotIn('confirme', render_reminder({**values, 'status': 'CONFIRMADA'}))
+
+class AppointmentSeriesAPITest(APITestCase):
+    def setUp(self):
+        cache.clear()
+        self.client.force_authenticate(user=AuthenticatedUser({'id': 1, 'role': 'Admin'}))
+        VeterinarianSchedule.objects.create(
+            veterinarian_id=1,
+            day_of_week=VeterinarianSchedule.DayOfWeek.MONDAY,
+            start_time=time(8, 0),
+            end_time=time(12, 0)
+        )
+        self.url = '/api/series/'
+
+    def series_data(self, **kwargs):
+        data = {
+            'patient_id': 50,
+            'owner_id': 1,
+            'veterinarian_id': 1,
+            'appointment_time': '09:00',
+            'reason': 'Fisioterapia',
+            'contact_phone': '5550000000',
+            'frequency': 'SEMANAL',
+            'start_date': MONDAY.isoformat(),
+            'occurrence_count': 4,
+        }
+        data.update(kwargs)
+        return data
+
+    def test_expand_occurrences(self):
+        """Test la expansión respeta intervalo, fin de mes y número de citas"""
+        series = AppointmentSeries(
+            frequency=AppointmentSeries.Frequency.MONTHLY, interval=1,
+            start_date=date(2030, 1, 31), occurrence_count=3
+        )
+        self.assertEqual(
+            list(expand_occurrences(series)),
+            [date(2030, 1, 31), date(2030, 2, 28), date(2030, 3, 31)]
+        )
+        series = AppointmentSeries(
+            frequency=AppointmentSeries.Frequency.WEEKLY, interval=2,
+            start_date=MONDAY, end_date=MONDAY + timedelta(days=30)
+        )
+        self.assertEqual(len(list(expand_occurrences(series))), 3)
+
+    def test_create_skips_conflicts_with_constant_queries(self):
+        """Test la serie se verifica en una pasada y se inserta con bulk_create"""
+        create_appointment(appointment_date=MONDAY + timedelta(days=14), appointment_time=time(9, 0))
+
+        # Mismo número de consultas sin importar cuántas citas tenga la serie
+        with self.assertNumQueries(14):
+            response = self.client.post(self.url, self.series_data(occurrence_count=8), format='json')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(len(response.data['created']), 7)
+        self.assertEqual(response.data['skipped'][0]['date'], MONDAY + timedelta(days=14))
+
+        # Los horarios ya quedaron en caché; los bloqueos se leen bajo el bloqueo del día
+        with self.assertNumQueries(13):
+            self.client.post(self.url, self.series_data(patient_id=51, appointment_time='10:00', occurrence_count=20), format='json')
+        self.assertEqual(Appointment.objects.filter(series__isnull=False).count(), 27)
+
+    def test_create_checks_blocks_missing_from_cached_index(self):
+        """Test un bloqueo que el índice en caché todavía no tiene también rechaza la fecha"""
+        get_block_indexes([1])
+        blocked = MONDAY + timedelta(days=7)
+        # bulk_create no envía señales: el índice en caché queda desactualizado
+        AppointmentBlock.objects.bulk_create([AppointmentBlock(
+            veterinarian_id=1,
+            start_datetime=timezone.make_aware(datetime.combine(blocked, time(8, 0))),
+            end_datetime=timezone.make_aware(datetime.combine(blocked, time(12, 0))),
+            reason='Cirugía', created_by=1
+        )])
+        response = self.client.post(self.url, self.series_data(), format='json')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual([skipped['date'] for skipped in response.data['skipped']], [blocked])
+        self.assertFalse(Appointment.objects.filter(appointment_date=blocked).exists())
+
+    def test_update_this_and_following(self):
+        """Test mover la hora desde la segunda cita no toca la primera"""
+        series_id = self.client.post(self.url, self.series_data(), format='json').data['series']['id']
+        second = MONDAY + timedelta(days=7)
+
+        response = self.client.post(
+            f'{self.url}{series_id}/update_following/',
+            {'from_date': second.isoformat(), 'appointment_time': '10:30'},
+            format='json'
+        )
+        self.assertEqual(response.data['updated'], 3)
+        times = dict(Appointment.objects.values_list('appointment_date', 'appointment_time'))
+        self.assertEqual(times[MONDAY], time(9, 0))
+        self.assertEqual(times[second], time(10, 30))
+
+    def test_update_rejected_on_conflict(self):
+        """Test si una cita de la serie choca no se modifica ninguna"""
+        series_id = self.client.post(self.url, self.series_data(), format='json').data['series']['id']
+        create_appointment(appointment_date=MONDAY + timedelta(days=21), appointment_time=time(11, 0))
+
+        response = self.client.post(
+            f'{self.url}{series_id}/update_following/',
+            {'from_date': MONDAY.isoformat(), 'appointment_time': '11:00'},
+            format='json'
+        )
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(len(response.data['conflicts']), 1)
+        self.assertFalse(Appointment.objects.filter(series_id=series_id, appointment_time=time(11, 0)).exists())
+
+    def test_cancel_this_and_following(self):
+        """Test cancelar desde la tercera cita libera esos horarios y acorta la serie"""
+        series_id = self.client.post(self.url, self.series_data(), format='json').data['series']['id']
+        third = MONDAY + timedelta(days=14)
+        self.assertNotIn(time(9, 0), occupancy_cache.available_slots(1, third))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post(f'{self.url}{series_id}/cancel/', {'from_date': third.isoformat()}, format='json')
+        self.assertEqual(response.data['cancelled'], 2)
+        self.assertEqual(response.data['series']['end_date'], (third - timedelta(days=1)).isoformat())
+        self.assertIn(time(9, 0), occupancy_cache.available_slots(1, third))
+
+class WaitlistTest(APITestCase):
+    def setUp(self):
+        cache.clear()
+        self.client.force_authenticate(user=AuthenticatedUser({'id': 1, 'role': 'Admin'}))
+        VeterinarianSchedule.objects.create(
+            veterinarian_id=1,
+            day_of_week=VeterinarianSchedule.DayOfWeek.MONDAY,
+            start_time=time(8, 0),
+            end_time=time(12, 0)
+        )
+        self.appointment = create_appointment(appointment_time=time(9, 0), duration_minutes=30)
+
+    def create_entry(self, **kwargs):
+        data = {
+            'patient_id': 80,
+            'owner_id': 1,
+            'veterinarian_id': 1,
+            'reason': 'Control',
+            'contact_phone': '5550000000',
+            'earliest_date': MONDAY,
+            'latest_date': MONDAY + timedelta(days=7),
+            'created_by': 1,
+        }
+        data.update(kwargs)
+        return WaitlistEntry.objects.create(**data)
+
+    def cancel(self, appointment):
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post(f'/api/appointments/{appointment.id}/cancel/')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+    def test_cancellation_offers_slot_to_oldest_match(self):
+        """Test al cancelar se reserva el horario para la solicitud compatible más antigua"""
+        too_long = self.create_entry(patient_id=81, duration_minutes=60)
+        other_vet = self.create_entry(patient_id=82, veterinarian_id=2)
+        late = self.create_entry(patient_id=83, earliest_time=time(10, 0))
+        first = self.create_entry(patient_id=84, veterinarian_id=None)
+        second = self.create_entry(patient_id=85)
+
+        self.cancel(self.appointment)
+
+        first.refresh_from_db()
+        self.assertEqual(first.status, WaitlistEntry.Status.OFFERED)
+        self.assertEqual(first.offered_appointment.appointment_time, time(9, 0))
+        self.assertEqual(first.offered_appointment.patient_id, 84)
+        for entry in (too_long, other_vet, late, second):
+            entry.refresh_from_db()
+            self.assertEqual(entry.status, WaitlistEntry.Status.WAITING)
+        self.assertNotIn(time(9, 0), occupancy_cache.available_slots(1, MONDAY))
+
+    def test_decline_moves_to_next(self):
+        """Test rechazar la oferta la pasa a la siguiente solicitud"""
+        first = self.create_entry(patient_id=84)
+        second = self.create_entry(patient_id=85)
+        self.cancel(self.appointment)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(f'/api/waitlist/{first.id}/decline/')
+        first.refresh_from_db()
+        second.refresh_from_db()
+        self.assertEqual(first.status, WaitlistEntry.Status.DECLINED)
+        self.assertEqual(first.offered_appointment.status, Appointment.Status.CANCELLED)
+        self.assertEqual(second.status, WaitlistEntry.Status.OFFERED)
+
+        response = self.client.post(f'/api/waitlist/{second.id}/accept/')
+        self.assertEqual(response.data['status'], WaitlistEntry.Status.ACCEPTED)
+        self.assertEqual(response.data['offered_appointment']['status'], Appointment.Status.CONFIRMED)
+
+    def test_expired_offer_is_released(self):
+        """Test una oferta vencida cancela la cita ofertada"""
+        entry = self.create_entry()
+        self.cancel(self.appointment)
+        WaitlistEntry.objects.update(offer_expires_at=timezone.now() - timedelta(minutes=1))
+
+        self.assertEqual(expire_offers(), 1)
+        entry.refresh_from_db()
+        self.assertEqual(entry.status, WaitlistEntry.Status.EXPIRED)
+        self.assertEqual(entry.offered_appointment.status, Appointment.Status.CANCELLED)
+
+    def test_expired_offer_cannot_be_accepted(self):
+        """Test aceptar una oferta vencida o con la cita ya cancelada no confirma el horario"""
+        entry = self.create_entry()
+        other = self.create_entry(patient_id=81)
+        self.cancel(self.appointment)
+        WaitlistEntry.objects.filter(id=entry.id).update(offer_expires_at=timezone.now() - timedelta(minutes=1))
+        with self.captureOnCommitCallbacks(execute=True):
+            self.assertEqual(expire_offers(), 1)
+
+        response = self.client.post(f'/api/waitlist/{entry.id}/accept/')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        entry.refresh_from_db()
+        self.assertEqual(entry.status, WaitlistEntry.Status.EXPIRED)
+        self.assertEqual(entry.offered_appointment.status, Appointment.Status.CANCELLED)
+
+        # Oferta aún marcada como pendiente pero con la cita cancelada por otro proceso
+        other.refresh_from_db()
+        self.assertEqual(other.status, WaitlistEntry.Status.OFFERED)
+        Appointment.objects.filter(id=other.offered_appointment_id).update(status=Appointment.Status.CANCELLED)
+        response = self.client.post(f'/api/waitlist/{other.id}/accept/')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(
+            Appointment.objects.filter(veterinarian_id=1, appointment_date=MONDAY, appointment_time=time(9, 0),
+                                       status__in=[Appointment.Status.SCHEDULED, Appointment.Status.CONFIRMED]).count(),
+            0
+        )
+
+    def test_partial_update_validates_against_stored_window(self):
+        """Test un PATCH con una sola fecha se valida contra la otra ya guardada"""
+        entry = self.create_entry()
+        url = f'/api/waitlist/{entry.id}/'
+        response = self.client.patch(url, {'latest_date': (MONDAY + timedelta(days=3)).isoformat()})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['latest_date'], (MONDAY + timedelta(days=3)).isoformat())
+
+        response = self.client.patch(url, {'earliest_date': (MONDAY + timedelta(days=5)).isoformat()})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn('latest_date', response.data)
+
+        response = self.client.patch(url, {'reason': 'Vacuna'})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+    def test_match_uses_index(self):
+        """Test la búsqueda de candidatos usa el índice de la lista de espera"""
+        self.create_entry()
+        self.create_entry(patient_id=81, veterinarian_id=None)
+        with CaptureQueriesContext(connection) as context:
+            offer_slot(1, MONDAY, time(9, 0), 30)
+        plans = query_plans(context.captured_queries, WaitlistEntry._meta.db_table)
+        # Una consulta para el veterinario y otra para "cualquiera"
+        self.assertEqual(len(plans), 2)
+        for plan in plans:
+            self.assertIn('waitlist_match_idx', plan)
+
+class AgendaChangeFeedTest(APITestCase):
+    def setUp(self):
+        cache.clear()
+        self.client.force_authenticate(user=AuthenticatedUser({'id': 1, 'role': 'Admin'}))
+        with self.captureOnCommitCallbacks(execute=True):
+            VeterinarianSchedule.objects.create(
+                veterinarian_id=1,
+                day_of_week=VeterinarianSchedule.DayOfWeek.MONDAY,
+                start_time=time(8, 0),
+                end_time=time(12, 0)
+            )
+
+    def test_agenda_etag(self):
+        """Test un día sin cambios responde 304 sin consultar la base de datos"""
+        url = '/api/appointments/agenda/'
+        params = {'veterinarian_id': 1, 'date': MONDAY.isoformat()}
+        etag = self.client.get(url, params)['ETag']
+
+        with self.assertNumQueries(0):
+            response = self.client.get(url, params, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+
+        # Un cambio en otro día no invalida la agenda
+        with self.captureOnCommitCallbacks(execute=True):
+            create_appointment(appointment_date=MONDAY + timedelta(days=7))
+        self.assertEqual(self.client.get(url, params, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            create_appointment(appointment_time=time(9, 0))
+        response = self.client.get(url, params, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertNotEqual(response['ETag'], etag)
+
+    def test_weekly_agenda_etag_follows_schedule(self):
+        """Test un cambio de horario invalida la agenda semanal"""
+        url = '/api/appointments/weekly_agenda/'
+        params = {'veterinarian_id': 1, 'week_start': MONDAY.isoformat()}
+        etag = self.client.get(url, params)['ETag']
+        self.assertEqual(self.client.get(url, params, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            schedule = VeterinarianSchedule.objects.get()
+            schedule.end_time = time(13, 0)
+            schedule.save()
+        self.assertEqual(self.client.get(url, params, HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+    @override_settings(AGENDA_CHANGES_SETTLE_SECONDS=0)
+    def test_changes_feed(self):
+        """Test el feed devuelve solo los cambios posteriores al cursor"""
+        url = '/api/appointments/changes/'
+        cursor = self.client.get(url).data['cursor']
+
+        with self.captureOnCommitCallbacks(execute=True):
+            appointment = create_appointment(appointment_time=time(9, 0))
+            create_appointment(veterinarian_id=2, appointment_time=time(9, 0))
+            AppointmentBlock.objects.create(
+                veterinarian_id=1,
+                start_datetime=timezone.make_aware(datetime.combine(MONDAY, time(11, 0))),
+                end_datetime=timezone.make_aware(datetime.combine(MONDAY, time(11, 30))),
+                reason='Reunión',
+                created_by=1
+            )
+
+        response = self.client.get(url, {'cursor': cursor, 'veterinarian_ids': '1'})
+        changes = response.data['changes']
+        self.assertEqual([change['entity'] for change in changes], ['CITA', 'BLOQUEO'])
+        self.assertEqual(changes[0]['object_id'], appointment.id)
+        self.assertEqual(changes[0]['action'], 'CREADO')
+
+        response = self.client.get(url, {'cursor': response.data['cursor'], 'veterinarian_ids': '1', 'wait': 0})
+        self.assertEqual(response.data['changes'], [])
+
+    @override_settings(AGENDA_CHANGES_SETTLE_SECONDS=0)
+    def test_long_transaction_is_not_skipped(self):
+        """Test un cambio con ID menor que se confirma después sigue apareciendo en el feed"""
+        url = '/api/appointments/changes/'
+        cursor = self.client.get(url).data['cursor']
+        # La transacción larga registra su cambio primero y confirma al final
+        with self.captureOnCommitCallbacks() as slow_commit:
+            slow = record_change(AgendaChange.Entity.BLOCK, AgendaChange.Action.CREATED, 1, MONDAY)
+        with self.captureOnCommitCallbacks(execute=True):
+            fast = create_appointment(appointment_time=time(9, 0))
+
+        # Mientras tanto su cambio no es visible para otras conexiones
+        with patch('appointments.changes._commit_pending'):
+            response = self.client.get(url, {'cursor': cursor})
+        self.assertEqual([change['object_id'] for change in response.data['changes']], [fast.id])
+
+        for callback in slow_commit:
+            callback()
+        response = self.client.get(url, {'cursor': response.data['cursor']})
+        self.assertEqual([change['id'] for change in response.data['changes']], [slow.id])
+
+    @override_settings(AGENDA_CHANGES_SETTLE_SECONDS=0)
+    def test_changes_without_commit_callback_are_recovered(self):
+        """Test un cambio confirmado cuyo on_commit no se ejecutó se confirma al leer el feed"""
+        cursor = current_cursor()
+        orphan = record_change(AgendaChange.Entity.BLOCK, AgendaChange.Action.CREATED, 1, MONDAY)
+        self.assertEqual([change.id for change in changes_since(cursor)], [orphan.id])
+        self.assertGreater(current_cursor(), cursor)
+
+    def test_wait_is_disabled_by_default(self):
+        """Test sin AGENDA_CHANGES_MAX_WAIT el feed no retiene el worker"""
+        cursor = self.client.get('/api/appointments/changes/').data['cursor']
+        with patch('appointments.changes.time.sleep') as sleep:
+            response = self.client.get('/api/appointments/changes/', {'cursor': cursor, 'wait': 30})
+        self.assertEqual(response.data['changes'], [])
+        sleep.assert_not_called()
+
+class UtilizationTest(APITestCase):
+    def setUp(self):
+        cache.clear()
+        self.client.force_authenticate(user=AuthenticatedUser({'id': 1, 'role': 'Admin'}))
+        VeterinarianSchedule.objects.create(
+            veterinarian_id=1,
+            day_of_week=VeterinarianSchedule.DayOfWeek.MONDAY,
+            start_time=time(8, 0),
+            end_time=time(12, 0)
+        )
+        AppointmentBlock.objects.create(
+            veterinarian_id=1,
+            start_datetime=timezone.make_aware(datetime.combine(MONDAY, time(11, 0))),
+            end_datetime=timezone.make_aware(datetime.combine(MONDAY, time(11, 30))),
+            reason='Reunión',
+            created_by=1
+        )
+        create_appointment(appointment_time=time(9, 0), status=Appointment.Status.COMPLETED)
+        create_appointment(
+            appointment_time=time(10, 0), duration_minutes=60,
+            appointment_type=Appointment.AppointmentType.SURGERY, status=Appointment.Status.NO_SHOW
+        )
+        create_appointment(appointment_time=time(8, 0), status=Appointment.Status.CANCELLED)
+        create_appointment(appointment_date=MONDAY + timedelta(days=7), appointment_time=time(9, 0))
+        call_command(
+            'rebuild_utilization', '--start-date', MONDAY.isoformat(),
+            '--end-date', (MONDAY + timedelta(days=13)).isoformat(), stdout=StringIO()
+        )
+        self.url = '/api/appointments/utilization/'
+        self.params = {'start_date': MONDAY.isoformat(), 'end_date': (MONDAY + timedelta(days=13)).isoformat()}
+
+    def test_daily_report(self):
+        """Test minutos y tasas por día salen del resumen con consultas agrupadas"""
+        with self.assertNumQueries(3):
+            response = self.client.get(self.url, self.params)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+        monday = response.data['results'][0]
+        self.assertEqual(monday['period'], MONDAY)
+        self.assertEqual(monday['scheduled_minutes'], 240)
+        self.assertEqual(monday['blocked_minutes'], 30)
+        self.assertEqual(monday['booked_minutes'], 90)
+        self.assertEqual(monday['free_minutes'], 120)
+        self.assertEqual(monday['no_show_rate'], 0.5)
+        self.assertEqual(monday['cancellation_rate'], 0.3333)
+
+        by_type = {row['appointment_type']: row for row in response.data['by_appointment_type']}
+        self.assertEqual(by_type['CIRUGIA']['no_show_rate'], 1.0)
+        self.assertEqual(by_type['CONSULTA']['appointments'], 3)
+
+    def test_weekly_report(self):
+        """Test agrupación semanal"""
+        response = self.client.get(self.url, {**self.params, 'group_by': 'week'})
+        self.assertEqual([row['period'] for row in response.data['results']], [MONDAY, MONDAY + timedelta(days=7)])
+        self.assertEqual(response.data['results'][1]['booked_minutes'], 30)
+        self.assertEqual(response.data['results'][1]['free_minutes'], 210)
+
+    @override_settings(AGENDA_CHANGES_SETTLE_SECONDS=0)
+    def test_incremental_refresh(self):
+        """Test el resumen se actualiza solo con los días que cambiaron"""
+        refresh_pending()
+        with self.captureOnCommitCallbacks(execute=True):
+            create_appointment(appointment_time=time(8, 0), patient_id=99)
+
+        self.assertEqual(refresh_pending(), 1)
+        monday = self.client.get(self.url, self.params).data['results'][0]
+        self.assertEqual(monday['booked_minutes'], 120)
+        self.assertEqual(refresh_pending(), 0)
+
+    def test_concurrent_refresh_of_same_day(self):
+        """Test si otro refresco guarda el día mientras tanto, se actualiza en vez de fallar"""
+        bulk_create = DailyUtilization.objects.bulk_create
+
+        def concurrent_refresh_first(rows, **kwargs):
+            DailyUtilization.objects.filter(veterinarian_id=1, date=MONDAY).delete()
+            DailyUtilization.objects.create(
+                veterinarian_id=1, date=MONDAY, appointment_type=Appointment.AppointmentType.CONSULTATION,
+                appointments=99
+            )
+            return bulk_create(rows, **kwargs)
+
+        with patch.object(DailyUtilization.objects, 'bulk_create', side_effect=concurrent_refresh_first):
+            refresh_range(MONDAY, MONDAY, [1])
+        row = DailyUtilization.objects.get(
+            veterinarian_id=1, date=MONDAY, appointment_type=Appointment.AppointmentType.CONSULTATION
+        )
+        self.assertEqual(row.appointments, 2)
+        # El tipo sin citas de ese día no queda en el resumen
+        Appointment.objects.filter(appointment_type=Appointment.AppointmentType.SURGERY).delete()
+        refresh_range(MONDAY, MONDAY, [1])
+        self.assertFalse(DailyUtilization.objects.filter(appointment_type=Appointment.AppointmentType.SURGERY).exists())
+
+    def test_invalid_group_by(self):
+        response = self.client.get(self.url, {**self.params, 'group_by': 'month'})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+class AppointmentArchiveTest(APITestCase):
+    def setUp(self):
+        cache.clear()
+        self.client.force_authenticate(user=AuthenticatedUser({'id': 1, 'role': 'Admin'}))
+        self.old_day = archive_cutoff() - timedelta(days=30)
+        self.completed = create_appointment(
+            appointment_date=self.old_day, appointment_time=time(9, 0), status=Appointment.Status.COMPLETED
+        )
+        self.no_show = create_appointment(
+            appointment_date=self.old_day, appointment_time=time(10, 0), status=Appointment.Status.NO_SHOW
+        )
+        # Sin cerrar: no se archiva aunque sea vieja
+        self.open = create_appointment(appointment_date=self.old_day, appointment_time=time(11, 0))
+        self.recent = create_appointment(
+            appointment_date=date.today() - timedelta(days=1), status=Appointment.Status.COMPLETED
+        )
+        self.entry = WaitlistEntry.objects.create(
+            patient_id=80, owner_id=1, veterinarian_id=1, reason='Control', contact_phone='5550000000',
+            earliest_date=self.old_day, latest_date=self.old_day, created_by=1,
+            status=WaitlistEntry.Status.ACCEPTED, offered_appointment=self.completed
+        )
+
+    def archive(self):
+        out = StringIO()
+        call_command('archive_appointments', '--batch-size', '1', '--sleep', '0', stdout=out)
+        return out.getvalue()
+
+    def test_command_moves_finished_appointments_in_batches(self):
+        """Test solo se archivan citas cerradas fuera del horizonte, lote por lote"""
+        self.assertIn('Citas archivadas: 2 en 2 lotes', self.archive())
+
+        self.assertEqual(
+            sorted(ArchivedAppointment.objects.values_list('id', flat=True)),
+            sorted([self.completed.id, self.no_show.id])
+        )
+        self.assertEqual(
+            sorted(Appointment.objects.values_list('id', flat=True)),
+            sorted([self.open.id, self.recent.id])
+        )
+        self.entry.refresh_from_db()
+        self.assertIsNone(self.entry.offered_appointment_id)
+        self.assertEqual(archive_watermark(), self.old_day)
+        self.assertEqual(archive_batch(archive_cutoff(), 10), 0)
+
+    def test_list_routes_into_history(self):
+        """Test un rango que llega al archivo une ambas tablas con filtros y orden"""
+        self.archive()
+        url = '/api/appointments/'
+
+        response = self.client.get(url, {'start_date': self.old_day.isoformat()})
+        self.assertEqual(
+            [appointment['id'] for appointment in response.data['results']],
+            [self.completed.id, self.no_show.id, self.open.id, self.recent.id]
+        )
+
+        response = self.client.get(url, {'start_date': self.old_day.isoformat(), 'status': 'NO_ASISTIO'})
+        self.assertEqual([appointment['id'] for appointment in response.data['results']], [self.no_show.id])
+
+        # Con un límite inferior reciente solo se consultan las citas vigentes
+        yesterday = (date.today() - timedelta(days=1)).isoformat()
+        self.assertEqual(self.client.get(url, {'start_date': yesterday}).data['count'], 1)
+        self.assertEqual(self.client.get(url, {'include_archived': 'true'}).data['count'], 4)
+
+    def test_list_without_lower_bound_is_live_only(self):
+        """Test sin start_date el listado es de citas vigentes salvo con include_archived=1"""
+        self.archive()
+        url = '/api/appointments/'
+
+        with CaptureQueriesContext(connection) as context:
+            self.assertEqual(self.client.get(url).data['count'], 2)
+        archived_table = ArchivedAppointment._meta.db_table
+        self.assertFalse([query for query in context.captured_queries if archived_table in query['sql']])
+
+        response = self.client.get(url, {'end_date': self.old_day.isoformat(), 'include_archived': '1'})
+        self.assertEqual(
+            [appointment['id'] for appointment in response.data['results']],
+            [self.completed.id, self.no_show.id, self.open.id]
+        )
+        response = self.client.get(url, {'patient_id': self.completed.patient_id, 'include_archived': '1'})
+        self.assertEqual([appointment['id'] for appointment in response.data['results']], [self.completed.id])
+        self.assertEqual(self.client.get(url, {'patient_id': self.completed.patient_id}).data['count'], 0)
+
+    def test_retrieve_archived_by_original_id(self):
+        """Test una cita archivada se consulta con su ID original"""
+        self.archive()
+        response = self.client.get(f'/api/appointments/{self.completed.id}/')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['status'], Appointment.Status.COMPLETED)
+
+        response = self.client.post(f'/api/appointments/{self.completed.id}/cancel/')
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_utilization_counts_archived_days(self):
+        """Test el resumen de uso de días viejos incluye las citas archivadas"""
+        self.archive()
+        refresh_range(self.old_day, self.old_day, [1])
+        self.assertEqual(
+            DailyUtilization.objects.filter(date=self.old_day).aggregate(total=Sum('appointments'))['total'], 3
+        )
+
+class QueryPlanTest(APITestCase):
+    """Regresiones de número de consultas y uso de índices en los filtros frecuentes"""
+
+    def setUp(self):
+        cache.clear()
+        self.client.force_authenticate(user=AuthenticatedUser({'id': 1, 'role': 'Admin'}))
+        for hour in range(8, 18):
+            create_appointment(veterinarian_id=hour % 3 + 1, appointment_time=time(hour, 0))
+
+    def get_with_plans(self, url, params, model):
+        """Respuesta de la petición y planes de las consultas que emitió sobre la tabla de `model`"""
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.get(url, params)
+        return response, query_plans(context.captured_queries, model._meta.db_table)
+
+    def assertUsesIndex(self, plans, index_name):
+        self.assertTrue(plans)
+        for plan in plans:
+            self.assertIn(index_name, plan)
+
+    def test_list_filtered_by_veterinarian(self):
+        """Test listado por veterinario y rango: conteo, página e índice"""
+        # La fecha de corte del archivo se consulta una vez y queda en caché
+        archive_watermark()
+        params = {
+            'veterinarian_id': 1,
+            'start_date': MONDAY.isoformat(),
+            'end_date': MONDAY.isoformat(),
+        }
+        with self.assertNumQueries(2):
+            response = self.client.get('/api/appointments/', params)
+        self.assertEqual(response.data['count'], 3)
+        _, plans = self.get_with_plans('/api/appointments/', params, Appointment)
+        self.assertUsesIndex(plans, 'appt_vet_date_status_idx')
+
+    def test_list_by_date_range(self):
+        """Test listado por rango de fechas usa el índice de fecha y hora"""
+        archive_watermark()
+        response, plans = self.get_with_plans('/api/appointments/', {'start_date': MONDAY.isoformat()}, Appointment)
+        self.assertEqual(response.data['count'], 10)
+        self.assertUsesIndex(plans, 'appt_date_time_idx')
+
+    def test_blocks_lookup(self):
+        """Test búsqueda de bloqueos activos de un veterinario"""
+        start = timezone.make_aware(datetime.combine(MONDAY, time(8, 0)))
+        AppointmentBlock.objects.create(
+            veterinarian_id=1, start_datetime=start, end_datetime=start + timedelta(hours=1),
+            reason='Cirugía', created_by=1
+        )
+        params = {'veterinarian_id': 1, 'is_active': True}
+        # Un bloqueo: conteo y página
+        with self.assertNumQueries(2):
+            self.client.get('/api/blocks/', params)
+        response, plans = self.get_with_plans('/api/blocks/', params, AppointmentBlock)
+        self.assertEqual(response.data['count'], 1)
+        self.assertUsesIndex(plans, 'block_vet_active_start_idx')
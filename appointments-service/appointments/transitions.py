@@ -0,0 +1,74 @@
+from django.db import transaction
+from django.utils import timezone
+from .models import Appointment
+from .events import appointments_changed
+
+Status = Appointment.Status
+
+# Estados de origen permitidos para cada estado destino
+ALLOWED_TRANSITIONS = {
+    Status.CONFIRMED: (Status.SCHEDULED,),
+    Status.IN_PROGRESS: (Status.CONFIRMED,),
+    Status.COMPLETED: (Status.IN_PROGRESS,),
+    Status.CANCELLED: (Status.SCHEDULED, Status.CONFIRMED, Status.IN_PROGRESS, Status.NO_SHOW),
+    Status.NO_SHOW: (Status.SCHEDULED, Status.CONFIRMED),
+}
+
+def bulk_transition(appointment_ids, target_status):
+    """
+    Cambiar el estado de varias citas con un único UPDATE condicionado al
+    estado de origen. Devuelve el resultado por ID.
+    """
+    sources = ALLOWED_TRANSITIONS[target_status]
+    appointment_ids = list(dict.fromkeys(appointment_ids))
+    results = {}
+
+    with transaction.atomic():
+        current = {
+            row[0]: row[1:]
+            for row in Appointment.objects.filter(id__in=appointment_ids).values_list(
+                'id', 'status', 'veterinarian_id', 'appointment_date'
+            )
+        }
+
+        eligible = []
+        for appointment_id in appointment_ids:
+            if appointment_id not in current:
+                results[appointment_id] = {'success': False, 'error': 'Cita no encontrada'}
+            elif current[appointment_id][0] not in sources:
+                results[appointment_id] = {
+                    'success': False,
+                    'error': f'No se puede pasar de {current[appointment_id][0]} a {target_status}'
+                }
+            else:
+                eligible.append(appointment_id)
+
+        now = timezone.now()
+        changes = {'status': target_status, 'updated_at': now}
+        if target_status == Status.CONFIRMED:
+            changes['confirmed_at'] = now
+
+        updated = Appointment.objects.filter(id__in=eligible, status__in=sources).update(**changes)
+
+        updated_ids = eligible
+        if updated != len(eligible):
+            # Otra petición cambió alguna cita entre la lectura y el UPDATE
+            updated_ids = list(Appointment.objects.filter(
+                id__in=eligible, status=target_status, updated_at=now
+            ).values_list('id', flat=True))
+
+        for appointment_id in eligible:
+            if appointment_id in updated_ids:
+                results[appointment_id] = {'success': True}
+            else:
+                results[appointment_id] = {'success': False, 'error': 'La cita cambió de estado durante la operación'}
+
+        if updated_ids:
+            appointments_changed.send(
+                sender=Appointment,
+                appointment_ids=updated_ids,
+                status=target_status,
+                vet_days={current[appointment_id][1:] for appointment_id in updated_ids}
+            )
+
+    return results
@@ -1,11 +1,16 @@
 from django.urls import path, include
 from rest_framework.routers import DefaultRouter
-from .views import AppointmentViewSet, VeterinarianScheduleViewSet, AppointmentBlockViewSet
+from .views import (
+    AppointmentViewSet, VeterinarianScheduleViewSet, AppointmentBlockViewSet, AppointmentSeriesViewSet,
+    WaitlistEntryViewSet
+)
 
 router = DefaultRouter()
 router.register(r'appointments', AppointmentViewSet)
 router.register(r'schedules', VeterinarianScheduleViewSet)
 router.register(r'blocks', AppointmentBlockViewSet)
+router.register(r'series', AppointmentSeriesViewSet)
+router.register(r'waitlist', WaitlistEntryViewSet)
 
 urlpatterns = [
     path('', include(router.urls)),
@@ -3,12 +3,30 @@ from rest_framework.response import Response
 from rest_framework.decorators import action
 from django_filters.rest_framework import DjangoFilterBackend
 from datetime import datetime, timedelta, time
+from django.db import transaction
 from django.conf import settings
+from django.http import Http404
+from django.shortcuts import get_object_or_404
 import requests
-from .models import Appointment, VeterinarianSchedule, AppointmentBlock
+from .models import (
+    Appointment, ArchivedAppointment, VeterinarianSchedule, AppointmentBlock, AppointmentSeries, WaitlistEntry
+)
+from .availability import AvailabilityEngine, next_available_slots
+from .occupancy import occupancy_cache, bitmap_slots
+from .booking import book_appointment
+from .transitions import bulk_transition
+from .series import materialize_series, update_following, cancel_following
+from .waitlist import accept_offer, release_offer
+from .changes import agenda_etag, current_cursor, wait_for_changes
+from .analytics import utilization_report
+from .blocks import create_blocks
+from .bookable import bookable_slots, type_duration
+from .archive import archive_watermark
 from .serializers import (
     AppointmentSerializer, AppointmentCreateSerializer, AppointmentListSerializer,
-    VeterinarianScheduleSerializer, AppointmentBlockSerializer, AgendaSerializer
+    VeterinarianScheduleSerializer, AppointmentBlockSerializer, AgendaSerializer,
+    BulkTransitionSerializer, AppointmentSeriesSerializer, SeriesFollowingSerializer,
+    SeriesUpdateSerializer, WaitlistEntrySerializer, AgendaChangeSerializer, BulkBlockSerializer
 )
 
 class AppointmentViewSet(viewsets.ModelViewSet):
@@ -29,12 +47,16 @@ class AppointmentViewSet(viewsets.ModelViewSet):
 
     def perform_create(self, serializer):
         """Agregar el usuario que crea la cita"""
-        serializer.save(created_by=self.request.user.get('id', 0))
+        book_appointment(serializer, created_by=self.request.user.get('id', 0))
+
+    def perform_update(self, serializer):
+        book_appointment(serializer)
 
     def get_queryset(self):
         """Personalizar queryset según parámetros"""
-        queryset = super().get_queryset()
-        
+        return self._filter_date_range(super().get_queryset())
+
+    def _filter_date_range(self, queryset):
         # Filtrar por rango de fechas
         start_date = self.request.query_params.get('start_date')
         end_date = self.request.query_params.get('end_date')
@@ -46,6 +68,50 @@ class AppointmentViewSet(viewsets.ModelViewSet):
             
         return queryset
 
+    def _archived_queryset(self):
+        """
+        Citas archivadas que alcanza el listado, o None si solo abarca citas
+        vigentes. Por defecto el listado es solo de citas vigentes; el archivo
+        se une con include_archived=1 o cuando start_date (o appointment_date)
+        no es posterior a la cita archivada más reciente.
+        """
+        if self.action != 'list':
+            return None
+        
+        params = self.request.query_params
+        include_archived = params.get('include_archived') in ('1', 'true')
+        start = params.get('start_date') or params.get('appointment_date')
+        
+        watermark = archive_watermark()
+        if watermark is None:
+            return None
+        if not include_archived:
+            try:
+                if not start or datetime.strptime(start, '%Y-%m-%d').date() > watermark:
+                    return None
+            except ValueError:
+                return None
+        return self._filter_date_range(ArchivedAppointment.objects.all())
+
+    def filter_queryset(self, queryset):
+        archived = self._archived_queryset()
+        if archived is None:
+            return super().filter_queryset(queryset)
+        
+        # Los filtros se aplican a cada tabla y el orden a la unión
+        ordering = filters.OrderingFilter().get_ordering(self.request, queryset, self)
+        current = super().filter_queryset(queryset).order_by()
+        history = super().filter_queryset(archived).order_by()
+        return current.union(history, all=True).order_by(*ordering)
+
+    def retrieve(self, request, *args, **kwargs):
+        """Las citas archivadas conservan su ID y se consultan igual"""
+        try:
+            return super().retrieve(request, *args, **kwargs)
+        except Http404:
+            archived = get_object_or_404(ArchivedAppointment, pk=kwargs['pk'])
+            return Response(self.get_serializer(archived).data)
+
     @action(detail=True, methods=['post'])
     def confirm(self, request, pk=None):
         """Confirmar una cita"""
@@ -111,6 +177,20 @@ class AppointmentViewSet(viewsets.ModelViewSet):
         serializer = self.get_serializer(appointment)
         return Response(serializer.data)
 
+    @action(detail=False, methods=['post'])
+    def bulk_transition(self, request):
+        """Cambiar el estado de varias citas (confirmación matutina, cierre del día)"""
+        serializer = BulkTransitionSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        
+        results = bulk_transition(serializer.validated_data['ids'], serializer.validated_data['status'])
+        
+        return Response({
+            'status': serializer.validated_data['status'],
+            'updated': sum(1 for result in results.values() if result['success']),
+            'results': results
+        })
+
     @action(detail=False, methods=['get'])
     def agenda(self, request):
         """Obtener agenda de un veterinario para una fecha"""
@@ -124,121 +204,134 @@ class AppointmentViewSet(viewsets.ModelViewSet):
             )
         
         try:
+            veterinarian_id = int(veterinarian_id)
             date = datetime.strptime(date_str, '%Y-%m-%d').date()
         except ValueError:
             return Response(
-                {'error': 'Formato de fecha inválido. Use YYYY-MM-DD'},
+                {'error': 'Parámetros inválidos. Use un ID numérico y fecha YYYY-MM-DD'},
                 status=status.HTTP_400_BAD_REQUEST
             )
         
-        # Obtener citas del día
-        appointments = Appointment.objects.filter(
-            veterinarian_id=veterinarian_id,
-            appointment_date=date
-        ).order_by('appointment_time')
+        duration_minutes = self._get_duration_param(request)
+        if duration_minutes is None:
+            return Response(
+                {'error': 'El parámetro duration debe ser un número de minutos entre 15 y 240'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
         
-        # Obtener horarios disponibles
-        available_slots = self._get_available_slots(veterinarian_id, date)
+        etag = self._agenda_etag(request, [veterinarian_id], [date])
+        if self._not_modified(request, etag):
+            return Response(status=status.HTTP_304_NOT_MODIFIED, headers={'ETag': etag})
         
-        # Obtener bloqueos
-        blocked_periods = self._get_blocked_periods(veterinarian_id, date)
+        # Citas y bloqueos del día se cargan una sola vez; los huecos salen del mapa de bits
+        engine = AvailabilityEngine([veterinarian_id], date)
         
-        agenda_data = {
-            'date': date,
-            'veterinarian_id': veterinarian_id,
-            'appointments': AppointmentListSerializer(appointments, many=True).data,
-            'available_slots': available_slots,
-            'blocked_periods': blocked_periods
-        }
+        agenda_data = self._serialize_day(engine, self._day_bitmaps(engine), veterinarian_id, date, duration_minutes)
+        agenda_data['veterinarian_id'] = veterinarian_id
         
-        return Response(agenda_data)
+        return Response(agenda_data, headers=self._etag_headers(etag))
 
-    def _get_available_slots(self, veterinarian_id, date):
-        """Calcular horarios disponibles para un veterinario en una fecha"""
-        # Obtener horario de trabajo
-        day_name = date.strftime('%A').upper()
-        day_mapping = {
-            'MONDAY': 'LUNES', 'TUESDAY': 'MARTES', 'WEDNESDAY': 'MIERCOLES',
-            'THURSDAY': 'JUEVES', 'FRIDAY': 'VIERNES', 'SATURDAY': 'SABADO', 'SUNDAY': 'DOMINGO'
-        }
-        
-        try:
-            schedule = VeterinarianSchedule.objects.get(
-                veterinarian_id=veterinarian_id,
-                day_of_week=day_mapping[day_name],
-                is_active=True
-            )
-        except VeterinarianSchedule.DoesNotExist:
-            return []
-        
-        # Generar slots cada 30 minutos
-        slots = []
-        current_time = datetime.combine(date, schedule.start_time)
-        end_time = datetime.combine(date, schedule.end_time)
-        slot_duration = timedelta(minutes=settings.APPOINTMENT_DURATION_MINUTES)
-        
-        while current_time + slot_duration <= end_time:
-            slot_time = current_time.time()
-            
-            # Verificar si el slot está ocupado
-            if not self._is_slot_occupied(veterinarian_id, date, slot_time):
-                slots.append(slot_time)
-            
-            current_time += slot_duration
+    @action(detail=False, methods=['get'])
+    def availability(self, request):
+        """Horarios disponibles de un veterinario, resueltos desde el mapa de ocupación en caché"""
+        veterinarian_id = request.query_params.get('veterinarian_id')
+        date_str = request.query_params.get('date')
         
-        return slots
-
-    def _is_slot_occupied(self, veterinarian_id, date, slot_time):
-        """Verificar si un slot está ocupado"""
-        # Verificar citas existentes
-        existing_appointments = Appointment.objects.filter(
-            veterinarian_id=veterinarian_id,
-            appointment_date=date,
-            status__in=['AGENDADA', 'CONFIRMADA', 'EN_PROGRESO']
-        )
+        if not veterinarian_id or not date_str:
+            return Response(
+                {'error': 'Se requieren los parámetros veterinarian_id y date'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
         
-        slot_datetime = datetime.combine(date, slot_time)
-        slot_end = slot_datetime + timedelta(minutes=settings.APPOINTMENT_DURATION_MINUTES)
+        try:
+            veterinarian_id = int(veterinarian_id)
+            date = datetime.strptime(date_str, '%Y-%m-%d').date()
+        except ValueError:
+            return Response(
+                {'error': 'Parámetros inválidos. Use un ID numérico y fecha YYYY-MM-DD'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
         
-        for apt in existing_appointments:
-            apt_start = datetime.combine(apt.appointment_date, apt.appointment_time)
-            apt_end = apt_start + timedelta(minutes=apt.duration_minutes)
-            
-            # Verificar solapamiento
-            if not (slot_end <= apt_start or slot_datetime >= apt_end):
-                return True
-        
-        # Verificar bloqueos
-        blocks = AppointmentBlock.objects.filter(
-            veterinarian_id=veterinarian_id,
-            is_active=True,
-            start_datetime__lt=slot_end,
-            end_datetime__gt=slot_datetime
-        )
+        duration_minutes = self._get_duration_param(request)
+        if duration_minutes is None:
+            return Response(
+                {'error': 'El parámetro duration debe ser un número de minutos entre 15 y 240'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
         
-        return blocks.exists()
+        return Response({
+            'date': date,
+            'veterinarian_id': veterinarian_id,
+            'duration_minutes': duration_minutes,
+            'available_slots': occupancy_cache.available_slots(veterinarian_id, date, duration_minutes)
+        })
 
-    def _get_blocked_periods(self, veterinarian_id, date):
-        """Obtener períodos bloqueados para un veterinario en una fecha"""
-        start_datetime = datetime.combine(date, time.min)
-        end_datetime = datetime.combine(date, time.max)
-        
-        blocks = AppointmentBlock.objects.filter(
-            veterinarian_id=veterinarian_id,
-            is_active=True,
-            start_datetime__lt=end_datetime,
-            end_datetime__gt=start_datetime
-        )
-        
-        blocked_periods = []
-        for block in blocks:
-            blocked_periods.append({
-                'start': block.start_datetime.time() if block.start_datetime.date() == date else time.min,
-                'end': block.end_datetime.time() if block.end_datetime.date() == date else time.max,
-                'reason': block.reason
-            })
-        
-        return blocked_periods
+    @action(detail=False, methods=['get'])
+    def bookable_slots(self, request):
+        """
+        Horarios reservables para la reserva en línea, leídos del modelo de
+        lectura en Redis. La cita se crea después con POST /api/appointments/,
+        que es el único paso que valida contra la base de datos.
+        """
+        appointment_type = request.query_params.get('appointment_type')
+        if appointment_type not in settings.BOOKABLE_APPOINTMENT_TYPES:
+            return Response(
+                {'error': f'appointment_type debe ser uno de {", ".join(settings.BOOKABLE_APPOINTMENT_TYPES)}'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        first_day, last_day = bookable_slots.horizon()
+        try:
+            start_date = request.query_params.get('start_date')
+            start_date = datetime.strptime(start_date, '%Y-%m-%d').date() if start_date else first_day
+            end_date = request.query_params.get('end_date')
+            end_date = datetime.strptime(end_date, '%Y-%m-%d').date() if end_date else last_day
+            veterinarian_ids = self._get_veterinarian_ids_param(request)
+            limit = int(request.query_params.get('limit', 20))
+        except ValueError:
+            return Response(
+                {'error': 'Parámetros inválidos. Use fechas YYYY-MM-DD e IDs numéricos'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        if start_date > end_date or start_date < first_day or end_date > last_day:
+            return Response(
+                {'error': f'El rango debe estar entre {first_day} y {last_day}'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        if not 1 <= limit <= settings.BOOKABLE_SLOTS_MAX_RESULTS:
+            return Response(
+                {'error': f'limit debe estar entre 1 y {settings.BOOKABLE_SLOTS_MAX_RESULTS}'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        start = max(datetime.combine(start_date, time.min), datetime.now())
+        end = datetime.combine(end_date, time.max)
+        slots = bookable_slots.slots(appointment_type, start, end, veterinarian_ids, limit)
+
+        return Response({
+            'appointment_type': appointment_type,
+            'duration_minutes': type_duration(appointment_type),
+            'slots': [
+                {
+                    'veterinarian_id': veterinarian_id,
+                    'date': slot.date(),
+                    'time': slot.time(),
+                }
+                for slot, veterinarian_id in slots
+            ]
+        }, headers={'Cache-Control': f'public, max-age={settings.BOOKABLE_SLOTS_MAX_AGE}'})
+
+    def _get_duration_param(self, request, default=None):
+        """Duración solicitada para los slots; None si el valor no es válido"""
+        duration = request.query_params.get('duration', default or settings.APPOINTMENT_DURATION_MINUTES)
+        try:
+            duration = int(duration)
+        except (TypeError, ValueError):
+            return None
+        if not 15 <= duration <= 240:
+            return None
+        return duration
 
     @action(detail=False, methods=['get'])
     def weekly_agenda(self, request):
@@ -253,34 +346,303 @@ class AppointmentViewSet(viewsets.ModelViewSet):
             )
         
         try:
+            veterinarian_id = int(veterinarian_id)
             start_date = datetime.strptime(week_start, '%Y-%m-%d').date()
         except ValueError:
             return Response(
-                {'error': 'Formato de fecha inválido. Use YYYY-MM-DD'},
+                {'error': 'Parámetros inválidos. Use un ID numérico y fecha YYYY-MM-DD'},
                 status=status.HTTP_400_BAD_REQUEST
             )
         
         end_date = start_date + timedelta(days=6)
         
-        appointments = Appointment.objects.filter(
-            veterinarian_id=veterinarian_id,
-            appointment_date__range=[start_date, end_date]
-        ).order_by('appointment_date', 'appointment_time')
+        etag = self._agenda_etag(
+            request, [veterinarian_id], [start_date + timedelta(days=offset) for offset in range(7)]
+        )
+        if self._not_modified(request, etag):
+            return Response(status=status.HTTP_304_NOT_MODIFIED, headers={'ETag': etag})
+        
+        engine = AvailabilityEngine([veterinarian_id], start_date, end_date)
+        bitmaps = self._day_bitmaps(engine)
         
         # Agrupar por fecha
         agenda_by_date = {}
-        current_date = start_date
-        while current_date <= end_date:
-            date_appointments = appointments.filter(appointment_date=current_date)
-            agenda_by_date[current_date.isoformat()] = {
-                'date': current_date,
-                'appointments': AppointmentListSerializer(date_appointments, many=True).data,
-                'available_slots': self._get_available_slots(veterinarian_id, current_date),
-                'blocked_periods': self._get_blocked_periods(veterinarian_id, current_date)
+        for current_date in engine.dates():
+            agenda_by_date[current_date.isoformat()] = self._serialize_day(
+                engine, bitmaps, veterinarian_id, current_date
+            )
+        
+        return Response(agenda_by_date, headers=self._etag_headers(etag))
+
+    @action(detail=False, methods=['get'])
+    def range_agenda(self, request):
+        """
+        Agenda de varios veterinarios en un rango de fechas. Sin veterinarian_ids
+        incluye a todos los veterinarios con horario, citas o bloqueos en el rango.
+        """
+        start_str = request.query_params.get('start_date')
+        end_str = request.query_params.get('end_date')
+        
+        if not start_str or not end_str:
+            return Response(
+                {'error': 'Se requieren los parámetros start_date y end_date'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        
+        try:
+            start_date = datetime.strptime(start_str, '%Y-%m-%d').date()
+            end_date = datetime.strptime(end_str, '%Y-%m-%d').date()
+        except ValueError:
+            return Response(
+                {'error': 'Formato de fecha inválido. Use YYYY-MM-DD'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        
+        if end_date < start_date:
+            return Response(
+                {'error': 'end_date debe ser igual o posterior a start_date'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        
+        if (end_date - start_date).days + 1 > settings.AGENDA_MAX_RANGE_DAYS:
+            return Response(
+                {'error': f'El rango máximo es de {settings.AGENDA_MAX_RANGE_DAYS} días'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        
+        try:
+            veterinarian_ids = self._get_veterinarian_ids_param(request)
+        except ValueError:
+            return Response(
+                {'error': 'veterinarian_ids debe ser una lista de IDs separados por comas'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        
+        duration_minutes = self._get_duration_param(request)
+        if duration_minutes is None:
+            return Response(
+                {'error': 'El parámetro duration debe ser un número de minutos entre 15 y 240'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        
+        etag = self._agenda_etag(
+            request, veterinarian_ids,
+            [start_date + timedelta(days=offset) for offset in range((end_date - start_date).days + 1)]
+        )
+        if self._not_modified(request, etag):
+            return Response(status=status.HTTP_304_NOT_MODIFIED, headers={'ETag': etag})
+        
+        # Tres consultas por rango; el agrupamiento por veterinario y día es en memoria
+        engine = AvailabilityEngine(veterinarian_ids, start_date, end_date)
+        bitmaps = self._day_bitmaps(engine)
+        
+        agenda = {}
+        for veterinarian_id in engine.veterinarian_ids:
+            agenda[str(veterinarian_id)] = {
+                current_date.isoformat(): self._serialize_day(
+                    engine, bitmaps, veterinarian_id, current_date, duration_minutes
+                )
+                for current_date in engine.dates()
             }
-            current_date += timedelta(days=1)
         
-        return Response(agenda_by_date)
+        return Response({
+            'start_date': start_date,
+            'end_date': end_date,
+            'veterinarians': agenda
+        }, headers=self._etag_headers(etag))
+
+    @action(detail=False, methods=['get'])
+    def next_available(self, request):
+        """
+        Primeros horarios libres entre todos los veterinarios (o los indicados en
+        veterinarian_ids) para una duración o tipo de cita dentro de un horizonte.
+        """
+        appointment_type = request.query_params.get('appointment_type')
+        if appointment_type and appointment_type not in Appointment.AppointmentType.values:
+            return Response(
+                {'error': 'Tipo de cita inválido'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        
+        default_duration = settings.APPOINTMENT_TYPE_DURATIONS.get(
+            appointment_type, settings.APPOINTMENT_DURATION_MINUTES
+        )
+        duration_minutes = self._get_duration_param(request, default_duration)
+        if duration_minutes is None:
+            return Response(
+                {'error': 'El parámetro duration debe ser un número de minutos entre 15 y 240'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        
+        try:
+            veterinarian_ids = self._get_veterinarian_ids_param(request)
+            limit = int(request.query_params.get('limit', 5))
+            horizon_days = int(request.query_params.get('horizon_days', 30))
+        except ValueError:
+            return Response(
+                {'error': 'Parámetros inválidos'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        
+        if not 1 <= limit <= settings.NEXT_AVAILABLE_MAX_RESULTS:
+            return Response(
+                {'error': f'limit debe estar entre 1 y {settings.NEXT_AVAILABLE_MAX_RESULTS}'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        if not 1 <= horizon_days <= settings.NEXT_AVAILABLE_MAX_HORIZON_DAYS:
+            return Response(
+                {'error': f'horizon_days debe estar entre 1 y {settings.NEXT_AVAILABLE_MAX_HORIZON_DAYS}'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        
+        slots = next_available_slots(
+            veterinarian_ids, duration_minutes, limit,
+            start=datetime.now(), horizon_days=horizon_days
+        )
+        
+        return Response({
+            'duration_minutes': duration_minutes,
+            'appointment_type': appointment_type,
+            'slots': [
+                {
+                    'veterinarian_id': veterinarian_id,
+                    'date': slot.date(),
+                    'time': slot.time(),
+                }
+                for slot, veterinarian_id in slots
+            ]
+        })
+
+    @action(detail=False, methods=['get'])
+    def utilization(self, request):
+        """
+        Uso de la clínica por veterinario y día o semana (group_by=day|week), y
+        por tipo de cita. Se calcula sobre el resumen diario.
+        """
+        start_str = request.query_params.get('start_date')
+        end_str = request.query_params.get('end_date')
+        group_by = request.query_params.get('group_by', 'day')
+        
+        if not start_str or not end_str:
+            return Response(
+                {'error': 'Se requieren los parámetros start_date y end_date'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        
+        try:
+            start_date = datetime.strptime(start_str, '%Y-%m-%d').date()
+            end_date = datetime.strptime(end_str, '%Y-%m-%d').date()
+        except ValueError:
+            return Response(
+                {'error': 'Formato de fecha inválido. Use YYYY-MM-DD'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        
+        if end_date < start_date:
+            return Response(
+                {'error': 'end_date debe ser igual o posterior a start_date'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        
+        if (end_date - start_date).days + 1 > settings.UTILIZATION_MAX_RANGE_DAYS:
+            return Response(
+                {'error': f'El rango máximo es de {settings.UTILIZATION_MAX_RANGE_DAYS} días'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        
+        if group_by not in ('day', 'week'):
+            return Response(
+                {'error': 'group_by debe ser day o week'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        
+        try:
+            veterinarian_ids = self._get_veterinarian_ids_param(request)
+        except ValueError:
+            return Response(
+                {'error': 'veterinarian_ids debe ser una lista de IDs separados por comas'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        
+        report = utilization_report(start_date, end_date, veterinarian_ids, group_by)
+        return Response({
+            'start_date': start_date,
+            'end_date': end_date,
+            'group_by': group_by,
+            **report
+        })
+
+    @action(detail=False, methods=['get'])
+    def changes(self, request):
+        """
+        Feed de cambios de citas, bloqueos y horarios. Sin cursor devuelve el
+        cursor actual; con cursor devuelve los cambios posteriores, esperando
+        hasta `wait` segundos (a lo sumo AGENDA_CHANGES_MAX_WAIT) si no hay.
+        """
+        try:
+            veterinarian_ids = self._get_veterinarian_ids_param(request)
+        except ValueError:
+            return Response(
+                {'error': 'veterinarian_ids debe ser una lista de IDs separados por comas'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        
+        cursor = request.query_params.get('cursor')
+        if cursor is None:
+            return Response({'cursor': current_cursor(), 'changes': []})
+        
+        try:
+            cursor = int(cursor)
+            wait = max(min(int(request.query_params.get('wait', 0)), settings.AGENDA_CHANGES_MAX_WAIT), 0)
+        except ValueError:
+            return Response(
+                {'error': 'cursor y wait deben ser números enteros'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        
+        changes = wait_for_changes(cursor, veterinarian_ids, wait)
+        return Response({
+            'cursor': changes[-1].sequence if changes else cursor,
+            'changes': AgendaChangeSerializer(changes, many=True).data
+        })
+
+    def _agenda_etag(self, request, veterinarian_ids, dates):
+        """ETag de la agenda solicitada; None si los IDs no son válidos"""
+        try:
+            if veterinarian_ids is not None:
+                veterinarian_ids = [int(vet_id) for vet_id in veterinarian_ids]
+        except (TypeError, ValueError):
+            return None
+        return agenda_etag(request.get_full_path(), veterinarian_ids, dates)
+
+    def _not_modified(self, request, etag):
+        if etag is None:
+            return False
+        tags = [tag.strip().removeprefix('W/') for tag in request.headers.get('If-None-Match', '').split(',')]
+        return etag in tags or '*' in tags
+
+    def _etag_headers(self, etag):
+        return {'ETag': etag} if etag else None
+
+    def _get_veterinarian_ids_param(self, request):
+        """Lista de IDs de veterinario separados por comas; None si no se indica"""
+        value = request.query_params.get('veterinarian_ids')
+        if not value:
+            return None
+        return [int(vet_id) for vet_id in value.split(',')]
+
+    def _day_bitmaps(self, engine):
+        """Mapas de ocupación de los días del motor; los que falten se calculan desde él"""
+        return occupancy_cache.get_bitmaps(engine.veterinarian_ids, list(engine.dates()), engine=engine)
+
+    def _serialize_day(self, engine, bitmaps, veterinarian_id, date, duration_minutes=None):
+        """Citas y bloqueos del motor; horarios disponibles desde el mapa de ocupación"""
+        return {
+            'appointments': AppointmentListSerializer(engine.appointments_for(veterinarian_id, date), many=True).data,
+            'available_slots': bitmap_slots(bitmaps[(int(veterinarian_id), date)], date, duration_minutes),
+            'blocked_periods': engine.blocked_periods(veterinarian_id, date),
+            'date': date,
+        }
 
 class VeterinarianScheduleViewSet(viewsets.ModelViewSet):
     queryset = VeterinarianSchedule.objects.all()
@@ -296,5 +658,119 @@ class AppointmentBlockViewSet(viewsets.ModelViewSet):
     ordering = ['start_datetime']
 
     def perform_create(self, serializer):
-        """Agregar el usuario que crea el bloqueo"""
-        serializer.save(created_by=self.request.user.get('id', 0)) 
\ No newline at end of file
+        """Crear el bloqueo fusionándolo con los bloqueos activos que toca"""
+        data = serializer.validated_data
+        if not data.get('is_active', True):
+            serializer.save(created_by=self.request.user.get('id', 0))
+            return
+        serializer.instance = create_blocks(
+            [data['veterinarian_id']], data['start_datetime'], data['end_datetime'],
+            data['reason'], created_by=self.request.user.get('id', 0)
+        )[0]
+
+    def perform_update(self, serializer):
+        """Guardar el bloqueo y fusionarlo con los bloqueos activos que pasa a tocar"""
+        with transaction.atomic():
+            block = serializer.save()
+            if block.is_active:
+                serializer.instance = create_blocks(
+                    [block.veterinarian_id], block.start_datetime, block.end_datetime,
+                    block.reason, created_by=block.created_by, keep=block
+                )[0]
+
+    @action(detail=False, methods=['post'])
+    def bulk(self, request):
+        """Bloquear el mismo periodo para varios veterinarios en una sola operación"""
+        serializer = BulkBlockSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        data = serializer.validated_data
+
+        blocks = create_blocks(
+            data['veterinarian_ids'], data['start_datetime'], data['end_datetime'],
+            data['reason'], created_by=request.user.get('id', 0)
+        )
+        return Response(AppointmentBlockSerializer(blocks, many=True).data, status=status.HTTP_201_CREATED)
+
+class AppointmentSeriesViewSet(viewsets.ModelViewSet):
+    queryset = AppointmentSeries.objects.all()
+    serializer_class = AppointmentSeriesSerializer
+    filter_backends = [DjangoFilterBackend]
+    filterset_fields = ['patient_id', 'veterinarian_id', 'is_active']
+    # Los cambios se aplican con update_following y cancel
+    http_method_names = ['get', 'post', 'head', 'options']
+
+    def create(self, request, *args, **kwargs):
+        """Crear la serie y sus citas; las fechas con conflicto se informan en `skipped`"""
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        
+        with transaction.atomic():
+            series = serializer.save(created_by=request.user.get('id', 0))
+            created, skipped = materialize_series(series)
+        
+        return Response({
+            'series': self.get_serializer(series).data,
+            'created': created,
+            'skipped': [{'date': date, 'error': error} for date, error in sorted(skipped.items())]
+        }, status=status.HTTP_201_CREATED)
+
+    @action(detail=True, methods=['post'])
+    def update_following(self, request, pk=None):
+        """Modificar esta cita y las siguientes de la serie"""
+        series = self.get_object()
+        serializer = SeriesUpdateSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        
+        changes = dict(serializer.validated_data)
+        from_date = changes.pop('from_date', datetime.now().date())
+        updated = update_following(series, from_date, changes)
+        
+        return Response({'series': self.get_serializer(series).data, 'updated': updated})
+
+    @action(detail=True, methods=['post'])
+    def cancel(self, request, pk=None):
+        """Cancelar esta cita y las siguientes de la serie"""
+        series = self.get_object()
+        serializer = SeriesFollowingSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        
+        cancelled = cancel_following(series, serializer.validated_data.get('from_date', datetime.now().date()))
+        
+        return Response({'series': self.get_serializer(series).data, 'cancelled': cancelled})
+
+class WaitlistEntryViewSet(viewsets.ModelViewSet):
+    queryset = WaitlistEntry.objects.select_related('offered_appointment')
+    serializer_class = WaitlistEntrySerializer
+    filter_backends = [DjangoFilterBackend, filters.OrderingFilter]
+    filterset_fields = ['status', 'patient_id', 'veterinarian_id']
+    ordering = ['created_at']
+
+    def perform_create(self, serializer):
+        """Agregar el usuario que registra la solicitud"""
+        serializer.save(created_by=self.request.user.get('id', 0))
+
+    @action(detail=True, methods=['post'])
+    def accept(self, request, pk=None):
+        """Aceptar el horario ofertado: la cita queda confirmada"""
+        entry = accept_offer(self.get_object().id)
+        if entry is None:
+            return Response(
+                {'error': 'La solicitud no tiene una oferta pendiente'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        
+        serializer = self.get_serializer(entry)
+        return Response(serializer.data)
+
+    @action(detail=True, methods=['post'])
+    def decline(self, request, pk=None):
+        """Rechazar el horario ofertado; se ofrece al siguiente en espera"""
+        entry = release_offer(self.get_object().id, WaitlistEntry.Status.DECLINED)
+        if entry is None:
+            return Response(
+                {'error': 'La solicitud no tiene una oferta pendiente'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        
+        serializer = self.get_serializer(entry)
+        return Response(serializer.data)
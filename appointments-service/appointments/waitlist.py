@@ -0,0 +1,161 @@
+import logging
+from datetime import datetime, timedelta
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+from .models import Appointment, WaitlistEntry
+from .booking import lock_veterinarian_day, find_conflict
+
+logger = logging.getLogger(__name__)
+
+def matching_entries(veterinarian_id, date, start_time, duration_minutes):
+    """
+    Solicitudes en espera que aceptan el horario: las del veterinario y las que
+    aceptan a cualquiera. Cada consulta es una búsqueda por rango en
+    waitlist_match_idx (estado, veterinario, fecha final), sin recorrer la tabla.
+    """
+    compatible = WaitlistEntry.objects.filter(
+        Q(earliest_time__isnull=True) | Q(earliest_time__lte=start_time),
+        Q(latest_time__isnull=True) | Q(latest_time__gte=start_time),
+        status=WaitlistEntry.Status.WAITING,
+        latest_date__gte=date,
+        earliest_date__lte=date,
+        duration_minutes__lte=duration_minutes,
+    ).order_by('created_at')
+    return [
+        compatible.filter(veterinarian_id=veterinarian_id),
+        compatible.filter(veterinarian_id__isnull=True),
+    ]
+
+def offer_slot(veterinarian_id, date, start_time, duration_minutes):
+    """
+    Reservar el horario para la solicitud compatible más antigua. La cita ofertada y
+    el cambio de estado de la solicitud se guardan en la misma transacción; las
+    solicitudes que otro proceso está ofertando se omiten. Devuelve la solicitud o None.
+    """
+    with transaction.atomic():
+        lock_veterinarian_day(veterinarian_id, date)
+        limit = settings.WAITLIST_MATCH_CANDIDATES
+        candidates = sorted(
+            (
+                entry
+                for queryset in matching_entries(veterinarian_id, date, start_time, duration_minutes)
+                for entry in queryset.select_for_update(skip_locked=True)[:limit]
+            ),
+            key=lambda entry: entry.created_at
+        )[:limit]
+
+        for entry in candidates:
+            if find_conflict(veterinarian_id, date, start_time, entry.duration_minutes):
+                continue
+            if Appointment.objects.filter(
+                patient_id=entry.patient_id, appointment_date=date, appointment_time=start_time
+            ).exists():
+                continue
+
+            appointment = Appointment.objects.create(
+                patient_id=entry.patient_id,
+                owner_id=entry.owner_id,
+                veterinarian_id=veterinarian_id,
+                appointment_date=date,
+                appointment_time=start_time,
+                duration_minutes=entry.duration_minutes,
+                appointment_type=entry.appointment_type,
+                reason=entry.reason,
+                notes='Horario ofertado desde la lista de espera',
+                contact_phone=entry.contact_phone,
+                created_by=entry.created_by,
+            )
+            now = timezone.now()
+            entry.status = WaitlistEntry.Status.OFFERED
+            entry.offered_appointment = appointment
+            entry.offered_at = now
+            entry.offer_expires_at = now + timedelta(minutes=settings.WAITLIST_OFFER_TTL_MINUTES)
+            entry.save()
+            return entry
+    return None
+
+def match_freed_appointments(appointment_ids):
+    """Ofrecer los horarios de las citas canceladas a la lista de espera"""
+    now = datetime.now()
+    offered = 0
+    freed = Appointment.objects.filter(
+        id__in=appointment_ids, status=Appointment.Status.CANCELLED, appointment_date__gte=now.date()
+    ).values_list('veterinarian_id', 'appointment_date', 'appointment_time', 'duration_minutes')
+
+    for veterinarian_id, date, start_time, duration_minutes in freed:
+        if datetime.combine(date, start_time) <= now:
+            continue
+        try:
+            if offer_slot(veterinarian_id, date, start_time, duration_minutes):
+                offered += 1
+        except Exception as e:
+            logger.error(f"Error al ofertar horario de lista de espera: {e}")
+    return offered
+
+def _locked_offer(entry_id):
+    """
+    Solicitud con su oferta pendiente, bloqueada; None si ya no está ofertada.
+    Debe llamarse dentro de una transacción.
+    """
+    entry = WaitlistEntry.objects.select_for_update().filter(
+        id=entry_id, status=WaitlistEntry.Status.OFFERED
+    ).first()
+    if entry is None or entry.offered_appointment_id is None:
+        return None
+    return entry
+
+def accept_offer(entry_id):
+    """
+    Confirmar la cita ofertada. Bajo el bloqueo de la solicitud y del día del
+    veterinario se comprueba que la oferta siga pendiente y la cita agendada:
+    una oferta que venció mientras tanto ya liberó el horario. Devuelve la
+    solicitud aceptada o None.
+    """
+    with transaction.atomic():
+        entry = _locked_offer(entry_id)
+        if entry is None:
+            return None
+        veterinarian_id, date = Appointment.objects.filter(id=entry.offered_appointment_id).values_list(
+            'veterinarian_id', 'appointment_date'
+        ).get()
+        lock_veterinarian_day(veterinarian_id, date)
+        appointment = Appointment.objects.select_for_update().get(id=entry.offered_appointment_id)
+        if appointment.status != Appointment.Status.SCHEDULED:
+            return None
+        appointment.status = Appointment.Status.CONFIRMED
+        appointment.confirmed_at = timezone.now()
+        appointment.save()
+        entry.status = WaitlistEntry.Status.ACCEPTED
+        entry.save()
+    return entry
+
+def release_offer(entry_id, status, expired_before=None):
+    """
+    Cerrar una oferta no aceptada; cancelar la cita libera el horario para el
+    siguiente. Con `expired_before` solo se cierra si la oferta venció antes de
+    esa fecha. Devuelve la solicitud o None si la oferta ya no estaba pendiente.
+    """
+    with transaction.atomic():
+        entry = _locked_offer(entry_id)
+        if entry is None or (expired_before and entry.offer_expires_at >= expired_before):
+            return None
+        appointment = Appointment.objects.select_for_update().get(id=entry.offered_appointment_id)
+        entry.status = status
+        entry.save()
+        if appointment.status == Appointment.Status.SCHEDULED:
+            appointment.status = Appointment.Status.CANCELLED
+            appointment.save()
+    return entry
+
+def expire_offers():
+    """Vencer las ofertas que no se aceptaron a tiempo"""
+    now = timezone.now()
+    expired = WaitlistEntry.objects.filter(
+        status=WaitlistEntry.Status.OFFERED, offer_expires_at__lt=now
+    ).values_list('id', flat=True)
+    return sum(
+        1 for entry_id in list(expired)
+        if release_offer(entry_id, WaitlistEntry.Status.EXPIRED, expired_before=now)
+    )
@@ -1,37 +1,92 @@
 import requests
+from functools import lru_cache
 from rest_framework.authentication import BaseAuthentication
 from rest_framework.exceptions import AuthenticationFailed
+from rest_framework_simplejwt.backends import TokenBackend
+from rest_framework_simplejwt.exceptions import TokenBackendError
 from django.conf import settings
+from clinic_common.http_client import get_client
+from clinic_common.token_cache import token_cache
+
+# Claims que auth-service incluye en el token con la identidad del usuario
+USER_CLAIMS = ('email', 'username', 'first_name', 'last_name', 'role', 'is_active')
+
+# Timeout (conexión, lectura) en segundos de la verificación remota
+AUTH_VERIFY_TIMEOUT = (1, 5)
+
+class AuthenticatedUser(dict):
+    """Datos del usuario autenticado, accesibles como dict y como usuario de DRF"""
+    is_authenticated = True
+    is_anonymous = False
+
+@lru_cache(maxsize=None)
+def get_token_backend():
+    """Backend de SimpleJWT con la llave compartida o el JWKS publicado por auth-service"""
+    return TokenBackend(
+        settings.JWT_ALGORITHM,
+        signing_key=settings.JWT_SIGNING_KEY,
+        jwk_url=settings.JWT_JWK_URL,
+    )
 
 class JWTAuthentication(BaseAuthentication):
     def authenticate(self, request):
         authorization_header = request.META.get('HTTP_AUTHORIZATION')
-        
+
         if not authorization_header:
             return None
-            
+
         try:
             token = authorization_header.split(' ')[1]
+            if settings.JWT_VERIFICATION_MODE == 'local':
+                user_data = self.decode_token(token)
+                # Solo se consulta a auth-service cuando se requiere verificar revocación
+                if request.method not in settings.JWT_REVOCATION_CHECK_METHODS:
+                    return (user_data, token)
             return self.verify_token(token)
         except (IndexError, ValueError):
             raise AuthenticationFailed('Token inválido')
-    
+
+    def decode_token(self, token):
+        """
+        Verificar firma y expiración del token localmente. No detecta tokens
+        revocados: para eso están JWT_REVOCATION_CHECK_METHODS y el modo remoto.
+        """
+        try:
+            payload = get_token_backend().decode(token, verify=True)
+        except TokenBackendError:
+            raise AuthenticationFailed('Token inválido o expirado')
+
+        if (payload.get('token_type') != 'access' or payload.get('user_id') is None
+                or not payload.get('is_active', True)):
+            raise AuthenticationFailed('Token inválido o expirado')
+
+        user_data = AuthenticatedUser({claim: payload.get(claim) for claim in USER_CLAIMS})
+        user_data['id'] = payload.get('user_id')
+        return user_data
+
     def verify_token(self, token):
+        user_data = token_cache.get(token)
+        if user_data is not None:
+            return (AuthenticatedUser(user_data), token)
+
+        stamp = token_cache.stamp()
         try:
             # Verificar el token con el microservicio de autenticación
-            response = requests.post(
-                f"{settings.AUTH_SERVICE_URL}/api/users/token_verify/",
+            response = get_client('auth').post(
+                '/api/users/token_verify/',
                 data={'token': token},
-                timeout=5
+                timeout=AUTH_VERIFY_TIMEOUT,
+                idempotent=True
             )
-            
+
             if response.status_code == 200:
-                user_data = response.json()
+                user_data = AuthenticatedUser(response.json())
+                token_cache.set(token, user_data, stamp)
                 return (user_data, token)
             else:
                 raise AuthenticationFailed('Token inválido o expirado')
-                
+
         except requests.exceptions.RequestException:
             raise AuthenticationFailed('Error al verificar token')
         except Exception:
-            raise AuthenticationFailed('Error de autenticación') 
\ No newline at end of file
+            raise AuthenticationFailed('Error de autenticación')
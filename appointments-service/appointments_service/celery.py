@@ -0,0 +1,8 @@
+import os
+from celery import Celery
+
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'appointments_service.settings')
+
+app = Celery('appointments_service')
+app.config_from_object('django.conf:settings', namespace='CELERY')
+app.autodiscover_tasks()
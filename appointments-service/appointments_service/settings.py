@@ -1,9 +1,14 @@
 import os
+import sys
 from pathlib import Path
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
 
+# Paquete clinic_common: en Docker se copia dentro del servicio, en local está en la raíz del repositorio
+if not (BASE_DIR / 'clinic_common').is_dir():
+    sys.path.append(str(BASE_DIR.parent))
+
 # SECURITY WARNING: keep the secret key used in production secret!
 SECRET_KEY = os.getenv('DJANGO_SECRET_KEY', 'django-insecure-appointments-service-key')
 
@@ -106,7 +111,7 @@ DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 # REST Framework settings
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': (
-        'rest_framework_simplejwt.authentication.JWTAuthentication',
+        'appointments_service.authentication.JWTAuthentication',
     ),
     'DEFAULT_PERMISSION_CLASSES': (
         'rest_framework.permissions.IsAuthenticated',
@@ -145,6 +150,36 @@ SIMPLE_JWT = {
     'USER_ID_CLAIM': 'user_id',
 }
 
+# Microservices URLs
+AUTH_SERVICE_URL = os.getenv('AUTH_SERVICE_URL', 'http://localhost:8001')
+
+# Verificación de JWT: 'remote' consulta a auth-service en cada request,
+# 'local' valida firma y expiración con la llave compartida o el JWKS publicado
+JWT_VERIFICATION_MODE = os.getenv('JWT_VERIFICATION_MODE', 'remote')
+JWT_ALGORITHM = os.getenv('JWT_ALGORITHM', 'HS256')
+JWT_SIGNING_KEY = os.getenv('JWT_SECRET_KEY', 'your-super-secret-jwt-key')
+JWT_JWK_URL = os.getenv('JWT_JWK_URL') or None
+# Métodos HTTP que, aun en modo local, verifican revocación con auth-service
+JWT_REVOCATION_CHECK_METHODS = [m for m in os.getenv('JWT_REVOCATION_CHECK_METHODS', '').split(',') if m]
+
+# Caché de tokens verificados por auth-service (LRU por proceso + nivel Redis opcional)
+JWT_CACHE_TTL = int(os.getenv('JWT_CACHE_TTL', '300'))  # segundos
+JWT_CACHE_MAX_SIZE = int(os.getenv('JWT_CACHE_MAX_SIZE', '10000'))
+JWT_CACHE_REDIS_URL = os.getenv('JWT_CACHE_REDIS_URL') or None
+JWT_CACHE_SHARED = os.getenv('JWT_CACHE_SHARED', 'False') == 'True'
+TOKEN_INVALIDATION_CHANNEL = os.getenv('TOKEN_INVALIDATION_CHANNEL', 'auth:token-invalidation')
+
+# Cliente HTTP entre microservicios: pool keep-alive por servicio, reintentos
+# con jitter para llamadas idempotentes y circuit breaker por dependencia
+SERVICE_HTTP_CLIENT = {
+    'timeout': float(os.getenv('SERVICE_HTTP_TIMEOUT', '5')),
+    'retries': int(os.getenv('SERVICE_HTTP_RETRIES', '2')),
+    'backoff': float(os.getenv('SERVICE_HTTP_BACKOFF', '0.1')),
+    'pool_size': int(os.getenv('SERVICE_HTTP_POOL_SIZE', '10')),
+    'failure_threshold': int(os.getenv('SERVICE_HTTP_FAILURE_THRESHOLD', '5')),
+    'reset_timeout': float(os.getenv('SERVICE_HTTP_RESET_TIMEOUT', '30')),
+}
+
 # CORS settings
 CORS_ALLOW_ALL_ORIGINS = DEBUG
 CORS_ALLOWED_ORIGINS = os.getenv('CORS_ALLOWED_ORIGINS', '').split(',') if not DEBUG else []
@@ -167,4 +202,104 @@ CACHES = {
 APPOINTMENT_DURATION_MINUTES = 30
 APPOINTMENT_BUFFER_MINUTES = 15
 WORKING_HOURS_START = '08:00'
-WORKING_HOURS_END = '18:00' 
\ No newline at end of file
+WORKING_HOURS_END = '18:00'
+AGENDA_MAX_RANGE_DAYS = int(os.getenv('AGENDA_MAX_RANGE_DAYS', '31'))
+NEXT_AVAILABLE_MAX_HORIZON_DAYS = int(os.getenv('NEXT_AVAILABLE_MAX_HORIZON_DAYS', '90'))
+NEXT_AVAILABLE_MAX_RESULTS = 50
+BULK_TRANSITION_MAX_SIZE = 500
+# Citas recurrentes: se generan como máximo hasta este horizonte desde el inicio
+SERIES_HORIZON_DAYS = int(os.getenv('SERIES_HORIZON_DAYS', '180'))
+SERIES_MAX_OCCURRENCES = 52
+
+# Mapas de ocupación por veterinario y día en el caché
+OCCUPANCY_QUANTUM_MINUTES = 5
+OCCUPANCY_CACHE_TIMEOUT = int(os.getenv('OCCUPANCY_CACHE_TIMEOUT', '86400'))  # segundos
+# Bloqueos que abarcan más días invalidan todo el caché del veterinario
+OCCUPANCY_MAX_REFRESH_DAYS = 31
+
+# Índice de bloqueos activos por veterinario en el caché
+BLOCK_INDEX_CACHE_TIMEOUT = int(os.getenv('BLOCK_INDEX_CACHE_TIMEOUT', '3600'))  # segundos
+BULK_BLOCK_MAX_VETERINARIANS = 200
+
+# Modelo de lectura para la reserva en línea (sorted sets en Redis)
+BOOKABLE_SLOTS_REDIS_URL = os.getenv('BOOKABLE_SLOTS_REDIS_URL', REDIS_URL) or None
+BOOKABLE_SLOTS_HORIZON_DAYS = int(os.getenv('BOOKABLE_SLOTS_HORIZON_DAYS', '30'))
+BOOKABLE_APPOINTMENT_TYPES = ['CONSULTA', 'VACUNACION', 'SEGUIMIENTO', 'ESTETICA']
+BOOKABLE_SLOTS_MAX_RESULTS = 200
+BOOKABLE_SLOTS_MAX_AGE = 30  # segundos de Cache-Control
+
+# Feed de cambios de agenda
+AGENDA_CHANGES_PAGE_SIZE = 500
+# Espera máxima del long-poll (segundos). Cada espera ocupa un worker; con
+# workers síncronos se deja en 0 y los clientes consultan periódicamente
+AGENDA_CHANGES_MAX_WAIT = int(os.getenv('AGENDA_CHANGES_MAX_WAIT', '0'))
+AGENDA_CHANGES_POLL_INTERVAL = 1  # segundos
+# Margen para que terminen las confirmaciones (AgendaCommit) con IDs anteriores
+AGENDA_CHANGES_SETTLE_SECONDS = 2
+AGENDA_CHANGES_RETENTION_DAYS = int(os.getenv('AGENDA_CHANGES_RETENTION_DAYS', '7'))
+
+# Archivo de citas finalizadas (comando archive_appointments)
+APPOINTMENT_ARCHIVE_AFTER_DAYS = int(os.getenv('APPOINTMENT_ARCHIVE_AFTER_DAYS', '365'))
+APPOINTMENT_ARCHIVE_BATCH_SIZE = 500
+APPOINTMENT_ARCHIVE_PAUSE_SECONDS = 0.5
+
+# Analítica de uso: rango máximo de consulta y días futuros resumidos a diario
+UTILIZATION_MAX_RANGE_DAYS = 366
+UTILIZATION_FORWARD_DAYS = 14
+
+# Lista de espera: vigencia de una oferta y candidatos evaluados por horario liberado
+WAITLIST_OFFER_TTL_MINUTES = int(os.getenv('WAITLIST_OFFER_TTL_MINUTES', '120'))
+WAITLIST_MATCH_CANDIDATES = 5
+
+# Recordatorios de citas
+REMINDER_LEAD_HOURS = int(os.getenv('REMINDER_LEAD_HOURS', '24'))
+REMINDER_BATCH_SIZE = int(os.getenv('REMINDER_BATCH_SIZE', '200'))
+REMINDER_MAX_BATCHES = 100  # por ejecución de la tarea
+REMINDER_MAX_CONCURRENCY = int(os.getenv('REMINDER_MAX_CONCURRENCY', '8'))
+REMINDER_SENDER = os.getenv('REMINDER_SENDER', 'appointments.reminders.LoggingReminderSender')
+REMINDER_DISPATCH_INTERVAL = int(os.getenv('REMINDER_DISPATCH_INTERVAL', '300'))  # segundos
+
+# Celery settings
+CELERY_BROKER_URL = os.getenv('CELERY_BROKER_URL', REDIS_URL)
+CELERY_RESULT_BACKEND = os.getenv('CELERY_RESULT_BACKEND', REDIS_URL)
+CELERY_TIMEZONE = TIME_ZONE
+CELERY_TASK_SERIALIZER = 'json'
+CELERY_RESULT_SERIALIZER = 'json'
+CELERY_ACCEPT_CONTENT = ['json']
+CELERY_BEAT_SCHEDULE = {
+    'dispatch-appointment-reminders': {
+        'task': 'appointments.tasks.dispatch_reminders',
+        'schedule': REMINDER_DISPATCH_INTERVAL,
+    },
+    'expire-waitlist-offers': {
+        'task': 'appointments.tasks.expire_waitlist_offers',
+        'schedule': 300,
+    },
+    'prune-agenda-changes': {
+        'task': 'appointments.tasks.prune_agenda_changes',
+        'schedule': 86400,
+    },
+    'refresh-utilization': {
+        'task': 'appointments.tasks.refresh_utilization',
+        'schedule': 300,
+    },
+    'rollup-utilization-window': {
+        'task': 'appointments.tasks.rollup_utilization_window',
+        'schedule': 86400,
+    },
+    # Avanza el horizonte y repone el modelo si Redis se vació
+    'rebuild-bookable-slots': {
+        'task': 'appointments.tasks.rebuild_bookable_slots',
+        'schedule': 3600,
+    },
+}
+
+# Duración por defecto (minutos) según el tipo de cita
+APPOINTMENT_TYPE_DURATIONS = {
+    'CONSULTA': 30,
+    'VACUNACION': 15,
+    'CIRUGIA': 120,
+    'EMERGENCIA': 60,
+    'SEGUIMIENTO': 30,
+    'ESTETICA': 60,
+} 
\ No newline at end of file
@@ -1,5 +1,6 @@
 from django.contrib import admin
 from django.urls import path, include
+from appointments_service.views import TokenCacheStatsView, ServiceDependencyStatsView
 from drf_spectacular.views import (
     SpectacularAPIView,
     SpectacularSwaggerView,
@@ -9,6 +10,8 @@ from drf_spectacular.views import (
 urlpatterns = [
     path('admin/', admin.site.urls),
     path('api/', include('appointments.urls')),
+    path('api/token-cache/stats/', TokenCacheStatsView.as_view(), name='token-cache-stats'),
+    path('api/dependencies/stats/', ServiceDependencyStatsView.as_view(), name='dependency-stats'),
     
     # API Documentation
     path('api/schema/', SpectacularAPIView.as_view(), name='schema'),
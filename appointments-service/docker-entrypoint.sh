@@ -15,10 +15,12 @@ done
 
 echo "✅ Base de datos conectada"
 
-# Ejecutar migraciones
-echo "📋 Ejecutando migraciones..."
-python manage.py makemigrations --noinput
-python manage.py migrate --noinput
+# Ejecutar migraciones (el worker de Celery las deja al servicio web)
+if [ "${RUN_MIGRATIONS:-True}" = "True" ]; then
+  echo "📋 Ejecutando migraciones..."
+  python manage.py makemigrations --noinput
+  python manage.py migrate --noinput
+fi
 
 # Recolectar archivos estáticos
 echo "📁 Recolectando archivos estáticos..."
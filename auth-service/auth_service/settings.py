@@ -131,9 +131,9 @@ SIMPLE_JWT = {
     'REFRESH_TOKEN_LIFETIME': timedelta(days=7),
     'ROTATE_REFRESH_TOKENS': True,
     'BLACKLIST_AFTER_ROTATION': True,
-    'ALGORITHM': 'HS256',
+    'ALGORITHM': os.getenv('JWT_ALGORITHM', 'HS256'),
     'SIGNING_KEY': os.getenv('JWT_SECRET_KEY', 'your-super-secret-jwt-key'),
-    'VERIFYING_KEY': None,
+    'VERIFYING_KEY': os.getenv('JWT_VERIFYING_KEY'),
     'AUTH_HEADER_TYPES': ('Bearer',),
     'USER_ID_FIELD': 'id',
     'USER_ID_CLAIM': 'user_id',
@@ -164,4 +164,10 @@ EMAIL_HOST_PASSWORD = os.getenv('EMAIL_HOST_PASSWORD', '')
 DEFAULT_FROM_EMAIL = EMAIL_HOST_USER
 
 # Redis settings
-REDIS_URL = os.getenv('REDIS_URL', 'redis://localhost:6379/0') 
\ No newline at end of file
+REDIS_URL = os.getenv('REDIS_URL', 'redis://localhost:6379/0') 
+
+# Máximo de tokens por request en la verificación por lotes
+TOKEN_VERIFY_BATCH_MAX_SIZE = int(os.getenv('TOKEN_VERIFY_BATCH_MAX_SIZE', '100'))
+
+# Canal de Redis donde se publican los eventos de invalidación de tokens
+TOKEN_INVALIDATION_CHANNEL = os.getenv('TOKEN_INVALIDATION_CHANNEL', 'auth:token-invalidation')
\ No newline at end of file
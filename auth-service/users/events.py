@@ -0,0 +1,23 @@
+import json
+import logging
+import redis
+from django.conf import settings
+from django.utils import timezone
+
+logger = logging.getLogger(__name__)
+
+def publish_token_invalidation(user_id, reason):
+    """
+    Publicar un evento para que los demás microservicios descarten de su caché
+    los tokens verificados de este usuario
+    """
+    event = {
+        'user_id': user_id,
+        'reason': reason,
+        'at': timezone.now().isoformat(),
+    }
+    try:
+        client = redis.Redis.from_url(settings.REDIS_URL)
+        client.publish(settings.TOKEN_INVALIDATION_CHANNEL, json.dumps(event))
+    except redis.RedisError as e:
+        logger.error(f"Error al publicar invalidación de tokens: {e}")
@@ -1,6 +1,7 @@
 from django.contrib.auth.models import AbstractUser, Group, Permission, BaseUserManager
-from django.db import models
+from django.db import models, transaction
 from django.utils.translation import gettext_lazy as _
+from .events import publish_token_invalidation
 
 
 class UserManager(BaseUserManager):
@@ -57,7 +58,14 @@ class User(AbstractUser):
 
     def save(self, *args, **kwargs):
         is_new = self.pk is None
+        invalidation_reason = None if is_new else self._get_invalidation_reason()
         super().save(*args, **kwargs)
+
+        if invalidation_reason:
+            # Los tokens cacheados en otros servicios ya no reflejan al usuario
+            transaction.on_commit(
+                lambda: publish_token_invalidation(self.pk, invalidation_reason)
+            )
         
         if is_new:
             # Asignar grupo según el rol
@@ -65,6 +73,21 @@ class User(AbstractUser):
             group, _ = Group.objects.get_or_create(name=group_name)
             self.groups.add(group)
 
+    def _get_invalidation_reason(self):
+        """Detectar cambios que invalidan los tokens ya verificados"""
+        previous = User.objects.filter(pk=self.pk).values(
+            'password', 'is_active', 'role'
+        ).first()
+        if previous is None:
+            return None
+        if previous['password'] != self.password:
+            return 'password_changed'
+        if previous['is_active'] and not self.is_active:
+            return 'deactivated'
+        if previous['role'] != self.role:
+            return 'role_changed'
+        return None
+
 class PasswordResetToken(models.Model):
     user = models.ForeignKey(User, on_delete=models.CASCADE)
     token = models.CharField(max_length=100, unique=True)
@@ -1,4 +1,5 @@
 from rest_framework import serializers
+from django.conf import settings
 from django.contrib.auth import get_user_model
 from django.contrib.auth.password_validation import validate_password
 from django.core.exceptions import ValidationError
@@ -84,4 +85,11 @@ class TokenObtainPairSerializer(serializers.Serializer):
     password = serializers.CharField(required=True, style={'input_type': 'password'})
 
 class TokenVerifySerializer(serializers.Serializer):
-    token = serializers.CharField(required=True) 
\ No newline at end of file
+    token = serializers.CharField(required=True) 
+
+class TokenVerifyBatchSerializer(serializers.Serializer):
+    tokens = serializers.ListField(
+        child=serializers.CharField(),
+        allow_empty=False,
+        max_length=settings.TOKEN_VERIFY_BATCH_MAX_SIZE
+    )
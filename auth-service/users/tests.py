@@ -102,4 +102,91 @@ class AuthenticationAPITest(APITestCase):
         
         # Verificar que la contraseña cambió
         self.user.refresh_from_db()
-        self.assertTrue(self.user.check_password('newtestpass123')) 
\ No newline at end of file
+        self.assertTrue(self.user.check_password('newtestpass123')) 
+
+class TokenClaimsTest(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(
+            email='vet@example.com',
+            password='testpass123',
+            first_name='Vet',
+            last_name='User',
+            role=User.Role.VETERINARIO
+        )
+
+    def test_access_token_includes_identity_claims(self):
+        """Test que el access token lleva la identidad para verificación local"""
+        from rest_framework_simplejwt.tokens import AccessToken
+        url = reverse('user-login')
+        response = self.client.post(url, {'email': 'vet@example.com', 'password': 'testpass123'})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+        token = AccessToken(response.data['access'])
+        self.assertEqual(token['user_id'], self.user.id)
+        self.assertEqual(token['email'], 'vet@example.com')
+        self.assertEqual(token['role'], User.Role.VETERINARIO)
+        self.assertTrue(token['is_active'])
+
+    def test_jwks_empty_for_hmac(self):
+        """Test que con HS256 no se publica ninguna llave"""
+        response = self.client.get(reverse('user-jwks'))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['keys'], [])
+
+
+class TokenInvalidationTest(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(
+            email='recep@example.com',
+            password='testpass123',
+            first_name='Recep',
+            last_name='User'
+        )
+
+    def test_role_change_publishes_invalidation(self):
+        """Test que un cambio de rol publica el evento de invalidación"""
+        from unittest import mock
+        with mock.patch('users.models.publish_token_invalidation') as publish:
+            with self.captureOnCommitCallbacks(execute=True):
+                self.user.role = User.Role.ADMIN
+                self.user.save()
+        publish.assert_called_once_with(self.user.pk, 'role_changed')
+
+    def test_unrelated_change_does_not_publish(self):
+        """Test que cambios sin efecto en la identidad no invalidan tokens"""
+        from unittest import mock
+        with mock.patch('users.models.publish_token_invalidation') as publish:
+            with self.captureOnCommitCallbacks(execute=True):
+                self.user.first_name = 'Otro'
+                self.user.save()
+        publish.assert_not_called()
+
+
+class TokenVerifyBatchTest(APITestCase):
+    def setUp(self):
+        self.users = [
+            User.objects.create_user(email=f'user{i}@example.com', password='testpass123')
+            for i in range(3)
+        ]
+        self.tokens = [str(RefreshToken.for_user(user).access_token) for user in self.users]
+
+    def test_batch_verify_single_user_query(self):
+        """Test que la verificación por lotes resuelve todos los usuarios en una consulta"""
+        url = reverse('user-token-verify-batch')
+        tokens = self.tokens + ['token-invalido']
+        with self.assertNumQueries(1):
+            response = self.client.post(url, {'tokens': tokens}, format='json')
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        results = response.data['results']
+        for user, token in zip(self.users, self.tokens):
+            self.assertTrue(results[token]['valid'])
+            self.assertEqual(results[token]['user']['id'], user.id)
+        self.assertFalse(results['token-invalido']['valid'])
+
+    def test_batch_verify_rejects_inactive_users(self):
+        """Test que los usuarios desactivados no se validan"""
+        User.objects.filter(pk=self.users[0].pk).update(is_active=False)
+        url = reverse('user-token-verify-batch')
+        response = self.client.post(url, {'tokens': self.tokens[:1]}, format='json')
+        self.assertFalse(response.data['results'][self.tokens[0]]['valid'])
@@ -0,0 +1,18 @@
+from rest_framework_simplejwt.tokens import RefreshToken
+
+class UserRefreshToken(RefreshToken):
+    """
+    Refresh token que incluye la identidad del usuario en sus claims, de modo
+    que los demás microservicios puedan autenticar sin consultar a auth-service
+    """
+
+    @classmethod
+    def for_user(cls, user):
+        token = super().for_user(user)
+        token['email'] = user.email
+        token['username'] = user.username
+        token['first_name'] = user.first_name
+        token['last_name'] = user.last_name
+        token['role'] = user.role
+        token['is_active'] = user.is_active
+        return token
@@ -9,12 +9,14 @@ from datetime import timedelta
 import uuid
 from django.core.mail import send_mail
 from django.conf import settings
+from jwt.algorithms import get_default_algorithms
 from .models import User, PasswordResetToken
+from .tokens import UserRefreshToken
 from .serializers import (
     UserSerializer, UserCreateSerializer, UserUpdateSerializer,
     ChangePasswordSerializer, PasswordResetRequestSerializer,
     PasswordResetConfirmSerializer, TokenObtainPairSerializer,
-    TokenVerifySerializer
+    TokenVerifySerializer, TokenVerifyBatchSerializer
 )
 
 class IsAdminUser(permissions.BasePermission):
@@ -34,7 +36,7 @@ class UserViewSet(viewsets.ModelViewSet):
         return UserSerializer
 
     def get_permissions(self):
-        if self.action in ['login', 'request_password_reset', 'reset_password', 'token_verify']:
+        if self.action in ['login', 'request_password_reset', 'reset_password', 'token_verify', 'token_verify_batch', 'jwks']:
             return [permissions.AllowAny()]
         elif self.action in ['create', 'destroy']:
             return [IsAdminUser()]
@@ -49,7 +51,7 @@ class UserViewSet(viewsets.ModelViewSet):
                 password=serializer.validated_data['password']
             )
             if user:
-                refresh = RefreshToken.for_user(user)
+                refresh = UserRefreshToken.for_user(user)
                 return Response({
                     'refresh': str(refresh),
                     'access': str(refresh.access_token),
@@ -67,7 +69,7 @@ class UserViewSet(viewsets.ModelViewSet):
         if serializer.is_valid():
             try:
                 token = AccessToken(serializer.validated_data['token'])
-                user = User.objects.get(id=token['user_id'])
+                user = User.objects.get(id=token['user_id'], is_active=True)
                 return Response(UserSerializer(user).data)
             except (InvalidToken, TokenError, User.DoesNotExist):
                 return Response(
@@ -76,6 +78,45 @@ class UserViewSet(viewsets.ModelViewSet):
                 )
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
+    @action(detail=False, methods=['post'])
+    def token_verify_batch(self, request):
+        """Verificar varios tokens resolviendo todos los usuarios en una sola consulta"""
+        serializer = TokenVerifyBatchSerializer(data=request.data)
+        if not serializer.is_valid():
+            return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+
+        user_ids = {}
+        results = {}
+        for raw_token in serializer.validated_data['tokens']:
+            try:
+                user_ids[raw_token] = AccessToken(raw_token)['user_id']
+            except (InvalidToken, TokenError, KeyError):
+                results[raw_token] = {'valid': False, 'error': 'Token inválido'}
+
+        users = User.objects.filter(id__in=set(user_ids.values()), is_active=True).in_bulk()
+        for raw_token, user_id in user_ids.items():
+            user = users.get(user_id)
+            if user is None:
+                results[raw_token] = {'valid': False, 'error': 'Token inválido'}
+            else:
+                results[raw_token] = {'valid': True, 'user': UserSerializer(user).data}
+
+        return Response({'results': results})
+
+    @action(detail=False, methods=['get'])
+    def jwks(self, request):
+        """Publicar la llave pública de verificación para validar tokens localmente"""
+        algorithm_name = settings.SIMPLE_JWT['ALGORITHM']
+        verifying_key = settings.SIMPLE_JWT['VERIFYING_KEY']
+        # Con algoritmos HMAC la llave es secreta y se comparte por configuración
+        if algorithm_name.startswith('HS') or not verifying_key:
+            return Response({'keys': []})
+
+        algorithm = get_default_algorithms()[algorithm_name]
+        jwk = algorithm.to_jwk(algorithm.prepare_key(verifying_key), as_dict=True)
+        jwk.update({'use': 'sig', 'alg': algorithm_name})
+        return Response({'keys': [jwk]})
+
     @action(detail=False, methods=['post'])
     def request_password_reset(self, request):
         serializer = PasswordResetRequestSerializer(data=request.data)
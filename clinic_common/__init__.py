@@ -0,0 +1,5 @@
+"""
+Módulos compartidos por los microservicios. Cada Dockerfile copia el
+paquete junto al código del servicio; en local se importa desde la raíz del
+repositorio (ver `settings.py` de cada servicio).
+"""
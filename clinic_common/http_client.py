@@ -0,0 +1,201 @@
+import logging
+import random
+import threading
+import time
+from bisect import bisect_left
+
+import requests
+from requests.adapters import HTTPAdapter
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+IDEMPOTENT_METHODS = frozenset(['GET', 'HEAD', 'OPTIONS', 'PUT', 'DELETE'])
+RETRYABLE_STATUS_CODES = frozenset([502, 503, 504])
+
+# Límites superiores (ms) de los buckets del histograma de latencia
+LATENCY_BUCKETS_MS = (5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000)
+
+class CircuitOpenError(requests.exceptions.ConnectionError):
+    """El circuito hacia la dependencia está abierto y la llamada falla de inmediato"""
+
+class CircuitBreaker:
+    """
+    Abre el circuito tras `failure_threshold` fallos consecutivos. Pasado
+    `reset_timeout` deja pasar una llamada de prueba (semiabierto) y lo cierra
+    si tiene éxito.
+    """
+
+    def __init__(self, failure_threshold, reset_timeout):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.opened_at = None
+        self._lock = threading.Lock()
+
+    @property
+    def state(self):
+        if self.opened_at is None:
+            return 'closed'
+        if time.monotonic() - self.opened_at >= self.reset_timeout:
+            return 'half_open'
+        return 'open'
+
+    def allow_request(self):
+        with self._lock:
+            if self.opened_at is None:
+                return True
+            if time.monotonic() - self.opened_at >= self.reset_timeout:
+                # Solo una llamada de prueba; las demás siguen fallando rápido
+                self.opened_at = time.monotonic()
+                return True
+            return False
+
+    def record_success(self):
+        with self._lock:
+            self.failures = 0
+            self.opened_at = None
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            if self.failures >= self.failure_threshold:
+                if self.opened_at is None:
+                    logger.warning('Circuito abierto tras %s fallos consecutivos', self.failures)
+                self.opened_at = time.monotonic()
+
+class LatencyHistogram:
+    """Histograma acumulado de latencias en milisegundos"""
+
+    def __init__(self, buckets=LATENCY_BUCKETS_MS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.count = 0
+        self.sum_ms = 0.0
+        self._lock = threading.Lock()
+
+    def observe(self, elapsed_ms):
+        with self._lock:
+            self.counts[bisect_left(self.buckets, elapsed_ms)] += 1
+            self.count += 1
+            self.sum_ms += elapsed_ms
+
+    def snapshot(self):
+        with self._lock:
+            cumulative = 0
+            buckets = {}
+            for bound, count in zip(self.buckets + ('+Inf',), self.counts):
+                cumulative += count
+                buckets[f'le_{bound}'] = cumulative
+            return {
+                'count': self.count,
+                'sum_ms': round(self.sum_ms, 2),
+                'buckets': buckets,
+            }
+
+class ServiceClient:
+    """
+    Cliente HTTP reutilizable hacia un microservicio: mantiene un pool de
+    conexiones keep-alive, reintenta con backoff exponencial y jitter las
+    llamadas idempotentes y falla rápido mientras el circuito está abierto.
+    """
+
+    def __init__(self, name, base_url, timeout=5, retries=2, backoff=0.1,
+                 pool_size=10, failure_threshold=5, reset_timeout=30):
+        self.name = name
+        self.base_url = base_url.rstrip('/')
+        self.timeout = timeout
+        self.retries = retries
+        self.backoff = backoff
+        self.breaker = CircuitBreaker(failure_threshold, reset_timeout)
+        self.latency = LatencyHistogram()
+        self.errors = 0
+        self._errors_lock = threading.Lock()
+
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size, max_retries=0)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+
+    def request(self, method, path, timeout=None, idempotent=None, **kwargs):
+        method = method.upper()
+        if idempotent is None:
+            idempotent = method in IDEMPOTENT_METHODS
+        attempts = 1 + (self.retries if idempotent else 0)
+        url = f'{self.base_url}{path}'
+
+        for attempt in range(attempts):
+            last_attempt = attempt + 1 == attempts
+            if not self.breaker.allow_request():
+                raise CircuitOpenError(f'Circuito abierto hacia {self.name}')
+
+            start = time.perf_counter()
+            try:
+                response = self.session.request(
+                    method, url, timeout=timeout or self.timeout, **kwargs
+                )
+            except requests.exceptions.RequestException:
+                self._record(start, failed=True, unavailable=True)
+                if last_attempt:
+                    raise
+            else:
+                retryable = response.status_code in RETRYABLE_STATUS_CODES
+                self._record(start, failed=response.status_code >= 500, unavailable=retryable)
+                if not retryable or last_attempt:
+                    return response
+
+            # Backoff exponencial con jitter completo
+            time.sleep(random.uniform(0, self.backoff * (2 ** attempt)))
+
+    def get(self, path, **kwargs):
+        return self.request('GET', path, **kwargs)
+
+    def post(self, path, **kwargs):
+        return self.request('POST', path, **kwargs)
+
+    def stats(self):
+        with self._errors_lock:
+            errors = self.errors
+        return {
+            'base_url': self.base_url,
+            'circuit': self.breaker.state,
+            'consecutive_failures': self.breaker.failures,
+            'errors': errors,
+            'latency_ms': self.latency.snapshot(),
+        }
+
+    def _record(self, start, failed, unavailable):
+        """
+        Registrar latencia y errores. Solo abre el circuito lo que indica que
+        la dependencia no está disponible (conexión, timeout, 502/503/504): un
+        500 es un error de esa petición y el servicio sí respondió.
+        """
+        self.latency.observe((time.perf_counter() - start) * 1000)
+        if failed:
+            with self._errors_lock:
+                self.errors += 1
+        if unavailable:
+            self.breaker.record_failure()
+        else:
+            self.breaker.record_success()
+
+_clients = {}
+_clients_lock = threading.Lock()
+
+def get_client(name):
+    """Cliente compartido del proceso para el microservicio `name` (ej. 'auth')"""
+    client = _clients.get(name)
+    if client is None:
+        with _clients_lock:
+            client = _clients.get(name)
+            if client is None:
+                client = ServiceClient(
+                    name,
+                    getattr(settings, f'{name.upper()}_SERVICE_URL'),
+                    **settings.SERVICE_HTTP_CLIENT
+                )
+                _clients[name] = client
+    return client
+
+def get_clients_stats():
+    return {name: client.stats() for name, client in list(_clients.items())}
@@ -0,0 +1,229 @@
+import json
+import os
+import time
+from unittest import TestCase, skipUnless
+from unittest.mock import Mock, patch
+
+import jwt
+import redis
+import requests
+from django.conf import settings
+
+if not settings.configured:
+    # Fuera de un servicio: lo mínimo para importar el caché de tokens del proceso
+    settings.configure(
+        JWT_CACHE_MAX_SIZE=100, JWT_CACHE_TTL=300, JWT_CACHE_REDIS_URL=None,
+        JWT_CACHE_SHARED=False, TOKEN_INVALIDATION_CHANNEL='auth:token-invalidation',
+    )
+
+from clinic_common.http_client import CircuitOpenError, LatencyHistogram, ServiceClient
+from clinic_common.token_cache import SUBSCRIBE_RETRY_SECONDS, TokenCache
+
+TEST_REDIS_URL = os.getenv('TEST_REDIS_URL', 'redis://localhost:6379/15')
+
+def response(status_code):
+    return Mock(status_code=status_code)
+
+class ServiceClientTest(TestCase):
+    """Reintentos, backoff y circuito del cliente HTTP entre servicios"""
+
+    def setUp(self):
+        self.client = ServiceClient('auth', 'http://auth:8000/', retries=2, backoff=0.1,
+                                    failure_threshold=2, reset_timeout=30)
+        self.send = patch.object(self.client.session, 'request').start()
+        self.sleep = patch('clinic_common.http_client.time.sleep').start()
+        # Jitter en el máximo: el backoff queda determinista
+        patch('clinic_common.http_client.random.uniform', side_effect=lambda low, high: high).start()
+        self.addCleanup(patch.stopall)
+
+    def test_idempotent_request_retries_with_backoff(self):
+        """Test un GET se reintenta ante 503 con espera exponencial"""
+        self.client.breaker.failure_threshold = 5
+        self.send.side_effect = [response(503), response(503), response(200)]
+        self.assertEqual(self.client.get('/api/auth/verify/').status_code, 200)
+        self.assertEqual(self.send.call_count, 3)
+        self.assertEqual([call.args[0] for call in self.sleep.call_args_list], [0.1, 0.2])
+        self.assertEqual(self.send.call_args.args, ('GET', 'http://auth:8000/api/auth/verify/'))
+
+    def test_post_is_not_retried(self):
+        """Test un POST no idempotente se intenta una sola vez"""
+        self.send.side_effect = requests.exceptions.ConnectionError()
+        with self.assertRaises(requests.exceptions.ConnectionError):
+            self.client.post('/api/auth/login/')
+        self.assertEqual(self.send.call_count, 1)
+        self.sleep.assert_not_called()
+
+    def test_server_error_does_not_open_circuit(self):
+        """Test un 500 se cuenta como error pero no abre el circuito ni se reintenta"""
+        self.send.return_value = response(500)
+        for _ in range(3):
+            self.assertEqual(self.client.get('/').status_code, 500)
+        self.assertEqual(self.send.call_count, 3)
+        self.assertEqual(self.client.stats()['errors'], 3)
+        self.assertEqual(self.client.breaker.state, 'closed')
+
+    def test_circuit_opens_and_half_opens(self):
+        """Test el circuito se abre tras fallos seguidos, deja pasar una prueba y se cierra"""
+        self.client.retries = 0
+        self.send.side_effect = requests.exceptions.Timeout()
+        with patch('clinic_common.http_client.time.monotonic', return_value=100):
+            for _ in range(2):
+                with self.assertRaises(requests.exceptions.Timeout):
+                    self.client.get('/')
+            self.assertEqual(self.client.breaker.state, 'open')
+            with self.assertRaises(CircuitOpenError):
+                self.client.get('/')
+        self.assertEqual(self.send.call_count, 2)
+
+        self.send.side_effect = None
+        self.send.return_value = response(200)
+        with patch('clinic_common.http_client.time.monotonic', return_value=130):
+            self.assertEqual(self.client.breaker.state, 'half_open')
+            self.assertTrue(self.client.breaker.allow_request())
+            # Mientras la prueba está en curso, el resto falla rápido
+            with self.assertRaises(CircuitOpenError):
+                self.client.get('/')
+            self.client.breaker.opened_at = 100
+            self.assertEqual(self.client.get('/').status_code, 200)
+        self.assertEqual(self.client.breaker.state, 'closed')
+        self.assertEqual(self.client.stats()['consecutive_failures'], 0)
+
+    def test_failed_probe_reopens_circuit(self):
+        """Test si la llamada de prueba falla el circuito vuelve a abrirse"""
+        self.client.retries = 0
+        self.send.side_effect = requests.exceptions.ConnectionError()
+        with patch('clinic_common.http_client.time.monotonic', return_value=100):
+            for _ in range(2):
+                with self.assertRaises(requests.exceptions.ConnectionError):
+                    self.client.get('/')
+        with patch('clinic_common.http_client.time.monotonic', return_value=130):
+            with self.assertRaises(requests.exceptions.ConnectionError):
+                self.client.get('/')
+            self.assertEqual(self.client.breaker.state, 'open')
+
+class LatencyHistogramTest(TestCase):
+    def test_snapshot_is_cumulative(self):
+        """Test los buckets son acumulados y el último es +Inf"""
+        histogram = LatencyHistogram(buckets=(10, 100))
+        for elapsed_ms in (5, 10, 50, 500):
+            histogram.observe(elapsed_ms)
+        self.assertEqual(histogram.snapshot(), {
+            'count': 4,
+            'sum_ms': 565.0,
+            'buckets': {'le_10': 2, 'le_100': 3, 'le_+Inf': 4},
+        })
+
+def make_token(user_id, exp=None, jti='a'):
+    payload = {'user_id': user_id, 'jti': jti}
+    if exp is not None:
+        payload['exp'] = exp
+    return jwt.encode(payload, 'clave-de-prueba-de-al-menos-32-bytes', algorithm='HS256')
+
+def redis_available():
+    try:
+        return redis.Redis.from_url(TEST_REDIS_URL, socket_connect_timeout=0.2).ping()
+    except redis.RedisError:
+        return False
+
+class TokenCacheTest(TestCase):
+    """Caché de tokens verificados por auth-service"""
+
+    def setUp(self):
+        self.cache = TokenCache(max_size=2, ttl=300)
+
+    def test_lru_eviction(self):
+        """Test al superar el tamaño se descarta la entrada usada hace más tiempo"""
+        first, second, third = (make_token(user_id, jti=str(user_id)) for user_id in (1, 2, 3))
+        for token, user_id in ((first, 1), (second, 2)):
+            self.cache.set(token, {'id': user_id}, self.cache.stamp())
+        self.assertEqual(self.cache.get(first), {'id': 1})
+        self.cache.set(third, {'id': 3}, self.cache.stamp())
+        self.assertIsNone(self.cache.get(second))
+        self.assertEqual(self.cache.get(first), {'id': 1})
+        self.assertEqual(self.cache.stats()['evictions'], 1)
+
+    def test_ttl_and_token_expiry(self):
+        """Test la entrada vence con el menor entre el TTL y el exp del token"""
+        now = time.time()
+        short = make_token(1, exp=now + 60, jti='short')
+        long = make_token(2, exp=now + 3600, jti='long')
+        self.cache.set(short, {'id': 1}, self.cache.stamp())
+        self.cache.set(long, {'id': 2}, self.cache.stamp())
+        with patch('clinic_common.token_cache.time.time', return_value=now + 120):
+            self.assertIsNone(self.cache.get(short))
+            self.assertEqual(self.cache.get(long), {'id': 2})
+        with patch('clinic_common.token_cache.time.time', return_value=now + 301):
+            self.assertIsNone(self.cache.get(long))
+        # Un token ya vencido no se guarda
+        self.cache.set(make_token(3, exp=now - 1, jti='old'), {'id': 3}, self.cache.stamp())
+        self.assertEqual(self.cache.stats()['size'], 0)
+
+    def test_invalidation_event(self):
+        """Test un evento de invalidación descarta las entradas del usuario"""
+        token = make_token(1)
+        self.cache.set(token, {'id': 1}, self.cache.stamp())
+        self.cache._on_invalidation({'data': json.dumps({'user_id': 1})})
+        self.assertIsNone(self.cache.get(token))
+        # Mensajes ilegibles se ignoran
+        self.cache._on_invalidation({'data': b'no-json'})
+
+    def test_invalidation_during_verification_is_not_cached(self):
+        """Test una invalidación entre la llamada remota y el set no re-cachea el token"""
+        token = make_token(1)
+        stamp = self.cache.stamp()
+        self.cache.invalidate_user(1)
+        self.cache.set(token, {'id': 1}, stamp)
+        self.assertIsNone(self.cache.get(token))
+        # Otro usuario no se ve afectado
+        other = make_token(2)
+        self.cache.set(other, {'id': 2}, stamp)
+        self.assertEqual(self.cache.get(other), {'id': 2})
+
+    def test_forgotten_invalidations_are_conservative(self):
+        """Test si se olvidó la invalidación de un usuario, las marcas previas no guardan"""
+        stamp = self.cache.stamp()
+        with patch('clinic_common.token_cache.INVALIDATIONS_MAX_SIZE', 1):
+            self.cache.invalidate_user(1)
+            self.cache.invalidate_user(2)
+        self.cache.set(make_token(1), {'id': 1}, stamp)
+        self.assertEqual(self.cache.stats()['size'], 0)
+
+    def test_subscription_lost_and_restored(self):
+        """Test al cortarse la suscripción se vacía el caché y se vuelve a suscribir"""
+        cache = TokenCache(max_size=2, ttl=300, redis_url=TEST_REDIS_URL, channel='auth:token-invalidation')
+        cache._redis = Mock()
+        thread = cache._redis.pubsub.return_value.run_in_thread.return_value
+        token = make_token(1)
+        cache.get(token)
+        cache._redis.pubsub.return_value.subscribe.assert_called_once()
+        stamp = cache.stamp()
+        cache.set(token, {'id': 1}, stamp)
+
+        cache._on_subscriber_error(redis.ConnectionError('caída'), Mock(), thread)
+        thread.stop.assert_called_once()
+        self.assertIsNone(cache.get(token))
+        # Una verificación iniciada antes del corte pudo perder eventos
+        cache.set(token, {'id': 1}, stamp)
+        self.assertEqual(cache.stats()['size'], 0)
+
+        self.assertEqual(cache._redis.pubsub.call_count, 1)
+        with patch('clinic_common.token_cache.time.time', return_value=time.time() + SUBSCRIBE_RETRY_SECONDS + 1):
+            cache.get(token)
+        self.assertEqual(cache._redis.pubsub.call_count, 2)
+
+    @skipUnless(redis_available(), 'Requiere un servidor Redis')
+    def test_shared_tier(self):
+        """Test otro proceso lee la entrada de Redis y la invalidación la borra"""
+        redis.Redis.from_url(TEST_REDIS_URL).flushdb()
+        writer = TokenCache(max_size=2, ttl=300, redis_url=TEST_REDIS_URL, shared=True)
+        reader = TokenCache(max_size=2, ttl=300, redis_url=TEST_REDIS_URL, shared=True)
+        for cache in (writer, reader):
+            cache._ensure_subscribed = Mock()
+        token = make_token(1)
+        writer.set(token, {'id': 1}, writer.stamp())
+        self.assertEqual(reader.get(token), {'id': 1})
+        self.assertEqual(reader.stats()['shared_hits'], 1)
+
+        writer.invalidate_user(1)
+        reader.invalidate_user(1)
+        self.assertIsNone(reader.get(token))
@@ -0,0 +1,251 @@
+import hashlib
+import json
+import logging
+import threading
+import time
+from collections import OrderedDict
+
+import jwt
+import redis
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+# Segundos de espera antes de reintentar la suscripción si Redis no responde
+SUBSCRIBE_RETRY_SECONDS = 30
+# Usuarios cuya última invalidación se recuerda para descartar verificaciones en curso
+INVALIDATIONS_MAX_SIZE = 10000
+
+class TokenCache:
+    """
+    Caché LRU por proceso de tokens verificados por auth-service, con un nivel
+    compartido opcional en Redis. Cada entrada expira con el menor entre
+    JWT_CACHE_TTL y el 'exp' del token, y se descarta al recibir un evento de
+    invalidación publicado por auth-service.
+
+    Una verificación remota toma `stamp()` antes de llamar a auth-service y
+    lo pasa a `set`: si el usuario se invalidó mientras tanto, el resultado no
+    se guarda (ni en el proceso ni en Redis). Si el evento llega después del
+    `set`, `invalidate_user` borra lo que se acaba de guardar.
+    """
+
+    def __init__(self, max_size, ttl, redis_url=None, shared=False, channel=None):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.channel = channel
+        self._redis = redis.Redis.from_url(redis_url) if redis_url else None
+        self._shared = shared and self._redis is not None
+        self._entries = OrderedDict()
+        self._keys_by_user = {}
+        self._lock = threading.Lock()
+        self._subscriber = None
+        self._subscribe_retry_at = 0
+        # Secuencia de invalidaciones y la última de cada usuario
+        self._sequence = 0
+        self._invalidated = OrderedDict()
+        self._invalidated_floor = 0
+        self.hits = 0
+        self.shared_hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    @staticmethod
+    def key_for(token):
+        return hashlib.sha256(token.encode()).hexdigest()
+
+    def get(self, token):
+        """Obtener los datos del usuario si el token está en caché y vigente"""
+        self._ensure_subscribed()
+        key = self.key_for(token)
+        now = time.time()
+
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                expires_at, user_data = entry
+                if expires_at > now:
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return user_data
+                self._discard(key)
+            stamp = self._sequence
+
+        entry = self._get_shared(key)
+        with self._lock:
+            # Una entrada leída antes de una invalidación ya no vale
+            if entry is None or self._invalidated_since(entry[1].get('id'), stamp):
+                self.misses += 1
+                return None
+            self.shared_hits += 1
+            self._store(key, *entry)
+        return entry[1]
+
+    def stamp(self):
+        """Marca a tomar antes de verificar un token remotamente, para `set`"""
+        with self._lock:
+            return self._sequence
+
+    def set(self, token, user_data, stamp):
+        """
+        Guardar los datos del usuario verificados para el token, salvo que el
+        usuario se haya invalidado después de `stamp`.
+        """
+        try:
+            exp = jwt.decode(token, options={'verify_signature': False}).get('exp')
+        except jwt.InvalidTokenError:
+            return
+
+        now = time.time()
+        expires_at = now + self.ttl
+        if exp:
+            expires_at = min(expires_at, exp)
+        if expires_at <= now:
+            return
+
+        key = self.key_for(token)
+        with self._lock:
+            if self._invalidated_since(user_data.get('id'), stamp):
+                return
+            self._store(key, expires_at, user_data)
+        self._set_shared(key, expires_at, user_data)
+
+    def invalidate_user(self, user_id):
+        """Descartar todas las entradas de un usuario"""
+        with self._lock:
+            self._sequence += 1
+            self._invalidated[user_id] = self._sequence
+            self._invalidated.move_to_end(user_id)
+            while len(self._invalidated) > INVALIDATIONS_MAX_SIZE:
+                # Olvidar un usuario vuelve conservadoras las marcas anteriores a él
+                _, self._invalidated_floor = self._invalidated.popitem(last=False)
+            for key in self._keys_by_user.pop(user_id, set()):
+                self._entries.pop(key, None)
+
+        if self._shared:
+            user_key = f'jwt-cache:user:{user_id}'
+            try:
+                keys = [f'jwt-cache:{key.decode()}' for key in self._redis.smembers(user_key)]
+                self._redis.delete(user_key, *keys)
+            except redis.RedisError as e:
+                logger.error(f"Error al invalidar tokens en Redis: {e}")
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.shared_hits + self.misses
+            return {
+                'size': len(self._entries),
+                'max_size': self.max_size,
+                'ttl': self.ttl,
+                'hits': self.hits,
+                'shared_hits': self.shared_hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'hit_rate': round((self.hits + self.shared_hits) / lookups, 4) if lookups else 0,
+            }
+
+    def _store(self, key, expires_at, user_data):
+        self._entries[key] = (expires_at, user_data)
+        self._entries.move_to_end(key)
+        self._keys_by_user.setdefault(user_data.get('id'), set()).add(key)
+        while len(self._entries) > self.max_size:
+            oldest, _ = next(iter(self._entries.items()))
+            self._discard(oldest)
+            self.evictions += 1
+
+    def _invalidated_since(self, user_id, stamp):
+        return max(self._invalidated.get(user_id, 0), self._invalidated_floor) > stamp
+
+    def _discard(self, key):
+        _, user_data = self._entries.pop(key)
+        keys = self._keys_by_user.get(user_data.get('id'))
+        if keys is not None:
+            keys.discard(key)
+            if not keys:
+                del self._keys_by_user[user_data.get('id')]
+
+    def _get_shared(self, key):
+        if not self._shared:
+            return None
+        try:
+            value = self._redis.get(f'jwt-cache:{key}')
+        except redis.RedisError as e:
+            logger.error(f"Error al leer el caché de tokens en Redis: {e}")
+            return None
+        if value is None:
+            return None
+        entry = json.loads(value)
+        return entry['expires_at'], entry['user']
+
+    def _set_shared(self, key, expires_at, user_data):
+        if not self._shared:
+            return
+        timeout = int(expires_at - time.time())
+        if timeout <= 0:
+            return
+        user_key = f"jwt-cache:user:{user_data.get('id')}"
+        try:
+            pipeline = self._redis.pipeline()
+            pipeline.setex(
+                f'jwt-cache:{key}', timeout,
+                json.dumps({'expires_at': expires_at, 'user': user_data})
+            )
+            pipeline.sadd(user_key, key)
+            pipeline.expire(user_key, self.ttl)
+            pipeline.execute()
+        except redis.RedisError as e:
+            logger.error(f"Error al escribir el caché de tokens en Redis: {e}")
+
+    def _ensure_subscribed(self):
+        """Suscribirse a los eventos de invalidación de auth-service"""
+        if self._redis is None:
+            return
+        if self._subscriber is not None and self._subscriber.is_alive():
+            return
+        if time.time() < self._subscribe_retry_at:
+            return
+
+        with self._lock:
+            if self._subscriber is not None and self._subscriber.is_alive():
+                return
+            try:
+                pubsub = self._redis.pubsub(ignore_subscribe_messages=True)
+                pubsub.subscribe(**{self.channel: self._on_invalidation})
+                self._subscriber = pubsub.run_in_thread(
+                    sleep_time=1, daemon=True, exception_handler=self._on_subscriber_error
+                )
+            except redis.RedisError as e:
+                logger.error(f"No se pudo suscribir a invalidaciones de tokens: {e}")
+                self._subscribe_retry_at = time.time() + SUBSCRIBE_RETRY_SECONDS
+
+    def _on_subscriber_error(self, error, pubsub, thread):
+        """
+        La conexión de la suscripción se cortó: detener el hilo y volver a
+        suscribirse en la próxima consulta. Los eventos publicados mientras
+        tanto se perdieron, así que el caché local se vacía.
+        """
+        logger.error(f"Se perdió la suscripción a invalidaciones de tokens: {error}")
+        thread.stop()
+        with self._lock:
+            if self._subscriber is thread:
+                self._subscriber = None
+            self._subscribe_retry_at = time.time() + SUBSCRIBE_RETRY_SECONDS
+            self._entries.clear()
+            self._keys_by_user.clear()
+            # Las verificaciones en curso pudieron perder eventos: tampoco se guardan
+            self._sequence += 1
+            self._invalidated_floor = self._sequence
+
+    def _on_invalidation(self, message):
+        try:
+            event = json.loads(message['data'])
+        except (TypeError, ValueError):
+            return
+        self.invalidate_user(event.get('user_id'))
+
+token_cache = TokenCache(
+    max_size=settings.JWT_CACHE_MAX_SIZE,
+    ttl=settings.JWT_CACHE_TTL,
+    redis_url=settings.JWT_CACHE_REDIS_URL,
+    shared=settings.JWT_CACHE_SHARED,
+    channel=settings.TOKEN_INVALIDATION_CHANNEL,
+)
@@ -0,0 +1,29 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from consultations.models import Consultation
+from consultations.search import index_consultations
+
+class Command(BaseCommand):
+    help = 'Reconstruir el índice de búsqueda clínica (consultas existentes o escritas con update())'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500)
+        parser.add_argument('--from-id', type=int, default=0, help='Reanudar desde este ID de consulta')
+
+    def handle(self, *args, **options):
+        if options['batch_size'] < 1:
+            raise CommandError('batch-size debe ser al menos 1')
+
+        last_id = options['from_id'] - 1
+        indexed = 0
+        # Lotes por ID para no cargar la tabla completa ni mantener una transacción larga
+        while True:
+            batch = list(Consultation.objects.filter(id__gt=last_id).order_by('id')[:options['batch_size']])
+            if not batch:
+                break
+            with transaction.atomic():
+                index_consultations(batch)
+            indexed += len(batch)
+            last_id = batch[-1].id
+
+        self.stdout.write(self.style.SUCCESS(f'Consultas indexadas: {indexed}'))
@@ -1,6 +1,7 @@
 from django.db import models
 from django.utils.translation import gettext_lazy as _
 from django.core.exceptions import ValidationError
+from django.db import transaction
 from medical_records.models import MedicalRecord
 
 class Consultation(models.Model):
@@ -83,6 +84,12 @@ class Consultation(models.Model):
         verbose_name = _('Consulta')
         verbose_name_plural = _('Consultas')
         ordering = ['-consultation_date']
+        indexes = [
+            models.Index(fields=['veterinarian_id', 'status', 'consultation_date'], name='consult_vet_status_date_idx'),
+            models.Index(fields=['medical_record', '-consultation_date'], name='consult_record_date_idx'),
+            # Seguimientos pendientes
+            models.Index(fields=['status', 'follow_up_date', 'follow_up_required'], name='consult_follow_up_idx'),
+        ]
         permissions = [
             ("can_view_all_consultations", "Puede ver todas las consultas"),
             ("can_create_consultation", "Puede crear consultas"),
@@ -97,6 +104,44 @@ class Consultation(models.Model):
         if self.follow_up_required and not self.follow_up_date:
             raise ValidationError('Si requiere seguimiento, debe especificar la fecha')
 
+    def save(self, *args, **kwargs):
+        """Guardar y mantener el índice de búsqueda en la misma transacción"""
+        from .search import SEARCH_FIELDS, index_consultation
+        update_fields = kwargs.get('update_fields')
+        with transaction.atomic():
+            super().save(*args, **kwargs)
+            if update_fields is None or set(update_fields) & set(SEARCH_FIELDS):
+                index_consultation(self)
+
+class ConsultationSearchTerm(models.Model):
+    """
+    Índice invertido de búsqueda clínica: un término normalizado (minúsculas,
+    sin tildes) por consulta, con un peso según los campos donde aparece.
+    """
+
+    term = models.CharField(max_length=64, verbose_name=_('Término'))
+    consultation = models.ForeignKey(
+        Consultation,
+        on_delete=models.CASCADE,
+        related_name='search_terms',
+        verbose_name=_('Consulta')
+    )
+    weight = models.PositiveIntegerField(verbose_name=_('Peso'))
+
+    class Meta:
+        verbose_name = _('Término de búsqueda')
+        verbose_name_plural = _('Términos de búsqueda')
+        constraints = [
+            models.UniqueConstraint(fields=['term', 'consultation'], name='consult_search_term_uniq'),
+        ]
+        indexes = [
+            # Cubre la búsqueda: candidatos y ranking se resuelven sin leer la tabla
+            models.Index(fields=['term', 'consultation', 'weight'], name='consult_search_cover_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.term} - Consulta {self.consultation_id}"
+
 class ConsultationProcedure(models.Model):
     """Procedimientos realizados durante una consulta"""
     
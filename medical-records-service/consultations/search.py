@@ -0,0 +1,130 @@
+import re
+import unicodedata
+from collections import Counter
+from django.db.models import Case, Count, IntegerField, Max, OuterRef, Q, Subquery, Sum, Value, When
+from rest_framework import filters
+from .models import ConsultationSearchTerm
+
+# Campos indexados y su peso en el ranking
+SEARCH_FIELDS = {
+    'primary_diagnosis': 4,
+    'chief_complaint': 3,
+    'secondary_diagnosis': 2,
+    'treatment_plan': 1,
+    'recommendations': 1,
+}
+
+TERM_MAX_LENGTH = ConsultationSearchTerm._meta.get_field('term').max_length
+# Términos de una búsqueda que se tienen en cuenta, en orden de aparición
+QUERY_MAX_TERMS = 8
+# Longitud desde la que el último término se busca como prefijo ("otit" -> "otitis")
+PREFIX_MIN_LENGTH = 3
+
+# Palabras vacías del español; "no" se conserva porque cambia el sentido clínico
+STOPWORDS = frozenset((
+    'a', 'al', 'con', 'de', 'del', 'el', 'en', 'es', 'la', 'las', 'lo', 'los',
+    'o', 'para', 'por', 'que', 'se', 'sin', 'su', 'sus', 'un', 'una', 'y',
+))
+
+TOKEN_RE = re.compile(r'[a-z0-9]+')
+
+def normalize(text):
+    """Términos del texto en minúsculas y sin tildes ("Otitis Crónica" -> ["otitis", "cronica"])"""
+    folded = unicodedata.normalize('NFKD', text or '').encode('ascii', 'ignore').decode('ascii').lower()
+    return [
+        token[:TERM_MAX_LENGTH] for token in TOKEN_RE.findall(folded)
+        if len(token) > 1 and token not in STOPWORDS
+    ]
+
+def consultation_terms(consultation):
+    """Pesos {término: peso} de una consulta: peso del campo por cada aparición"""
+    weights = Counter()
+    for field, weight in SEARCH_FIELDS.items():
+        for term in normalize(getattr(consultation, field)):
+            weights[term] += weight
+    return weights
+
+def index_consultations(consultations):
+    """Reescribir en el índice los términos de varias consultas ya guardadas"""
+    ConsultationSearchTerm.objects.filter(consultation__in=[consultation.id for consultation in consultations]).delete()
+    ConsultationSearchTerm.objects.bulk_create([
+        ConsultationSearchTerm(term=term, consultation=consultation, weight=weight)
+        for consultation in consultations
+        for term, weight in consultation_terms(consultation).items()
+    ])
+
+def index_consultation(consultation):
+    index_consultations([consultation])
+
+def query_terms(query):
+    return list(dict.fromkeys(normalize(query)))[:QUERY_MAX_TERMS]
+
+def _term_filters(terms):
+    """Filtro de postings de cada término; el último, si es largo, como prefijo"""
+    filters = [Q(term=term) for term in terms]
+    if len(terms[-1]) >= PREFIX_MIN_LENGTH:
+        filters[-1] = Q(term__startswith=terms[-1])
+    return filters
+
+def ranked_matches(queryset, terms):
+    """
+    Consultas de `queryset` que contienen todos los términos, como
+    `values('consultation', 'rank')` sin evaluar. El recorrido empieza por
+    el término con menos postings (una sola consulta cuenta todos) y el resto
+    de términos y el peso se resuelven en una consulta agrupada sobre el
+    índice (term, consultation, weight). No se acota: la paginación limita
+    la página ya ordenada y el total es exacto.
+    """
+    postings = ConsultationSearchTerm.objects.order_by()
+    term_filters = _term_filters(terms)
+    rarest = term_filters[0]
+    if len(term_filters) > 1:
+        counts = postings.filter(Q(*term_filters, _connector=Q.OR)).aggregate(**{
+            f'term_{position}': Count('pk', filter=term_filter)
+            for position, term_filter in enumerate(term_filters)
+        })
+        rarest = term_filters[min(range(len(term_filters)), key=lambda position: counts[f'term_{position}'])]
+    candidates = postings.filter(rarest, consultation__in=queryset.order_by().values('pk')).values('consultation')
+
+    matched = {
+        f'matched_{position}': Max(Case(When(term_filter, then=Value(1)), default=Value(0)))
+        for position, term_filter in enumerate(term_filters)
+    }
+    return postings.filter(
+        Q(*term_filters, _connector=Q.OR), consultation__in=candidates
+    ).values('consultation').annotate(rank=Sum('weight'), **matched).filter(
+        **{name: 1 for name in matched}
+    ).values('consultation', 'rank')
+
+def search(queryset, query):
+    """
+    Filtrar `queryset` a las consultas que contienen todos los términos de
+    `query` y anotar `search_rank`. La búsqueda recorre el índice por término
+    en vez de comparar con LIKE cada fila de la tabla de consultas.
+    """
+    terms = query_terms(query)
+    if not terms:
+        return queryset.none().annotate(search_rank=Value(0, output_field=IntegerField()))
+    matches = ranked_matches(queryset, terms)
+    return queryset.filter(id__in=matches.values('consultation')).annotate(search_rank=Subquery(
+        matches.filter(consultation=OuterRef('pk')).values('rank'), output_field=IntegerField()
+    ))
+
+class ClinicalSearchFilter(filters.BaseFilterBackend):
+    """
+    Parámetro `search` de los listados resuelto con el índice de búsqueda
+    clínica. Busca términos completos sin tildes y el último también como
+    prefijo ("otit" encuentra "otitis"); a diferencia de SearchFilter no
+    encuentra fragmentos en medio de una palabra.
+    """
+
+    search_param = filters.SearchFilter.search_param
+
+    def filter_queryset(self, request, queryset, view):
+        query = request.query_params.get(self.search_param, '')
+        if not query.strip():
+            return queryset
+        terms = query_terms(query)
+        if not terms:
+            return queryset.none()
+        return queryset.filter(id__in=ranked_matches(queryset, terms).values('consultation'))
@@ -43,13 +43,13 @@ class TreatmentSerializer(serializers.ModelSerializer):
         return data
 
 class ConsultationListSerializer(serializers.ModelSerializer):
-    """Serializer simplificado para listados"""
+    """Serializer simplificado para listados; los conteos vienen anotados por la vista"""
     consultation_type_display = serializers.CharField(source='get_consultation_type_display', read_only=True)
     status_display = serializers.CharField(source='get_status_display', read_only=True)
     veterinarian_name = serializers.CharField(read_only=True)
     patient_name = serializers.CharField(read_only=True)
-    procedures_count = serializers.SerializerMethodField()
-    treatments_count = serializers.SerializerMethodField()
+    procedures_count = serializers.IntegerField(read_only=True)
+    treatments_count = serializers.IntegerField(read_only=True)
     
     class Meta:
         model = Consultation
@@ -60,11 +60,12 @@ class ConsultationListSerializer(serializers.ModelSerializer):
             'follow_up_required', 'follow_up_date', 'procedures_count', 'treatments_count'
         )
 
-    def get_procedures_count(self, obj):
-        return obj.procedures.count()
+class ConsultationSearchSerializer(ConsultationListSerializer):
+    """Resultado de la búsqueda clínica con su relevancia"""
+    search_rank = serializers.IntegerField(read_only=True)
 
-    def get_treatments_count(self, obj):
-        return obj.treatments.count()
+    class Meta(ConsultationListSerializer.Meta):
+        fields = ConsultationListSerializer.Meta.fields + ('search_rank',)
 
 class ConsultationDetailSerializer(serializers.ModelSerializer):
     """Serializer detallado para vista individual"""
@@ -0,0 +1,219 @@
+from datetime import date, timedelta
+from io import StringIO
+from django.core.management import call_command
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APITestCase
+from medical_records_service.authentication import AuthenticatedUser
+from medical_records.models import MedicalRecord
+from consultations.models import Consultation, ConsultationProcedure, Treatment
+from consultations.search import normalize
+
+class ConsultationQueryPlanTest(APITestCase):
+    """Regresiones de uso de índices en los filtros frecuentes de consultas"""
+
+    def setUp(self):
+        self.client.force_authenticate(user=AuthenticatedUser({'id': 7, 'role': 'Veterinario'}))
+        self.record = MedicalRecord.objects.create(patient_id=1, owner_id=1, created_by=1)
+        for _ in range(3):
+            Consultation.objects.create(
+                medical_record=self.record,
+                veterinarian_id=7,
+                chief_complaint='Control',
+                primary_diagnosis='Sano'
+            )
+
+    def get_with_plans(self, url, params=None):
+        """Respuesta de la petición y planes de las consultas que emitió sobre la tabla de consultas"""
+        explain = 'EXPLAIN QUERY PLAN ' if connection.vendor == 'sqlite' else 'EXPLAIN '
+        table = connection.ops.quote_name(Consultation._meta.db_table)
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.get(url, params)
+        plans = []
+        with connection.cursor() as cursor:
+            for query in context.captured_queries:
+                if query['sql'].startswith('SELECT') and table in query['sql']:
+                    cursor.execute(explain + query['sql'])
+                    plans.append(str(cursor.fetchall()))
+        return response, plans
+
+    def assertUsesIndex(self, plans, index_name):
+        self.assertTrue(plans)
+        for plan in plans:
+            self.assertIn(index_name, plan)
+
+    def test_veterinarian_date_range(self):
+        """Test consultas del veterinario por estado y rango de fechas"""
+        today = date.today()
+        response, plans = self.get_with_plans('/api/consultations/', {
+            'status': 'EN_PROGRESO',
+            'start_date': today.isoformat(),
+            'end_date': today.isoformat(),
+        })
+        self.assertEqual(response.data['count'], 3)
+        self.assertUsesIndex(plans, 'consult_vet_status_date_idx')
+
+    def test_follow_ups_due(self):
+        """Test seguimientos pendientes"""
+        Consultation.objects.update(status='COMPLETADA', follow_up_required=True, follow_up_date=date.today())
+        self.client.force_authenticate(user=AuthenticatedUser({'id': 1, 'role': 'Admin'}))
+        response, plans = self.get_with_plans('/api/consultations/follow_ups_due/')
+        self.assertEqual(response.data['count'], 3)
+        self.assertUsesIndex(plans, 'consult_follow_up_idx')
+
+    def test_invalid_date_is_bad_request(self):
+        """Test fecha inválida en el filtro de rango"""
+        response = self.client.get('/api/consultations/', {'start_date': '2024-13-45'})
+        self.assertEqual(response.status_code, 400)
+
+class ConsultationListQueryTest(APITestCase):
+    """Los listados de consultas cuestan lo mismo con cualquier tamaño de página"""
+
+    def setUp(self):
+        self.client.force_authenticate(user=AuthenticatedUser({'id': 7, 'role': 'Veterinario'}))
+        self.record = MedicalRecord.objects.create(patient_id=1, owner_id=1, created_by=1)
+
+    def create_consultations(self, count):
+        for _ in range(count):
+            consultation = Consultation.objects.create(
+                medical_record=self.record,
+                veterinarian_id=7,
+                status='COMPLETADA',
+                chief_complaint='Control',
+                primary_diagnosis='Sano',
+                follow_up_required=True,
+                follow_up_date=date.today()
+            )
+            for name in ('Vacuna', 'Desparasitación'):
+                ConsultationProcedure.objects.create(consultation=consultation, procedure_name=name, performed_by=7)
+            Treatment.objects.create(
+                consultation=consultation, treatment_name='Antibiótico', description='7 días',
+                start_date=date.today(), prescribed_by=7
+            )
+
+    def test_query_count_is_flat(self):
+        """Test mismo número de consultas con 1 y con 20 filas por página"""
+        for url in ('/api/consultations/', '/api/consultations/my_consultations/',
+                    '/api/consultations/follow_ups_due/'):
+            Consultation.objects.all().delete()
+            self.create_consultations(1)
+            with self.assertNumQueries(2):
+                self.client.get(url)
+            self.create_consultations(19)
+            with self.assertNumQueries(2):
+                response = self.client.get(url)
+            self.assertEqual(response.data['count'], 20)
+            self.assertEqual(len(response.data['results']), 20)
+
+    def test_counts_are_not_multiplied(self):
+        """Test procedimientos y tratamientos se cuentan sin multiplicarse entre sí"""
+        self.create_consultations(1)
+        result = self.client.get('/api/consultations/follow_ups_due/').data['results'][0]
+        self.assertEqual(result['procedures_count'], 2)
+        self.assertEqual(result['treatments_count'], 1)
+
+class ClinicalSearchTest(APITestCase):
+    """Búsqueda clínica con el índice invertido"""
+
+    def setUp(self):
+        self.client.force_authenticate(user=AuthenticatedUser({'id': 7, 'role': 'Veterinario'}))
+        self.record = MedicalRecord.objects.create(patient_id=1, owner_id=1, created_by=1)
+        self.otitis = self.create_consultation('Sacude la cabeza', 'Otitis externa crónica')
+        self.mention = self.create_consultation(
+            'Vómitos', 'Gastritis', treatment_plan='Descartar otitis en el próximo control'
+        )
+        self.other = self.create_consultation('Cojera', 'Esguince', veterinarian_id=8)
+
+    def create_consultation(self, chief_complaint, primary_diagnosis, veterinarian_id=7, **fields):
+        return Consultation.objects.create(
+            medical_record=self.record,
+            veterinarian_id=veterinarian_id,
+            chief_complaint=chief_complaint,
+            primary_diagnosis=primary_diagnosis,
+            **fields
+        )
+
+    def search(self, query):
+        return self.client.get('/api/consultations/search/', {'q': query})
+
+    def result_ids(self, response):
+        return [result['id'] for result in response.data['results']]
+
+    def test_normalize_folds_accents(self):
+        """Test minúsculas, sin tildes y sin palabras vacías"""
+        self.assertEqual(normalize('Otitis CRÓNICA de la oreja'), ['otitis', 'cronica', 'oreja'])
+
+    def test_ranked_and_accent_insensitive(self):
+        """Test el diagnóstico pesa más que el plan y las tildes no importan"""
+        response = self.search('OTITIS')
+        self.assertEqual(self.result_ids(response), [self.otitis.id, self.mention.id])
+        self.assertGreater(response.data['results'][0]['search_rank'], response.data['results'][1]['search_rank'])
+        self.assertEqual(self.result_ids(self.search('vomitos')), [self.mention.id])
+
+    def test_all_terms_required(self):
+        """Test todos los términos deben aparecer"""
+        self.assertEqual(self.result_ids(self.search('otitis crónica')), [self.otitis.id])
+        self.assertEqual(self.search('otitis esguince').data['count'], 0)
+
+    def test_respects_veterinarian_scope(self):
+        """Test el veterinario solo encuentra sus consultas"""
+        self.assertEqual(self.search('esguince').data['count'], 0)
+
+    def test_index_follows_updates(self):
+        """Test el índice se reescribe al guardar"""
+        self.otitis.primary_diagnosis = 'Dermatitis'
+        self.otitis.save()
+        self.assertEqual(self.result_ids(self.search('otitis')), [self.mention.id])
+        self.assertEqual(self.result_ids(self.search('dermatitis')), [self.otitis.id])
+
+    def test_list_search_param(self):
+        """Test el parámetro search del listado usa el índice"""
+        response = self.client.get('/api/consultations/', {'search': 'crónica'})
+        self.assertEqual(self.result_ids(response), [self.otitis.id])
+
+    def test_last_term_matches_prefix(self):
+        """Test el último término también se busca como prefijo, en el listado y en la búsqueda"""
+        response = self.client.get('/api/consultations/', {'search': 'otit'})
+        self.assertEqual(sorted(self.result_ids(response)), sorted([self.otitis.id, self.mention.id]))
+        self.assertEqual(self.result_ids(self.search('externa cron')), [self.otitis.id])
+        # Solo el último: los anteriores deben ser términos completos
+        self.assertEqual(self.search('otit cronica').data['count'], 0)
+
+    def test_search_applies_list_filters(self):
+        """Test la búsqueda respeta los filtros del listado"""
+        other_record = MedicalRecord.objects.create(patient_id=2, owner_id=1, created_by=1)
+        other = self.create_consultation('Control', 'Otitis media')
+        Consultation.objects.filter(id=other.id).update(medical_record=other_record)
+        response = self.client.get('/api/consultations/search/', {'q': 'otitis', 'medical_record': self.record.id})
+        self.assertEqual(self.result_ids(response), [self.otitis.id, self.mention.id])
+        response = self.client.get('/api/consultations/search/', {'q': 'otitis', 'status': 'COMPLETADA'})
+        self.assertEqual(response.data['count'], 0)
+
+    def test_all_matches_are_counted(self):
+        """Test el total cuenta todas las coincidencias y la página trae las de más peso"""
+        for _ in range(20):
+            self.create_consultation('Control', 'Revisión', treatment_plan='Otitis')
+        response = self.search('otitis')
+        self.assertEqual(response.data['count'], 22)
+        self.assertEqual(len(response.data['results']), 20)
+        self.assertEqual(self.result_ids(response)[0], self.otitis.id)
+
+    def test_term_choice_costs_one_query(self):
+        """Test elegir el término más raro no cuesta una consulta por término"""
+        def queries(query):
+            with CaptureQueriesContext(connection) as context:
+                self.search(query)
+            return len(context.captured_queries)
+        self.assertEqual(queries('otitis externa cronica sacude'), queries('otitis cronica'))
+
+    def test_missing_query_is_bad_request(self):
+        """Test búsqueda sin parámetro q"""
+        self.assertEqual(self.search('').status_code, 400)
+
+    def test_reindex_command(self):
+        """Test reconstrucción del índice tras escrituras con update()"""
+        Consultation.objects.filter(id=self.other.id).update(primary_diagnosis='Fractura')
+        call_command('reindex_consultations', batch_size=2, stdout=StringIO())
+        self.client.force_authenticate(user=AuthenticatedUser({'id': 1, 'role': 'Admin'}))
+        self.assertEqual(self.result_ids(self.search('fractura')), [self.other.id])
+        self.assertEqual(self.search('esguince').data['count'], 0)
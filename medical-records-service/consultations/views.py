@@ -2,25 +2,28 @@ from rest_framework import viewsets, status, filters
 from rest_framework.response import Response
 from rest_framework.decorators import action
 from django_filters.rest_framework import DjangoFilterBackend
+from django.db.models import OuterRef
 from datetime import datetime, timedelta
 from .models import Consultation, ConsultationProcedure, ConsultationNote, Treatment
+from medical_records_service.query_utils import count_subquery, date_range_lookups
+from .search import ClinicalSearchFilter, search as search_consultations
 from .serializers import (
-    ConsultationListSerializer, ConsultationDetailSerializer,
+    ConsultationListSerializer, ConsultationSearchSerializer, ConsultationDetailSerializer,
     ConsultationCreateSerializer, ConsultationUpdateSerializer,
     ConsultationProcedureSerializer, ConsultationNoteSerializer, TreatmentSerializer
 )
 
+# Acciones que devuelven listados con ConsultationListSerializer
+LIST_ACTIONS = ('list', 'my_consultations', 'follow_ups_due', 'search')
+
 class ConsultationViewSet(viewsets.ModelViewSet):
     queryset = Consultation.objects.all()
-    filter_backends = [DjangoFilterBackend, filters.SearchFilter, filters.OrderingFilter]
+    # `search` usa el índice de consultations.search sobre diagnósticos, motivo y plan
+    filter_backends = [DjangoFilterBackend, ClinicalSearchFilter, filters.OrderingFilter]
     filterset_fields = [
         'medical_record', 'veterinarian_id', 'consultation_type', 'status',
         'follow_up_required', 'appointment_id'
     ]
-    search_fields = [
-        'chief_complaint', 'primary_diagnosis', 'secondary_diagnosis',
-        'treatment_plan', 'recommendations'
-    ]
     ordering_fields = ['consultation_date', 'updated_at']
     ordering = ['-consultation_date']
 
@@ -48,13 +51,28 @@ class ConsultationViewSet(viewsets.ModelViewSet):
         start_date = self.request.query_params.get('start_date')
         end_date = self.request.query_params.get('end_date')
         
-        if start_date:
-            queryset = queryset.filter(consultation_date__date__gte=start_date)
-        if end_date:
-            queryset = queryset.filter(consultation_date__date__lte=end_date)
+        queryset = queryset.filter(**date_range_lookups('consultation_date', start_date, end_date))
+        
+        if self.action in LIST_ACTIONS:
+            # Subconsultas correlacionadas: dos JOIN multiplicarían procedimientos
+            # por tratamientos antes de agrupar
+            queryset = queryset.annotate(
+                procedures_count=count_subquery(
+                    ConsultationProcedure.objects.filter(consultation=OuterRef('pk')), 'consultation'
+                ),
+                treatments_count=count_subquery(
+                    Treatment.objects.filter(consultation=OuterRef('pk')), 'consultation'
+                )
+            ).order_by(*self.ordering)
         
         return queryset
 
+    def paginated_list(self, queryset, serializer_class=ConsultationListSerializer):
+        """Respuesta paginada con ConsultationListSerializer"""
+        page = self.paginate_queryset(queryset)
+        serializer = serializer_class(page, many=True)
+        return self.get_paginated_response(serializer.data)
+
     def create(self, request, *args, **kwargs):
         """Crear consulta asignando el veterinario automáticamente"""
         data = request.data.copy()
@@ -151,13 +169,7 @@ class ConsultationViewSet(viewsets.ModelViewSet):
         if status_filter:
             consultations = consultations.filter(status=status_filter)
         
-        page = self.paginate_queryset(consultations)
-        if page is not None:
-            serializer = ConsultationListSerializer(page, many=True)
-            return self.get_paginated_response(serializer.data)
-        
-        serializer = ConsultationListSerializer(consultations, many=True)
-        return Response(serializer.data)
+        return self.paginated_list(consultations)
 
     @action(detail=False, methods=['get'])
     def follow_ups_due(self, request):
@@ -171,8 +183,23 @@ class ConsultationViewSet(viewsets.ModelViewSet):
             status='COMPLETADA'
         )
         
-        serializer = ConsultationListSerializer(follow_ups, many=True)
-        return Response(serializer.data)
+        return self.paginated_list(follow_ups)
+
+    @action(detail=False, methods=['get'])
+    def search(self, request):
+        """Búsqueda clínica por relevancia (sin distinguir tildes ni mayúsculas)"""
+        query = request.query_params.get('q', '').strip()
+        if not query:
+            return Response(
+                {'error': 'Se requiere el parámetro q'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        
+        # filter_queryset: los filtros del listado (medical_record, status...) también aplican
+        consultations = search_consultations(self.filter_queryset(self.get_queryset()), query).order_by(
+            '-search_rank', '-consultation_date', '-id'
+        )
+        return self.paginated_list(consultations, ConsultationSearchSerializer)
 
 class ConsultationProcedureViewSet(viewsets.ModelViewSet):
     queryset = ConsultationProcedure.objects.all()
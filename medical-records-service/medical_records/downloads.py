@@ -0,0 +1,120 @@
+import hashlib
+import mimetypes
+import os
+import re
+from urllib.parse import quote
+from django.conf import settings
+from django.http import FileResponse, HttpResponse, StreamingHttpResponse
+from django.utils.cache import get_conditional_response
+from django.utils.http import content_disposition_header, http_date, parse_http_date_safe
+
+CHUNK_SIZE = 64 * 1024
+
+RANGE_RE = re.compile(r'^bytes=(\d*)-(\d*)$')
+
+class RangeNotSatisfiable(Exception):
+    pass
+
+def file_etag(medical_file):
+    """ETag fuerte: cambia si se reemplaza el archivo (cada subida tiene nombre nuevo)"""
+    digest = hashlib.md5(f'{medical_file.file.name}:{medical_file.file_size}'.encode(), usedforsecurity=False)
+    return f'"{digest.hexdigest()}"'
+
+def parse_range(header, size):
+    """
+    Rango (inicio, fin inclusive) de una cabecera Range de un solo rango.
+    Devuelve None si no hay cabecera o no se entiende (se envía el archivo
+    completo) y lanza RangeNotSatisfiable si queda fuera del archivo.
+    """
+    match = RANGE_RE.match(header.strip()) if header else None
+    if not match or match.groups() == ('', ''):
+        return None
+    first, last = match.groups()
+    if first:
+        start = int(first)
+        end = min(int(last), size - 1) if last else size - 1
+        if last and int(last) < start:
+            return None
+    else:
+        # bytes=-N: los últimos N bytes
+        start, end = max(size - int(last), 0), size - 1
+        if int(last) == 0:
+            raise RangeNotSatisfiable()
+    if start >= size:
+        raise RangeNotSatisfiable()
+    return start, end
+
+def _if_range_matches(request, etag, last_modified):
+    """If-Range: el rango solo vale si el cliente tiene la versión actual"""
+    if_range = request.headers.get('If-Range')
+    if not if_range:
+        return True
+    if if_range.startswith('"'):
+        return if_range == etag
+    return parse_http_date_safe(if_range) == last_modified
+
+def _read_range(handle, start, length):
+    """Leer `length` bytes desde `start` en bloques, sin cargar el archivo en memoria"""
+    try:
+        handle.seek(start)
+        while length > 0:
+            chunk = handle.read(min(CHUNK_SIZE, length))
+            if not chunk:
+                break
+            length -= len(chunk)
+            yield chunk
+    finally:
+        handle.close()
+
+def file_download_response(request, medical_file):
+    """
+    Respuesta de descarga de un archivo médico: en bloques, con Range de un
+    solo intervalo, ETag/Last-Modified y 304 para copias vigentes. Con
+    MEDICAL_FILES_ACCEL_REDIRECT_PREFIX el envío se delega a nginx.
+    """
+    etag = file_etag(medical_file)
+    last_modified = int(medical_file.uploaded_at.timestamp())
+    not_modified = get_conditional_response(request, etag=etag, last_modified=last_modified)
+    if not_modified is not None:
+        return not_modified
+
+    name = medical_file.file.name
+    content_type = mimetypes.guess_type(name)[0] or 'application/octet-stream'
+    extension = os.path.splitext(name)[1]
+    filename = medical_file.title if medical_file.title.lower().endswith(extension.lower()) else medical_file.title + extension
+
+    if settings.MEDICAL_FILES_ACCEL_REDIRECT_PREFIX:
+        # nginx envía el archivo y resuelve Range por su cuenta; la cabecera es una URI
+        response = HttpResponse(content_type=content_type)
+        response['X-Accel-Redirect'] = settings.MEDICAL_FILES_ACCEL_REDIRECT_PREFIX.rstrip('/') + '/' + quote(name)
+    else:
+        size = medical_file.file.size
+        try:
+            byte_range = parse_range(request.headers.get('Range'), size)
+        except RangeNotSatisfiable:
+            response = HttpResponse(status=416)
+            response['Content-Range'] = f'bytes */{size}'
+            return response
+        if byte_range and not _if_range_matches(request, etag, last_modified):
+            byte_range = None
+
+        handle = medical_file.file.storage.open(name, 'rb')
+        if byte_range:
+            start, end = byte_range
+            response = StreamingHttpResponse(
+                _read_range(handle, start, end - start + 1), status=206, content_type=content_type
+            )
+            response['Content-Range'] = f'bytes {start}-{end}/{size}'
+            response['Content-Length'] = str(end - start + 1)
+        else:
+            # FileResponse usa wsgi.file_wrapper (sendfile) si el servidor lo ofrece
+            response = FileResponse(handle, content_type=content_type)
+            response.block_size = CHUNK_SIZE
+            response['Content-Length'] = str(size)
+        response['Accept-Ranges'] = 'bytes'
+
+    response['Content-Disposition'] = content_disposition_header(as_attachment=True, filename=filename)
+    response['ETag'] = etag
+    response['Last-Modified'] = http_date(last_modified)
+    response['Cache-Control'] = 'private, no-cache'
+    return response
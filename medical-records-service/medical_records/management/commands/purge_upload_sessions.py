@@ -0,0 +1,19 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from medical_records.uploads import purge_expired_sessions
+
+class Command(BaseCommand):
+    help = 'Eliminar las subidas por partes abandonadas y sus partes en disco'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--older-than-hours', type=int, default=settings.MEDICAL_UPLOAD_SESSION_TTL_HOURS,
+            help='Purgar sesiones abiertas con más de estas horas'
+        )
+
+    def handle(self, *args, **options):
+        if options['older_than_hours'] < 1:
+            raise CommandError('older-than-hours debe ser al menos 1')
+
+        purged = purge_expired_sessions(options['older_than_hours'])
+        self.stdout.write(self.style.SUCCESS(f'Sesiones de subida purgadas: {purged}'))
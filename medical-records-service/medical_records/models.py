@@ -144,6 +144,94 @@ class VitalSigns(models.Model):
         verbose_name = _('Signos Vitales')
         verbose_name_plural = _('Signos Vitales')
         ordering = ['-recorded_at']
+        indexes = [
+            models.Index(fields=['medical_record', '-recorded_at'], name='vitals_record_recorded_idx'),
+        ]
 
     def __str__(self):
-        return f"Signos Vitales - {self.recorded_at.strftime('%d/%m/%Y %H:%M')}" 
\ No newline at end of file
+        return f"Signos Vitales - {self.recorded_at.strftime('%d/%m/%Y %H:%M')}"
+
+
+class UploadSession(models.Model):
+    """Subida por partes de un archivo médico grande, reanudable tras cortes"""
+
+    class Status(models.TextChoices):
+        OPEN = 'ABIERTA', _('Abierta')
+        COMPLETED = 'COMPLETADA', _('Completada')
+
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    medical_record = models.ForeignKey(
+        MedicalRecord,
+        on_delete=models.CASCADE,
+        related_name='upload_sessions',
+        verbose_name=_('Historia clínica')
+    )
+
+    # Datos del MedicalFile que se crea al finalizar
+    filename = models.CharField(max_length=255, verbose_name=_('Nombre del archivo'))
+    file_type = models.CharField(
+        max_length=15,
+        choices=MedicalFile.FileType.choices,
+        default=MedicalFile.FileType.OTHER,
+        verbose_name=_('Tipo de archivo')
+    )
+    title = models.CharField(max_length=200, verbose_name=_('Título'))
+    description = models.TextField(blank=True, verbose_name=_('Descripción'))
+
+    # Partes de tamaño fijo; la última puede ser menor
+    total_size = models.BigIntegerField(verbose_name=_('Tamaño total (bytes)'))
+    chunk_size = models.IntegerField(verbose_name=_('Tamaño de parte (bytes)'))
+    total_chunks = models.IntegerField(verbose_name=_('Número de partes'))
+
+    status = models.CharField(max_length=15, choices=Status.choices, default=Status.OPEN, verbose_name=_('Estado'))
+    medical_file = models.OneToOneField(
+        MedicalFile,
+        on_delete=models.SET_NULL,
+        null=True, blank=True,
+        related_name='upload_session',
+        verbose_name=_('Archivo creado')
+    )
+    created_at = models.DateTimeField(auto_now_add=True, verbose_name=_('Fecha de creación'))
+    created_by = models.IntegerField(verbose_name=_('Creado por (ID usuario)'))
+
+    class Meta:
+        verbose_name = _('Sesión de subida')
+        verbose_name_plural = _('Sesiones de subida')
+        ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['status', 'created_at'], name='upload_status_created_idx'),
+        ]
+
+    def __str__(self):
+        return f"Subida {self.id} - {self.filename}"
+
+    def expected_chunk_size(self, index):
+        """Bytes que debe tener la parte `index`"""
+        if index == self.total_chunks - 1:
+            return self.total_size - self.chunk_size * (self.total_chunks - 1)
+        return self.chunk_size
+
+class UploadChunk(models.Model):
+    """Parte recibida y verificada de una sesión de subida"""
+
+    session = models.ForeignKey(
+        UploadSession,
+        on_delete=models.CASCADE,
+        related_name='chunks',
+        verbose_name=_('Sesión de subida')
+    )
+    index = models.IntegerField(verbose_name=_('Número de parte'))
+    size = models.IntegerField(verbose_name=_('Tamaño (bytes)'))
+    checksum = models.CharField(max_length=64, verbose_name=_('SHA-256'))
+    received_at = models.DateTimeField(auto_now=True, verbose_name=_('Fecha de recepción'))
+
+    class Meta:
+        verbose_name = _('Parte de subida')
+        verbose_name_plural = _('Partes de subida')
+        ordering = ['index']
+        constraints = [
+            models.UniqueConstraint(fields=['session', 'index'], name='upload_chunk_session_index_uniq'),
+        ]
+
+    def __str__(self):
+        return f"Parte {self.index} - Subida {self.session_id}"
@@ -1,6 +1,10 @@
 from rest_framework import serializers
 from django.conf import settings
-from .models import MedicalRecord, MedicalFile, VitalSigns
+import math
+from .models import MedicalRecord, MedicalFile, VitalSigns, UploadSession
+from consultations.models import Consultation
+
+CONSULTATION_TYPES = dict(Consultation.ConsultationType.choices)
 
 class MedicalFileSerializer(serializers.ModelSerializer):
     file_size_mb = serializers.SerializerMethodField()
@@ -65,9 +69,13 @@ class VitalSignsSerializer(serializers.ModelSerializer):
         return super().create(validated_data)
 
 class MedicalRecordListSerializer(serializers.ModelSerializer):
-    """Serializer simplificado para listados"""
-    files_count = serializers.SerializerMethodField()
-    consultations_count = serializers.SerializerMethodField()
+    """
+    Serializer simplificado para listados. Los conteos y la última consulta
+    vienen anotados por `with_list_summary`, así que el listado no consulta la
+    base de datos por cada historia.
+    """
+    files_count = serializers.IntegerField(read_only=True)
+    consultations_count = serializers.IntegerField(read_only=True)
     last_consultation = serializers.SerializerMethodField()
     latest_vital_signs = VitalSignsSerializer(read_only=True)
     
@@ -80,20 +88,14 @@ class MedicalRecordListSerializer(serializers.ModelSerializer):
             'latest_vital_signs'
         )
 
-    def get_files_count(self, obj):
-        return obj.files.count()
-
-    def get_consultations_count(self, obj):
-        return obj.consultations.count()
-
     def get_last_consultation(self, obj):
-        last_consultation = obj.consultations.first()
-        if last_consultation:
+        if obj.last_consultation_id:
+            diagnosis = obj.last_consultation_diagnosis or ''
             return {
-                'id': last_consultation.id,
-                'date': last_consultation.consultation_date,
-                'type': last_consultation.get_consultation_type_display(),
-                'diagnosis': last_consultation.primary_diagnosis[:100] + '...' if len(last_consultation.primary_diagnosis) > 100 else last_consultation.primary_diagnosis
+                'id': obj.last_consultation_id,
+                'date': obj.last_consultation_date,
+                'type': CONSULTATION_TYPES.get(obj.last_consultation_type, obj.last_consultation_type),
+                'diagnosis': diagnosis[:100] + '...' if len(diagnosis) > 100 else diagnosis
             }
         return None
 
@@ -148,4 +150,51 @@ class MedicalRecordUpdateSerializer(serializers.ModelSerializer):
                 raise serializers.ValidationError(
                     'No se puede desactivar la historia clínica con consultas activas'
                 )
-        return data 
\ No newline at end of file
+        return data
+
+class UploadSessionSerializer(serializers.ModelSerializer):
+    received_chunks = serializers.SerializerMethodField()
+    missing_chunks = serializers.SerializerMethodField()
+
+    class Meta:
+        model = UploadSession
+        fields = '__all__'
+        read_only_fields = (
+            'chunk_size', 'total_chunks', 'status', 'medical_file', 'created_at', 'created_by'
+        )
+
+    def get_received_chunks(self, obj):
+        return [chunk.index for chunk in obj.chunks.all()]
+
+    def get_missing_chunks(self, obj):
+        from .uploads import missing_chunks
+        return missing_chunks(obj, self.get_received_chunks(obj))
+
+    def validate_medical_record(self, value):
+        if not value.is_active:
+            raise serializers.ValidationError('No se pueden subir archivos a historias clínicas inactivas')
+        return value
+
+    def validate_filename(self, value):
+        extension = value.split('.')[-1].lower() if '.' in value else ''
+        if extension not in settings.ALLOWED_FILE_EXTENSIONS:
+            raise serializers.ValidationError(
+                f'Tipo de archivo no permitido. Tipos permitidos: {", ".join(settings.ALLOWED_FILE_EXTENSIONS)}'
+            )
+        return value
+
+    def validate_total_size(self, value):
+        if value < 1:
+            raise serializers.ValidationError('El archivo está vacío')
+        if value > settings.MEDICAL_UPLOAD_MAX_SIZE:
+            raise serializers.ValidationError(
+                f'El archivo es demasiado grande. Máximo permitido: {settings.MEDICAL_UPLOAD_MAX_SIZE / (1024 * 1024):.1f}MB'
+            )
+        return value
+
+    def create(self, validated_data):
+        """Fijar el tamaño de parte y el usuario que sube el archivo"""
+        validated_data['chunk_size'] = settings.MEDICAL_UPLOAD_CHUNK_SIZE
+        validated_data['total_chunks'] = math.ceil(validated_data['total_size'] / settings.MEDICAL_UPLOAD_CHUNK_SIZE)
+        validated_data['created_by'] = self.context['request'].user.get('id', 0)
+        return super().create(validated_data)
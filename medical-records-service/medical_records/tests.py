@@ -0,0 +1,266 @@
+import hashlib
+import os
+import tempfile
+from datetime import date, timedelta
+from io import StringIO
+from django.conf import settings
+from django.core.management import call_command
+from django.db import DatabaseError, connection
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import override_settings
+from unittest.mock import patch
+from rest_framework.test import APITestCase
+from medical_records_service.authentication import AuthenticatedUser
+from medical_records.models import MedicalFile, MedicalRecord, UploadSession, VitalSigns
+from medical_records.uploads import complete_session
+from consultations.models import Consultation
+
+class VitalSignsQueryPlanTest(APITestCase):
+    """Regresiones de número de consultas y uso de índices en signos vitales"""
+
+    def setUp(self):
+        self.client.force_authenticate(user=AuthenticatedUser({'id': 1, 'role': 'Admin'}))
+        self.record = MedicalRecord.objects.create(patient_id=1, owner_id=1, created_by=1)
+        for _ in range(5):
+            VitalSigns.objects.create(medical_record=self.record, heart_rate=90, recorded_by=1)
+
+    def test_history_by_date_range(self):
+        """Test historial de signos vitales filtrado por fecha"""
+        today = date.today().isoformat()
+        with self.assertNumQueries(2), CaptureQueriesContext(connection) as context:
+            response = self.client.get(
+                f'/api/medical-records/records/{self.record.id}/vital_signs_history/',
+                {'start_date': today, 'end_date': today}
+            )
+        self.assertEqual(len(response.data), 5)
+        # El plan de la consulta que emitió el endpoint, no de una reconstruida
+        table = connection.ops.quote_name(VitalSigns._meta.db_table)
+        sql = next(query['sql'] for query in context.captured_queries if table in query['sql'])
+        explain = 'EXPLAIN QUERY PLAN ' if connection.vendor == 'sqlite' else 'EXPLAIN '
+        with connection.cursor() as cursor:
+            cursor.execute(explain + sql)
+            self.assertIn('vitals_record_recorded_idx', str(cursor.fetchall()))
+
+class MedicalRecordListQueryTest(APITestCase):
+    """El listado de historias clínicas no consulta la base de datos por fila"""
+
+    def setUp(self):
+        self.client.force_authenticate(user=AuthenticatedUser({'id': 1, 'role': 'Admin'}))
+
+    def create_record(self, patient_id, consultations=0):
+        record = MedicalRecord.objects.create(patient_id=patient_id, owner_id=1, created_by=1)
+        for number in range(consultations):
+            Consultation.objects.create(
+                medical_record=record,
+                veterinarian_id=7,
+                consultation_type='EMERGENCIA',
+                chief_complaint='Control',
+                primary_diagnosis=f'Diagnóstico {number} ' + 'x' * 120
+            )
+        return record
+
+    def test_constant_queries(self):
+        """Test mismo número de consultas con 1 y con 15 historias"""
+        self.create_record(1, consultations=2)
+        with self.assertNumQueries(2):
+            self.client.get('/api/medical-records/records/')
+
+        for patient_id in range(2, 17):
+            self.create_record(patient_id, consultations=1)
+        with self.assertNumQueries(2):
+            response = self.client.get('/api/medical-records/records/')
+        self.assertEqual(response.data['count'], 16)
+
+    def test_summary_fields(self):
+        """Test conteos y resumen de la última consulta"""
+        record = self.create_record(1, consultations=3)
+        self.create_record(2)
+        latest = record.consultations.order_by('-consultation_date', '-id').first()
+
+        response = self.client.get('/api/medical-records/records/', {'ordering': 'created_at'})
+        with_consultations, empty = response.data['results']
+        self.assertEqual(with_consultations['consultations_count'], 3)
+        self.assertEqual(with_consultations['files_count'], 0)
+        self.assertEqual(with_consultations['last_consultation']['id'], latest.id)
+        self.assertEqual(with_consultations['last_consultation']['type'], 'Emergencia')
+        self.assertEqual(with_consultations['last_consultation']['diagnosis'], latest.primary_diagnosis[:100] + '...')
+        self.assertEqual(empty['consultations_count'], 0)
+        self.assertIsNone(empty['last_consultation'])
+
+@override_settings(MEDIA_ROOT=tempfile.mkdtemp())
+class MedicalFileDownloadTest(APITestCase):
+    """Descarga de archivos médicos en bloques, con Range y validadores de caché"""
+
+    content = bytes(range(256)) * 1024
+
+    def setUp(self):
+        self.client.force_authenticate(user=AuthenticatedUser({'id': 1, 'role': 'Veterinario'}))
+        record = MedicalRecord.objects.create(patient_id=1, owner_id=1, created_by=1)
+        self.medical_file = MedicalFile.objects.create(
+            medical_record=record,
+            file=SimpleUploadedFile('placa.png', self.content),
+            file_type='RADIOGRAFIA',
+            title='Radiografía tórax',
+            uploaded_by=1
+        )
+        self.url = f'/api/medical-records/files/{self.medical_file.id}/download/'
+
+    def tearDown(self):
+        self.medical_file.file.delete(save=False)
+
+    def test_full_download_is_streamed(self):
+        """Test archivo completo con cabeceras de tipo, tamaño y caché"""
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.streaming)
+        self.assertEqual(b''.join(response.streaming_content), self.content)
+        self.assertEqual(response['Content-Type'], 'image/png')
+        self.assertEqual(response['Content-Length'], str(len(self.content)))
+        self.assertEqual(response['Accept-Ranges'], 'bytes')
+        self.assertIn('attachment', response['Content-Disposition'])
+        self.assertIn('.png', response['Content-Disposition'])
+        self.assertTrue(response.has_header('ETag'))
+        self.assertTrue(response.has_header('Last-Modified'))
+
+    def test_range_requests(self):
+        """Test rango parcial, sufijo y rango fuera del archivo"""
+        response = self.client.get(self.url, HTTP_RANGE='bytes=100-199')
+        self.assertEqual(response.status_code, 206)
+        self.assertEqual(b''.join(response.streaming_content), self.content[100:200])
+        self.assertEqual(response['Content-Range'], f'bytes 100-199/{len(self.content)}')
+        self.assertEqual(response['Content-Length'], '100')
+
+        response = self.client.get(self.url, HTTP_RANGE='bytes=-10')
+        self.assertEqual(b''.join(response.streaming_content), self.content[-10:])
+
+        response = self.client.get(self.url, HTTP_RANGE=f'bytes={len(self.content)}-')
+        self.assertEqual(response.status_code, 416)
+        self.assertEqual(response['Content-Range'], f'bytes */{len(self.content)}')
+
+    def test_conditional_requests(self):
+        """Test 304 con la copia vigente e If-Range con una versión distinta"""
+        etag = self.client.get(self.url)['ETag']
+        self.assertEqual(self.client.get(self.url, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+
+        response = self.client.get(self.url, HTTP_RANGE='bytes=0-9', HTTP_IF_RANGE='"otra-version"')
+        self.assertEqual(response.status_code, 200)
+        response = self.client.get(self.url, HTTP_RANGE='bytes=0-9', HTTP_IF_RANGE=etag)
+        self.assertEqual(response.status_code, 206)
+
+    @override_settings(MEDICAL_FILES_ACCEL_REDIRECT_PREFIX='/protected-media/')
+    def test_accel_redirect_offload(self):
+        """Test envío delegado a nginx"""
+        response = self.client.get(self.url)
+        self.assertEqual(response['X-Accel-Redirect'], '/protected-media/' + self.medical_file.file.name)
+        self.assertEqual(response.content, b'')
+
+        MedicalFile.objects.filter(id=self.medical_file.id).update(file='medical_records/1/informe año 100%.png')
+        response = self.client.get(self.url)
+        self.assertEqual(
+            response['X-Accel-Redirect'], '/protected-media/medical_records/1/informe%20a%C3%B1o%20100%25.png'
+        )
+
+    def test_forbidden_role(self):
+        """Test solo administradores y veterinarios descargan"""
+        self.client.force_authenticate(user=AuthenticatedUser({'id': 2, 'role': 'Recepcionista'}))
+        self.assertEqual(self.client.get(self.url).status_code, 403)
+
+@override_settings(
+    MEDIA_ROOT=tempfile.mkdtemp(),
+    MEDICAL_UPLOAD_SESSIONS_DIR=tempfile.mkdtemp(),
+    MEDICAL_UPLOAD_CHUNK_SIZE=1024
+)
+class UploadSessionTest(APITestCase):
+    """Subida por partes reanudable"""
+
+    content = bytes(range(256)) * 10  # 2560 bytes: partes de 1024, 1024 y 512
+
+    def setUp(self):
+        self.client.force_authenticate(user=AuthenticatedUser({'id': 1, 'role': 'Veterinario'}))
+        self.record = MedicalRecord.objects.create(patient_id=1, owner_id=1, created_by=1)
+        response = self.client.post('/api/medical-records/uploads/', {
+            'medical_record': self.record.id,
+            'filename': 'eco.pdf',
+            'file_type': 'ECOGRAFIA',
+            'title': 'Ecografía abdominal',
+            'total_size': len(self.content),
+        })
+        self.assertEqual(response.status_code, 201)
+        self.session_id = response.data['id']
+        self.url = f'/api/medical-records/uploads/{self.session_id}/'
+
+    def put_chunk(self, index, data=None, checksum=None):
+        data = self.content[index * 1024:(index + 1) * 1024] if data is None else data
+        return self.client.put(
+            f'{self.url}chunks/{index}/', data, content_type='application/octet-stream',
+            HTTP_X_CHUNK_SHA256=checksum or hashlib.sha256(data).hexdigest()
+        )
+
+    def test_out_of_order_resume_and_complete(self):
+        """Test partes en cualquier orden, estado para reanudar y archivo final"""
+        self.assertEqual(self.client.get(self.url).data['total_chunks'], 3)
+        self.assertEqual(self.put_chunk(2).status_code, 200)
+        self.assertEqual(self.put_chunk(0).status_code, 200)
+
+        session = self.client.get(self.url).data
+        self.assertEqual(session['received_chunks'], [0, 2])
+        self.assertEqual(session['missing_chunks'], [1])
+        self.assertEqual(self.client.post(f'{self.url}complete/').status_code, 400)
+
+        self.put_chunk(1)
+        response = self.client.post(f'{self.url}complete/')
+        self.assertEqual(response.status_code, 201)
+        medical_file = MedicalFile.objects.get(id=response.data['id'])
+        self.assertEqual(medical_file.file_size, len(self.content))
+        with medical_file.file.open('rb') as stored:
+            self.assertEqual(stored.read(), self.content)
+        self.assertEqual(medical_file.title, 'Ecografía abdominal')
+        self.assertFalse(os.path.exists(os.path.join(settings.MEDICAL_UPLOAD_SESSIONS_DIR, self.session_id)))
+        self.assertEqual(self.client.post(f'{self.url}complete/').status_code, 400)
+        medical_file.file.delete(save=False)
+
+    def test_failed_completion_removes_stored_file(self):
+        """Test si no se puede guardar el MedicalFile el archivo almacenado se borra y la sesión sigue abierta"""
+        for index in range(3):
+            self.put_chunk(index)
+        stored_dir = os.path.join(settings.MEDIA_ROOT, 'medical_records', str(self.record.patient_id))
+        before = set(os.listdir(stored_dir)) if os.path.isdir(stored_dir) else set()
+
+        with patch.object(MedicalFile, 'save', side_effect=DatabaseError('sin conexión')):
+            with self.assertRaises(DatabaseError):
+                complete_session(self.session_id, 1)
+
+        self.assertEqual(set(os.listdir(stored_dir)) if os.path.isdir(stored_dir) else set(), before)
+        session = self.client.get(self.url).data
+        self.assertEqual(session['status'], UploadSession.Status.OPEN)
+        self.assertEqual(session['received_chunks'], [0, 1, 2])
+
+    def test_rejects_bad_chunks(self):
+        """Test SHA-256 incorrecto, tamaño incorrecto y número fuera de rango"""
+        self.assertEqual(self.put_chunk(0, checksum='0' * 64).status_code, 400)
+        self.assertEqual(self.put_chunk(0, data=b'corto').status_code, 400)
+        self.assertEqual(self.put_chunk(3, data=b'x').status_code, 400)
+        self.assertEqual(self.client.get(self.url).data['received_chunks'], [])
+
+    def test_sessions_are_private(self):
+        """Test otro usuario no puede enviar partes a la sesión"""
+        self.client.force_authenticate(user=AuthenticatedUser({'id': 2, 'role': 'Veterinario'}))
+        self.assertEqual(self.put_chunk(0).status_code, 404)
+
+    def test_rejects_disallowed_extension(self):
+        """Test extensión no permitida al crear la sesión"""
+        response = self.client.post('/api/medical-records/uploads/', {
+            'medical_record': self.record.id, 'filename': 'script.exe',
+            'title': 'X', 'total_size': 10,
+        })
+        self.assertEqual(response.status_code, 400)
+
+    def test_purge_expired_sessions(self):
+        """Test purga de sesiones abandonadas"""
+        self.put_chunk(0)
+        UploadSession.objects.filter(id=self.session_id).update(created_at=timezone.now() - timedelta(days=3))
+        call_command('purge_upload_sessions', stdout=StringIO())
+        self.assertFalse(UploadSession.objects.exists())
+        self.assertFalse(os.path.exists(os.path.join(settings.MEDICAL_UPLOAD_SESSIONS_DIR, self.session_id)))
@@ -0,0 +1,163 @@
+import hashlib
+import io
+import os
+import shutil
+import uuid
+from datetime import timedelta
+from django.conf import settings
+from django.core.files import File
+from django.db import transaction
+from django.utils import timezone
+from .models import MedicalFile, UploadChunk, UploadSession
+
+# Bloque de lectura del cuerpo de la petición
+BLOCK_SIZE = 64 * 1024
+
+class UploadError(Exception):
+    """Parte o sesión inválida; el mensaje se devuelve al cliente"""
+
+def session_dir(session):
+    return os.path.join(settings.MEDICAL_UPLOAD_SESSIONS_DIR, str(session.id))
+
+def chunk_path(session, index):
+    return os.path.join(session_dir(session), f'{index:06d}.part')
+
+def write_chunk(session, index, stream, checksum):
+    """
+    Guardar en disco la parte `index` leyendo `stream` por bloques y verificar
+    tamaño y SHA-256. Reenviar una parte ya recibida la reemplaza.
+    """
+    if session.status != UploadSession.Status.OPEN:
+        raise UploadError('La sesión de subida ya fue finalizada')
+    if not 0 <= index < session.total_chunks:
+        raise UploadError(f'Número de parte fuera de rango (0-{session.total_chunks - 1})')
+    if not checksum:
+        raise UploadError('Se requiere la cabecera X-Chunk-SHA256')
+    if stream is None:
+        raise UploadError(f'La parte {index} llegó vacía')
+
+    expected = session.expected_chunk_size(index)
+    os.makedirs(session_dir(session), exist_ok=True)
+    path = chunk_path(session, index)
+    # Se escribe en un temporal y se renombra: una parte cortada nunca queda como recibida
+    temp_path = f'{path}.{uuid.uuid4().hex}.tmp'
+    digest = hashlib.sha256()
+    size = 0
+    try:
+        with open(temp_path, 'wb') as target:
+            while size <= expected:
+                block = stream.read(min(BLOCK_SIZE, expected + 1 - size))
+                if not block:
+                    break
+                digest.update(block)
+                target.write(block)
+                size += len(block)
+        if size != expected:
+            raise UploadError(f'La parte {index} debe tener {expected} bytes')
+        if digest.hexdigest() != checksum.lower():
+            raise UploadError(f'El SHA-256 de la parte {index} no coincide')
+        os.replace(temp_path, path)
+    finally:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+
+    chunk, _ = UploadChunk.objects.update_or_create(
+        session=session, index=index,
+        defaults={'size': size, 'checksum': digest.hexdigest()}
+    )
+    return chunk
+
+def missing_chunks(session, received=None):
+    if received is None:
+        received = session.chunks.values_list('index', flat=True)
+    return sorted(set(range(session.total_chunks)) - set(received))
+
+class ChunkReader(io.RawIOBase):
+    """Las partes de la sesión leídas en orden como un solo archivo, sin unirlas en disco"""
+
+    def __init__(self, paths):
+        self._paths = iter(paths)
+        self._current = None
+
+    def readable(self):
+        return True
+
+    def readinto(self, buffer):
+        while True:
+            if self._current is None:
+                path = next(self._paths, None)
+                if path is None:
+                    return 0
+                self._current = open(path, 'rb')
+            read = self._current.readinto(buffer)
+            if read:
+                return read
+            self._current.close()
+            self._current = None
+
+    def close(self):
+        if self._current is not None:
+            self._current.close()
+            self._current = None
+        super().close()
+
+def complete_session(session_id, uploaded_by):
+    """
+    Crear el MedicalFile con las partes de la sesión y cerrarla. Las partes
+    pasan en orden directo al almacenamiento, fuera de la transacción; después
+    una transacción corta bloquea la sesión, vuelve a comprobar su estado y
+    guarda las filas. Si eso falla, el archivo guardado se borra.
+    """
+    session = UploadSession.objects.select_related('medical_record').get(id=session_id)
+    if session.status != UploadSession.Status.OPEN:
+        raise UploadError('La sesión de subida ya fue finalizada')
+    missing = missing_chunks(session)
+    if missing:
+        raise UploadError(f'Faltan partes: {", ".join(str(index) for index in missing[:20])}')
+
+    medical_file = MedicalFile(
+        medical_record=session.medical_record,
+        file_type=session.file_type,
+        title=session.title,
+        description=session.description,
+        uploaded_by=uploaded_by
+    )
+    with ChunkReader([chunk_path(session, index) for index in range(session.total_chunks)]) as reader:
+        content = File(reader, name=session.filename)
+        content.size = session.total_size
+        # El almacenamiento lee el contenido por bloques (File.chunks)
+        medical_file.file.save(session.filename, content, save=False)
+
+    try:
+        with transaction.atomic():
+            session = UploadSession.objects.select_for_update().get(id=session_id)
+            if session.status != UploadSession.Status.OPEN:
+                raise UploadError('La sesión de subida ya fue finalizada')
+            medical_file.save()
+            session.status = UploadSession.Status.COMPLETED
+            session.medical_file = medical_file
+            session.save(update_fields=['status', 'medical_file'])
+            session.chunks.all().delete()
+    except Exception:
+        medical_file.file.delete(save=False)
+        raise
+
+    discard_session_files(session)
+    return session
+
+def discard_session_files(session):
+    shutil.rmtree(session_dir(session), ignore_errors=True)
+
+def purge_expired_sessions(max_age_hours=None):
+    """Eliminar sesiones abiertas más antiguas que el plazo y sus partes en disco"""
+    max_age_hours = settings.MEDICAL_UPLOAD_SESSION_TTL_HOURS if max_age_hours is None else max_age_hours
+    expired = UploadSession.objects.filter(
+        status=UploadSession.Status.OPEN,
+        created_at__lt=timezone.now() - timedelta(hours=max_age_hours)
+    )
+    purged = 0
+    for session in expired.iterator():
+        discard_session_files(session)
+        session.delete()
+        purged += 1
+    return purged
@@ -1,11 +1,12 @@
 from django.urls import path, include
 from rest_framework.routers import DefaultRouter
-from .views import MedicalRecordViewSet, MedicalFileViewSet, VitalSignsViewSet
+from .views import MedicalRecordViewSet, MedicalFileViewSet, VitalSignsViewSet, UploadSessionViewSet
 
 router = DefaultRouter()
 router.register(r'records', MedicalRecordViewSet)
 router.register(r'files', MedicalFileViewSet)
 router.register(r'vital-signs', VitalSignsViewSet)
+router.register(r'uploads', UploadSessionViewSet)
 
 urlpatterns = [
     path('', include(router.urls)),
@@ -1,16 +1,44 @@
-from rest_framework import viewsets, status, filters
+from rest_framework import viewsets, mixins, status, filters
 from rest_framework.response import Response
 from rest_framework.decorators import action
 from rest_framework.parsers import MultiPartParser, FormParser
 from django_filters.rest_framework import DjangoFilterBackend
-from django.http import HttpResponse, Http404
-from .models import MedicalRecord, MedicalFile, VitalSigns
+from django.http import Http404
+from django.db.models import OuterRef, Subquery
+from django.db.models.functions import Substr
+from .models import MedicalRecord, MedicalFile, VitalSigns, UploadSession
+from consultations.models import Consultation
+from medical_records_service.query_utils import count_subquery, date_range_lookups
+from .downloads import file_download_response
+from .uploads import UploadError, write_chunk, complete_session, discard_session_files
 from .serializers import (
     MedicalRecordListSerializer, MedicalRecordDetailSerializer,
     MedicalRecordCreateSerializer, MedicalRecordUpdateSerializer,
-    MedicalFileSerializer, VitalSignsSerializer
+    MedicalFileSerializer, VitalSignsSerializer, UploadSessionSerializer
 )
 
+def with_list_summary(queryset):
+    """
+    Anotar conteos y resumen de la última consulta para MedicalRecordListSerializer.
+    Son subconsultas por fila en la misma sentencia: el listado cuesta lo mismo
+    con cualquier tamaño de página, y al no haber columnas desnormalizadas no
+    hay contadores que reconciliar.
+    """
+    last_consultation = Consultation.objects.filter(
+        medical_record=OuterRef('pk')
+    ).order_by('-consultation_date', '-id')
+    return queryset.annotate(
+        files_count=count_subquery(MedicalFile.objects.filter(medical_record=OuterRef('pk')), 'medical_record'),
+        consultations_count=count_subquery(Consultation.objects.filter(medical_record=OuterRef('pk')), 'medical_record'),
+        last_consultation_id=Subquery(last_consultation.values('id')[:1]),
+        last_consultation_date=Subquery(last_consultation.values('consultation_date')[:1]),
+        last_consultation_type=Subquery(last_consultation.values('consultation_type')[:1]),
+        # Basta con un carácter más de los que se muestran para saber si se recorta
+        last_consultation_diagnosis=Subquery(
+            last_consultation.annotate(excerpt=Substr('primary_diagnosis', 1, 101)).values('excerpt')[:1]
+        ),
+    )
+
 class MedicalRecordViewSet(viewsets.ModelViewSet):
     queryset = MedicalRecord.objects.all()
     filter_backends = [DjangoFilterBackend, filters.SearchFilter, filters.OrderingFilter]
@@ -40,6 +68,9 @@ class MedicalRecordViewSet(viewsets.ModelViewSet):
             # Aquí podrías filtrar por las consultas del veterinario
             pass
         
+        if self.action == 'list':
+            queryset = with_list_summary(queryset)
+        
         return queryset
 
     def destroy(self, request, *args, **kwargs):
@@ -86,10 +117,7 @@ class MedicalRecordViewSet(viewsets.ModelViewSet):
         start_date = request.query_params.get('start_date')
         end_date = request.query_params.get('end_date')
         
-        if start_date:
-            vital_signs = vital_signs.filter(recorded_at__date__gte=start_date)
-        if end_date:
-            vital_signs = vital_signs.filter(recorded_at__date__lte=end_date)
+        vital_signs = vital_signs.filter(**date_range_lookups('recorded_at', start_date, end_date))
         
         serializer = VitalSignsSerializer(vital_signs, many=True)
         return Response(serializer.data)
@@ -114,31 +142,65 @@ class MedicalFileViewSet(viewsets.ModelViewSet):
 
     @action(detail=True, methods=['get'])
     def download(self, request, pk=None):
-        """Descargar archivo médico"""
-        try:
-            medical_file = self.get_object()
-            
-            # Verificar permisos de acceso
-            user = request.user
-            if user.get('role') not in ['Admin', 'Veterinario']:
-                return Response(
-                    {'error': 'No tiene permisos para descargar este archivo'},
-                    status=status.HTTP_403_FORBIDDEN
-                )
-            
-            response = HttpResponse(
-                medical_file.file.read(),
-                content_type='application/octet-stream'
+        """Descargar archivo médico (en bloques, con soporte de Range y caché del cliente)"""
+        medical_file = self.get_object()
+        
+        # Verificar permisos de acceso
+        user = request.user
+        if user.get('role') not in ['Admin', 'Veterinario']:
+            return Response(
+                {'error': 'No tiene permisos para descargar este archivo'},
+                status=status.HTTP_403_FORBIDDEN
             )
-            response['Content-Disposition'] = f'attachment; filename="{medical_file.title}"'
-            return response
-            
-        except Exception as e:
+        
+        try:
+            return file_download_response(request, medical_file)
+        except OSError:
             return Response(
                 {'error': 'Error al descargar el archivo'},
                 status=status.HTTP_500_INTERNAL_SERVER_ERROR
             )
 
+class UploadSessionViewSet(mixins.CreateModelMixin, mixins.RetrieveModelMixin,
+                           mixins.DestroyModelMixin, viewsets.GenericViewSet):
+    """
+    Subida por partes de archivos grandes: crear la sesión, enviar cada parte
+    con PUT (en cualquier orden, reenviando las que falten tras un corte) y
+    finalizar para crear el MedicalFile.
+    """
+    queryset = UploadSession.objects.prefetch_related('chunks')
+    serializer_class = UploadSessionSerializer
+
+    def get_queryset(self):
+        """Cada usuario solo ve sus propias sesiones"""
+        return super().get_queryset().filter(created_by=self.request.user.get('id', 0))
+
+    @action(detail=True, methods=['put'], url_path=r'chunks/(?P<index>\d+)')
+    def chunk(self, request, pk=None, index=None):
+        """Recibir una parte; el cuerpo son los bytes crudos y X-Chunk-SHA256 su resumen"""
+        session = self.get_object()
+        try:
+            chunk = write_chunk(session, int(index), request.stream, request.headers.get('X-Chunk-SHA256'))
+        except UploadError as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        return Response({'index': chunk.index, 'size': chunk.size, 'checksum': chunk.checksum})
+
+    @action(detail=True, methods=['post'])
+    def complete(self, request, pk=None):
+        """Unir las partes y crear el archivo médico"""
+        session = self.get_object()
+        try:
+            session = complete_session(session.id, request.user.get('id', 0))
+        except UploadError as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        serializer = MedicalFileSerializer(session.medical_file, context={'request': request})
+        return Response(serializer.data, status=status.HTTP_201_CREATED)
+
+    def perform_destroy(self, instance):
+        """Cancelar la subida y borrar las partes recibidas"""
+        discard_session_files(instance)
+        instance.delete()
+
 class VitalSignsViewSet(viewsets.ModelViewSet):
     queryset = VitalSigns.objects.all()
     serializer_class = VitalSignsSerializer
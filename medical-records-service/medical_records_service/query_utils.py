@@ -0,0 +1,36 @@
+from datetime import datetime, time, timedelta
+from django.db.models import Count, IntegerField, Subquery
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+from rest_framework.exceptions import ValidationError
+
+def parse_date(value, param):
+    """Convertir un parámetro YYYY-MM-DD en fecha"""
+    try:
+        return datetime.strptime(value, '%Y-%m-%d').date()
+    except (TypeError, ValueError):
+        raise ValidationError({param: 'Formato de fecha inválido. Use YYYY-MM-DD'})
+
+def date_range_lookups(field, start_date=None, end_date=None):
+    """
+    Equivalente a `field__date__gte` / `field__date__lte` sobre un DateTimeField,
+    expresado como comparación directa contra el inicio de cada día para que la
+    base de datos pueda usar el índice de la columna.
+    """
+    lookups = {}
+    if start_date:
+        start = parse_date(start_date, 'start_date') if isinstance(start_date, str) else start_date
+        lookups[f'{field}__gte'] = timezone.make_aware(datetime.combine(start, time.min))
+    if end_date:
+        end = parse_date(end_date, 'end_date') if isinstance(end_date, str) else end_date
+        lookups[f'{field}__lt'] = timezone.make_aware(datetime.combine(end + timedelta(days=1), time.min))
+    return lookups
+
+def count_subquery(queryset, field):
+    """
+    Subconsulta correlacionada con el número de filas de `queryset` agrupadas
+    por `field` (la columna filtrada con OuterRef). A diferencia de Count sobre
+    varias relaciones, no multiplica las filas de la consulta externa.
+    """
+    counted = queryset.order_by().values(field).annotate(total=Count('id')).values('total')
+    return Coalesce(Subquery(counted, output_field=IntegerField()), 0)
@@ -1,9 +1,14 @@
 import os
+import sys
 from pathlib import Path
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
 
+# Paquete clinic_common: en Docker se copia dentro del servicio, en local está en la raíz del repositorio
+if not (BASE_DIR / 'clinic_common').is_dir():
+    sys.path.append(str(BASE_DIR.parent))
+
 # SECURITY WARNING: keep the secret key used in production secret!
 SECRET_KEY = os.getenv('DJANGO_SECRET_KEY', 'django-insecure-medical-records-service-key')
 
@@ -143,10 +148,47 @@ SWAGGER_SETTINGS = {
 AUTH_SERVICE_URL = os.getenv('AUTH_SERVICE_URL', 'http://localhost:8001')
 USERS_SERVICE_URL = os.getenv('USERS_SERVICE_URL', 'http://localhost:8002')
 
+# Verificación de JWT: 'remote' consulta a auth-service en cada request,
+# 'local' valida firma y expiración con la llave compartida o el JWKS publicado
+JWT_VERIFICATION_MODE = os.getenv('JWT_VERIFICATION_MODE', 'remote')
+JWT_ALGORITHM = os.getenv('JWT_ALGORITHM', 'HS256')
+JWT_SIGNING_KEY = os.getenv('JWT_SECRET_KEY', 'your-super-secret-jwt-key')
+JWT_JWK_URL = os.getenv('JWT_JWK_URL') or None
+# Métodos HTTP que, aun en modo local, verifican revocación con auth-service
+JWT_REVOCATION_CHECK_METHODS = [m for m in os.getenv('JWT_REVOCATION_CHECK_METHODS', '').split(',') if m]
+
+# Caché de tokens verificados por auth-service (LRU por proceso + nivel Redis opcional)
+JWT_CACHE_TTL = int(os.getenv('JWT_CACHE_TTL', '300'))  # segundos
+JWT_CACHE_MAX_SIZE = int(os.getenv('JWT_CACHE_MAX_SIZE', '10000'))
+JWT_CACHE_REDIS_URL = os.getenv('JWT_CACHE_REDIS_URL') or None
+JWT_CACHE_SHARED = os.getenv('JWT_CACHE_SHARED', 'False') == 'True'
+TOKEN_INVALIDATION_CHANNEL = os.getenv('TOKEN_INVALIDATION_CHANNEL', 'auth:token-invalidation')
+
+# Cliente HTTP entre microservicios: pool keep-alive por servicio, reintentos
+# con jitter para llamadas idempotentes y circuit breaker por dependencia
+SERVICE_HTTP_CLIENT = {
+    'timeout': float(os.getenv('SERVICE_HTTP_TIMEOUT', '5')),
+    'retries': int(os.getenv('SERVICE_HTTP_RETRIES', '2')),
+    'backoff': float(os.getenv('SERVICE_HTTP_BACKOFF', '0.1')),
+    'pool_size': int(os.getenv('SERVICE_HTTP_POOL_SIZE', '10')),
+    'failure_threshold': int(os.getenv('SERVICE_HTTP_FAILURE_THRESHOLD', '5')),
+    'reset_timeout': float(os.getenv('SERVICE_HTTP_RESET_TIMEOUT', '30')),
+}
+
 # File upload settings
 FILE_UPLOAD_MAX_MEMORY_SIZE = 10 * 1024 * 1024  # 10MB
 DATA_UPLOAD_MAX_MEMORY_SIZE = 10 * 1024 * 1024  # 10MB
 
 # Allowed file types for medical records
 ALLOWED_FILE_EXTENSIONS = ['pdf', 'jpg', 'jpeg', 'png']
-MAX_FILE_SIZE = 10 * 1024 * 1024  # 10MB 
\ No newline at end of file
+MAX_FILE_SIZE = 10 * 1024 * 1024  # 10MB
+
+# Descargas de archivos médicos: con un prefijo (location `internal` de nginx
+# sobre MEDIA_ROOT) Django solo autoriza y nginx envía el archivo
+MEDICAL_FILES_ACCEL_REDIRECT_PREFIX = os.getenv('MEDICAL_FILES_ACCEL_REDIRECT_PREFIX', '')
+
+# Subidas por partes de archivos grandes (estudios de imagen)
+MEDICAL_UPLOAD_SESSIONS_DIR = os.getenv('MEDICAL_UPLOAD_SESSIONS_DIR', os.path.join(BASE_DIR, 'upload_sessions'))
+MEDICAL_UPLOAD_CHUNK_SIZE = int(os.getenv('MEDICAL_UPLOAD_CHUNK_SIZE', str(5 * 1024 * 1024)))  # 5MB
+MEDICAL_UPLOAD_MAX_SIZE = int(os.getenv('MEDICAL_UPLOAD_MAX_SIZE', str(2 * 1024 * 1024 * 1024)))  # 2GB
+MEDICAL_UPLOAD_SESSION_TTL_HOURS = int(os.getenv('MEDICAL_UPLOAD_SESSION_TTL_HOURS', '48'))
@@ -1,5 +1,6 @@
 from django.contrib import admin
 from django.urls import path, include
+from medical_records_service.views import TokenCacheStatsView, ServiceDependencyStatsView
 from django.conf import settings
 from django.conf.urls.static import static
 from rest_framework import permissions
@@ -23,6 +24,8 @@ urlpatterns = [
     path('admin/', admin.site.urls),
     path('api/medical-records/', include('medical_records.urls')),
     path('api/', include('consultations.urls')),
+    path('api/token-cache/stats/', TokenCacheStatsView.as_view(), name='token-cache-stats'),
+    path('api/dependencies/stats/', ServiceDependencyStatsView.as_view(), name='dependency-stats'),
     path('api/docs/', schema_view.with_ui('swagger', cache_timeout=0), name='schema-swagger-ui'),
     path('api/redoc/', schema_view.with_ui('redoc', cache_timeout=0), name='schema-redoc'),
 ]
@@ -110,6 +110,10 @@ class Medication(models.Model):
         verbose_name = _('Medicamento')
         verbose_name_plural = _('Medicamentos')
         ordering = ['name']
+        indexes = [
+            # Vencidos y por vencer
+            models.Index(fields=['expiration_date', 'is_active'], name='med_expiration_active_idx'),
+        ]
 
     def __str__(self):
         return f"{self.name} ({self.concentration})"
@@ -186,6 +190,11 @@ class StockMovement(models.Model):
         verbose_name = _('Movimiento de Stock')
         verbose_name_plural = _('Movimientos de Stock')
         ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['medication', 'movement_type', 'created_at'], name='stock_med_type_created_idx'),
+            # Reporte de ventas por periodo
+            models.Index(fields=['movement_type', 'created_at'], name='stock_type_created_idx'),
+        ]
 
     def __str__(self):
         return f"{self.get_movement_type_display()} - {self.medication.name} ({self.quantity})" 
\ No newline at end of file
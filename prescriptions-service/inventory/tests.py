@@ -0,0 +1,44 @@
+from datetime import date, timedelta
+from django.utils import timezone
+from rest_framework.test import APITestCase
+from prescriptions_service.authentication import AuthenticatedUser
+from .models import Medication, StockMovement
+
+class StockMovementQueryPlanTest(APITestCase):
+    """Regresiones de número de consultas y uso de índices en movimientos de stock"""
+
+    def setUp(self):
+        self.client.force_authenticate(user=AuthenticatedUser({'id': 1, 'role': 'Admin'}))
+        self.medication = Medication.objects.create(
+            name='Amoxicilina', generic_name='Amoxicilina', active_ingredient='Amoxicilina',
+            concentration='500mg', medication_type='TABLETA', manufacturer='Lab',
+            unit_price=10, expiration_date=date.today() + timedelta(days=365), created_by=1
+        )
+        for _ in range(3):
+            StockMovement.objects.create(
+                medication=self.medication, movement_type='VENTA', quantity=-1,
+                unit_cost=10, stock_after=0, created_by=1
+            )
+
+    def test_list_by_medication_and_date(self):
+        """Test listado por medicamento y fecha no consulta el medicamento por fila"""
+        today = date.today().isoformat()
+        with self.assertNumQueries(2):
+            response = self.client.get('/api/v1/inventory/stock-movements/', {
+                'medication_id': self.medication.id, 'movement_type': 'VENTA',
+                'start_date': today, 'end_date': today,
+            })
+        self.assertEqual(response.data['count'], 3)
+        self.assertIn(
+            'stock_med_type_created_idx',
+            StockMovement.objects.filter(
+                medication=self.medication, movement_type='VENTA'
+            ).order_by('-created_at').explain()
+        )
+
+    def test_sales_report_uses_index(self):
+        """Test reporte de ventas por periodo"""
+        self.assertIn(
+            'stock_type_created_idx',
+            StockMovement.objects.filter(movement_type='VENTA', created_at__gte=timezone.now()).explain()
+        )
@@ -6,6 +6,7 @@ from django.db import models
 from django.db.models import Sum, Count
 from datetime import date, timedelta
 from .models import MedicationCategory, Medication, StockMovement
+from prescriptions_service.query_utils import date_range_lookups
 from .serializers import (
     MedicationCategorySerializer, MedicationListSerializer, MedicationDetailSerializer,
     MedicationCreateUpdateSerializer, StockMovementSerializer
@@ -205,7 +206,7 @@ class MedicationViewSet(viewsets.ModelViewSet):
         return Response(report_data)
 
 class StockMovementViewSet(viewsets.ModelViewSet):
-    queryset = StockMovement.objects.all()
+    queryset = StockMovement.objects.select_related('medication')
     serializer_class = StockMovementSerializer
     filter_backends = [DjangoFilterBackend, filters.OrderingFilter]
     filterset_fields = ['medication', 'movement_type', 'created_by', 'prescription_id']
@@ -223,10 +224,7 @@ class StockMovementViewSet(viewsets.ModelViewSet):
         start_date = self.request.query_params.get('start_date')
         end_date = self.request.query_params.get('end_date')
         
-        if start_date:
-            queryset = queryset.filter(created_at__date__gte=start_date)
-        if end_date:
-            queryset = queryset.filter(created_at__date__lte=end_date)
+        queryset = queryset.filter(**date_range_lookups('created_at', start_date, end_date))
         
         return queryset
 
@@ -259,8 +257,7 @@ class StockMovementViewSet(viewsets.ModelViewSet):
         
         sales_movements = self.get_queryset().filter(
             movement_type='VENTA',
-            created_at__date__gte=start_date,
-            created_at__date__lte=end_date
+            **date_range_lookups('created_at', start_date, end_date)
         )
         
         # Calcular estadísticas
@@ -83,6 +83,12 @@ class Prescription(models.Model):
         verbose_name = _('Receta')
         verbose_name_plural = _('Recetas')
         ordering = ['-issue_date']
+        indexes = [
+            models.Index(fields=['veterinarian_id', '-issue_date'], name='rx_vet_issue_idx'),
+            models.Index(fields=['patient_id', '-issue_date'], name='rx_patient_issue_idx'),
+            # Recetas por vencer (expiring_soon)
+            models.Index(fields=['status', 'expiration_date'], name='rx_status_expiration_idx'),
+        ]
 
     def __str__(self):
         return f"Receta {self.prescription_number} - Paciente {self.patient_id}"
@@ -241,6 +247,9 @@ class PrescriptionDispensation(models.Model):
         verbose_name = _('Dispensación')
         verbose_name_plural = _('Dispensaciones')
         ordering = ['-dispensation_date']
+        indexes = [
+            models.Index(fields=['-dispensation_date'], name='dispensation_date_idx'),
+        ]
 
     def __str__(self):
         return f"Dispensación {self.id} - Receta {self.prescription.prescription_number}"
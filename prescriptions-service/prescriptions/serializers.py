@@ -68,6 +68,8 @@ class PrescriptionListSerializer(serializers.ModelSerializer):
         )
 
     def get_items_count(self, obj):
+        if hasattr(obj, 'items_total'):
+            return obj.items_total
         return obj.items.count()
 
 class PrescriptionDetailSerializer(serializers.ModelSerializer):
@@ -0,0 +1,50 @@
+from datetime import date, timedelta
+from rest_framework.test import APITestCase
+from prescriptions_service.authentication import AuthenticatedUser
+from inventory.models import Medication
+from .models import Prescription, PrescriptionItem
+
+class PrescriptionQueryPlanTest(APITestCase):
+    """Regresiones de número de consultas y uso de índices en recetas"""
+
+    def setUp(self):
+        self.client.force_authenticate(user=AuthenticatedUser({'id': 7, 'role': 'Veterinario'}))
+        medication = Medication.objects.create(
+            name='Amoxicilina', generic_name='Amoxicilina', active_ingredient='Amoxicilina',
+            concentration='500mg', medication_type='TABLETA', manufacturer='Lab',
+            unit_price=10, expiration_date=date.today() + timedelta(days=365), created_by=1
+        )
+        for _ in range(3):
+            prescription = Prescription.objects.create(
+                patient_id=1, owner_id=1, veterinarian_id=7, diagnosis='Otitis',
+                expiration_date=date.today() + timedelta(days=30), veterinarian_license='123'
+            )
+            PrescriptionItem.objects.create(
+                prescription=prescription, medication=medication, quantity_prescribed=1,
+                dosage='1', frequency='c/12h', duration='7 días', administration_route='Oral',
+                unit_price=10
+            )
+
+    def assertUsesIndex(self, queryset, index_name):
+        self.assertIn(index_name, queryset.explain())
+
+    def test_list_by_veterinarian_and_date(self):
+        """Test listado del veterinario por rango de emisión: conteo y página con items"""
+        today = date.today().isoformat()
+        with self.assertNumQueries(2):
+            response = self.client.get('/api/v1/prescriptions/prescriptions/', {
+                'start_date': today, 'end_date': today,
+            })
+        self.assertEqual(response.data['count'], 3)
+        self.assertEqual(response.data['results'][0]['items_count'], 1)
+        self.assertUsesIndex(
+            Prescription.objects.filter(veterinarian_id=7).order_by('-issue_date'),
+            'rx_vet_issue_idx'
+        )
+
+    def test_expiring_soon_uses_index(self):
+        """Test recetas por vencer"""
+        self.assertUsesIndex(
+            Prescription.objects.filter(status='EMITIDA', expiration_date__lte=date.today()),
+            'rx_status_expiration_idx'
+        )
@@ -2,6 +2,7 @@ from rest_framework import viewsets, status, filters
 from rest_framework.response import Response
 from rest_framework.decorators import action
 from django_filters.rest_framework import DjangoFilterBackend
+from django.db.models import Count
 from datetime import datetime, date, timedelta
 from .models import Prescription, PrescriptionItem, PrescriptionDispensation, PrescriptionDispensationItem
 from .serializers import (
@@ -9,6 +10,7 @@ from .serializers import (
     PrescriptionItemSerializer, PrescriptionDispensationSerializer
 )
 from .utils import generate_prescription_pdf_response
+from prescriptions_service.query_utils import date_range_lookups
 
 class PrescriptionViewSet(viewsets.ModelViewSet):
     queryset = Prescription.objects.all()
@@ -43,10 +45,11 @@ class PrescriptionViewSet(viewsets.ModelViewSet):
         start_date = self.request.query_params.get('start_date')
         end_date = self.request.query_params.get('end_date')
         
-        if start_date:
-            queryset = queryset.filter(issue_date__date__gte=start_date)
-        if end_date:
-            queryset = queryset.filter(issue_date__date__lte=end_date)
+        queryset = queryset.filter(**date_range_lookups('issue_date', start_date, end_date))
+        
+        # Conteo de medicamentos en la misma consulta del listado
+        if self.action in ['list', 'expiring_soon', 'my_prescriptions']:
+            queryset = queryset.annotate(items_total=Count('items'))
         
         return queryset
 
@@ -246,7 +249,9 @@ class PrescriptionDispensationViewSet(viewsets.ModelViewSet):
                 status=status.HTTP_400_BAD_REQUEST
             )
         
-        dispensations = self.get_queryset().filter(dispensation_date__date=report_date)
+        dispensations = self.get_queryset().filter(
+            **date_range_lookups('dispensation_date', report_date, report_date)
+        )
         
         # Calcular estadísticas
         total_dispensations = dispensations.count()
@@ -1,5 +1,6 @@
 from django.contrib import admin
 from django.urls import path, include
+from prescriptions_service.views import TokenCacheStatsView, ServiceDependencyStatsView
 from django.conf import settings
 from django.conf.urls.static import static
 from drf_spectacular.views import (
@@ -19,6 +20,8 @@ urlpatterns = [
     # APIs principales
     path('api/v1/prescriptions/', include('prescriptions.urls')),
     path('api/v1/inventory/', include('inventory.urls')),
+    path('api/v1/token-cache/stats/', TokenCacheStatsView.as_view(), name='token-cache-stats'),
+    path('api/v1/dependencies/stats/', ServiceDependencyStatsView.as_view(), name='dependency-stats'),
 ]
 
 # Servir archivos media en desarrollo
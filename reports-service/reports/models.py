@@ -80,6 +80,9 @@ class ReportExecution(models.Model):
         verbose_name = 'Ejecución de Reporte'
         verbose_name_plural = 'Ejecuciones de Reportes'
         ordering = ['-requested_at']
+        indexes = [
+            models.Index(fields=['requested_by', '-requested_at'], name='execution_user_requested_idx'),
+        ]
     
     def __str__(self):
         return f"{self.name} - {self.status}"
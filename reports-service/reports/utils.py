@@ -18,6 +18,10 @@ import openpyxl
 from openpyxl.styles import Font, PatternFill, Alignment, Border, Side
 from openpyxl.utils.dataframe import dataframe_to_rows
 import pandas as pd
+from clinic_common.http_client import get_client
+
+# Timeout (conexión, lectura) en segundos al consultar otros microservicios
+EXTERNAL_DATA_TIMEOUT = (2, 30)
 
 class ReportGenerator:
     """
@@ -67,13 +71,13 @@ class ReportGenerator:
         
         return data_sources
     
-    def _fetch_users_data(self):
-        """Obtener datos del microservicio de usuarios"""
+    def _fetch_service_data(self, service, path):
+        """Obtener datos de un microservicio con el cliente HTTP compartido"""
         try:
-            response = requests.get(
-                f"{settings.USERS_SERVICE_URL}/api/v1/owners/",
+            response = get_client(service).get(
+                path,
                 params=self.parameters,
-                timeout=30
+                timeout=EXTERNAL_DATA_TIMEOUT
             )
             if response.status_code == 200:
                 return response.json()
@@ -81,47 +85,21 @@ class ReportGenerator:
             pass
         return []
     
+    def _fetch_users_data(self):
+        """Obtener datos del microservicio de usuarios"""
+        return self._fetch_service_data('users', '/api/v1/owners/')
+    
     def _fetch_appointments_data(self):
         """Obtener datos del microservicio de citas"""
-        try:
-            response = requests.get(
-                f"{settings.APPOINTMENTS_SERVICE_URL}/api/v1/appointments/",
-                params=self.parameters,
-                timeout=30
-            )
-            if response.status_code == 200:
-                return response.json()
-        except requests.RequestException:
-            pass
-        return []
+        return self._fetch_service_data('appointments', '/api/v1/appointments/')
     
     def _fetch_medical_records_data(self):
         """Obtener datos del microservicio de historias clínicas"""
-        try:
-            response = requests.get(
-                f"{settings.MEDICAL_RECORDS_SERVICE_URL}/api/v1/medical-records/",
-                params=self.parameters,
-                timeout=30
-            )
-            if response.status_code == 200:
-                return response.json()
-        except requests.RequestException:
-            pass
-        return []
+        return self._fetch_service_data('medical_records', '/api/v1/medical-records/')
     
     def _fetch_prescriptions_data(self):
         """Obtener datos del microservicio de recetas"""
-        try:
-            response = requests.get(
-                f"{settings.PRESCRIPTIONS_SERVICE_URL}/api/v1/prescriptions/prescriptions/",
-                params=self.parameters,
-                timeout=30
-            )
-            if response.status_code == 200:
-                return response.json()
-        except requests.RequestException:
-            pass
-        return []
+        return self._fetch_service_data('prescriptions', '/api/v1/prescriptions/prescriptions/')
     
     def generate_pdf(self, filename):
         """Generar reporte en PDF"""
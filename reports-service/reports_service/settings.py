@@ -12,10 +12,15 @@ https://docs.djangoproject.com/en/5.2/ref/settings/
 
 from pathlib import Path
 import os
+import sys
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
 
+# Paquete clinic_common: en Docker se copia dentro del servicio, en local está en la raíz del repositorio
+if not (BASE_DIR / 'clinic_common').is_dir():
+    sys.path.append(str(BASE_DIR.parent))
+
 
 # Quick-start development settings - unsuitable for production
 # See https://docs.djangoproject.com/en/5.2/howto/deployment/checklist/
@@ -207,6 +212,33 @@ SPECTACULAR_SETTINGS = {
 # Auth service configuration
 AUTH_SERVICE_URL = os.environ.get('AUTH_SERVICE_URL', 'http://auth-service:8001')
 
+# Verificación de JWT: 'remote' consulta a auth-service en cada request,
+# 'local' valida firma y expiración con la llave compartida o el JWKS publicado
+JWT_VERIFICATION_MODE = os.environ.get('JWT_VERIFICATION_MODE', 'remote')
+JWT_ALGORITHM = os.environ.get('JWT_ALGORITHM', 'HS256')
+JWT_SIGNING_KEY = os.environ.get('JWT_SECRET_KEY', 'your-super-secret-jwt-key')
+JWT_JWK_URL = os.environ.get('JWT_JWK_URL') or None
+# Métodos HTTP que, aun en modo local, verifican revocación con auth-service
+JWT_REVOCATION_CHECK_METHODS = [m for m in os.environ.get('JWT_REVOCATION_CHECK_METHODS', '').split(',') if m]
+
+# Caché de tokens verificados por auth-service (LRU por proceso + nivel Redis opcional)
+JWT_CACHE_TTL = int(os.environ.get('JWT_CACHE_TTL', '300'))  # segundos
+JWT_CACHE_MAX_SIZE = int(os.environ.get('JWT_CACHE_MAX_SIZE', '10000'))
+JWT_CACHE_REDIS_URL = os.environ.get('JWT_CACHE_REDIS_URL') or None
+JWT_CACHE_SHARED = os.environ.get('JWT_CACHE_SHARED', 'False') == 'True'
+TOKEN_INVALIDATION_CHANNEL = os.environ.get('TOKEN_INVALIDATION_CHANNEL', 'auth:token-invalidation')
+
+# Cliente HTTP entre microservicios: pool keep-alive por servicio, reintentos
+# con jitter para llamadas idempotentes y circuit breaker por dependencia
+SERVICE_HTTP_CLIENT = {
+    'timeout': float(os.environ.get('SERVICE_HTTP_TIMEOUT', '5')),
+    'retries': int(os.environ.get('SERVICE_HTTP_RETRIES', '2')),
+    'backoff': float(os.environ.get('SERVICE_HTTP_BACKOFF', '0.1')),
+    'pool_size': int(os.environ.get('SERVICE_HTTP_POOL_SIZE', '10')),
+    'failure_threshold': int(os.environ.get('SERVICE_HTTP_FAILURE_THRESHOLD', '5')),
+    'reset_timeout': float(os.environ.get('SERVICE_HTTP_RESET_TIMEOUT', '30')),
+}
+
 # Other microservices URLs
 USERS_SERVICE_URL = os.environ.get('USERS_SERVICE_URL', 'http://users-service:8002')
 APPOINTMENTS_SERVICE_URL = os.environ.get('APPOINTMENTS_SERVICE_URL', 'http://appointments-service:8003')
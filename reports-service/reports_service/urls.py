@@ -16,6 +16,7 @@ Including another URLconf
 """
 from django.contrib import admin
 from django.urls import path, include
+from reports_service.views import TokenCacheStatsView, ServiceDependencyStatsView
 from django.conf import settings
 from django.conf.urls.static import static
 from drf_spectacular.views import (
@@ -34,6 +35,8 @@ urlpatterns = [
     
     # APIs principales
     path('api/v1/', include('reports.urls')),
+    path('api/v1/token-cache/stats/', TokenCacheStatsView.as_view(), name='token-cache-stats'),
+    path('api/v1/dependencies/stats/', ServiceDependencyStatsView.as_view(), name='dependency-stats'),
 ]
 
 # Servir archivos media en desarrollo
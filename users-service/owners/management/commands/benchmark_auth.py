@@ -0,0 +1,41 @@
+import time
+from django.core.management.base import BaseCommand, CommandError
+from django.test import Client, override_settings
+
+class Command(BaseCommand):
+    help = 'Comparar requests por segundo de un listado autenticado con verificación JWT remota y local'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--token', required=True, help='Access token emitido por auth-service')
+        parser.add_argument('--requests', type=int, default=200, help='Número de requests por modo')
+        parser.add_argument('--path', default='/api/owners/', help='Endpoint de listado a medir')
+
+    def handle(self, *args, **options):
+        client = Client()
+        headers = {'HTTP_AUTHORIZATION': f"Bearer {options['token']}"}
+        total = options['requests']
+        results = {}
+
+        for mode in ('remote', 'local'):
+            with override_settings(JWT_VERIFICATION_MODE=mode):
+                # Request de calentamiento para validar el token y cargar conexiones
+                response = client.get(options['path'], **headers)
+                if response.status_code != 200:
+                    raise CommandError(
+                        f'El endpoint respondió {response.status_code} en modo {mode}'
+                    )
+
+                start = time.perf_counter()
+                for _ in range(total):
+                    client.get(options['path'], **headers)
+                elapsed = time.perf_counter() - start
+
+            results[mode] = total / elapsed
+            self.stdout.write(
+                f'{mode:>6}: {results[mode]:.1f} req/s '
+                f'({elapsed * 1000 / total:.2f} ms por request)'
+            )
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Verificación local: {results['local'] / results['remote']:.1f}x más rápida"
+        ))
@@ -65,6 +65,9 @@ class Owner(models.Model):
         verbose_name = _('Propietario')
         verbose_name_plural = _('Propietarios')
         ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['is_active', '-created_at'], name='owner_active_created_idx'),
+        ]
 
     def __str__(self):
         return f"{self.first_name} {self.last_name} - {self.document_number}"
@@ -94,6 +94,9 @@ class Patient(models.Model):
         verbose_name = _('Paciente')
         verbose_name_plural = _('Pacientes')
         ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['is_active', '-created_at'], name='patient_active_created_idx'),
+        ]
 
     def __str__(self):
         return f"{self.name} - {self.species} ({self.owner.get_full_name()})"
@@ -143,6 +146,11 @@ class Vaccination(models.Model):
         verbose_name = _('Vacunación')
         verbose_name_plural = _('Vacunaciones')
         ordering = ['-vaccination_date']
+        indexes = [
+            models.Index(fields=['patient', '-vaccination_date'], name='vacc_patient_date_idx'),
+            # Próximas vacunaciones
+            models.Index(fields=['next_vaccination_date'], name='vacc_next_date_idx'),
+        ]
 
     def __str__(self):
         return f"{self.vaccine_name} - {self.patient.name} ({self.vaccination_date})" 
\ No newline at end of file
@@ -0,0 +1,46 @@
+from datetime import date, timedelta
+from django.test import TestCase
+from owners.models import Owner
+from patients.models import Patient, Vaccination
+from patients.serializers import PatientListSerializer, VaccinationSerializer
+from patients.views import PatientViewSet, VaccinationViewSet
+
+class VaccinationQueryPlanTest(TestCase):
+    """Regresiones de número de consultas y uso de índices en pacientes y vacunaciones"""
+
+    def setUp(self):
+        owner = Owner.objects.create(
+            document_number='123', first_name='Ana', last_name='Pérez',
+            email='ana@example.com', phone='5550000000', address='Calle 1', city='Bogotá'
+        )
+        for number in range(3):
+            patient = Patient.objects.create(
+                name=f'Paciente {number}', species='PERRO', breed='Mestizo', gender='M',
+                size='MEDIANO', color='Café', birth_date=date(2020, 1, 1), weight=20,
+                microchip_number=f'MC{number}', owner=owner
+            )
+            Vaccination.objects.create(
+                patient=patient, vaccine_name='Rabia', vaccination_date=date.today(),
+                next_vaccination_date=date.today() + timedelta(days=365), veterinarian='Dr. Ruiz'
+            )
+
+    def test_vaccination_list_constant_queries(self):
+        """Test el listado de vacunaciones no consulta el paciente por fila"""
+        with self.assertNumQueries(1):
+            data = VaccinationSerializer(VaccinationViewSet.queryset.all(), many=True).data
+        self.assertEqual(len(data), 3)
+
+    def test_patient_list_constant_queries(self):
+        """Test el listado de pacientes no consulta el propietario por fila"""
+        with self.assertNumQueries(1):
+            data = PatientListSerializer(PatientViewSet.queryset.all(), many=True).data
+        self.assertEqual(len(data), 3)
+
+    def test_upcoming_vaccinations_use_index(self):
+        """Test próximas vacunaciones por rango de fecha"""
+        self.assertIn(
+            'vacc_next_date_idx',
+            Vaccination.objects.filter(
+                next_vaccination_date__range=(date.today(), date.today() + timedelta(days=30))
+            ).explain()
+        )
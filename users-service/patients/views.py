@@ -9,7 +9,7 @@ from .serializers import (
 )
 
 class PatientViewSet(viewsets.ModelViewSet):
-    queryset = Patient.objects.filter(is_active=True)
+    queryset = Patient.objects.filter(is_active=True).select_related('owner')
     serializer_class = PatientSerializer
     filter_backends = [DjangoFilterBackend, filters.SearchFilter, filters.OrderingFilter]
     filterset_fields = ['species', 'gender', 'size', 'is_neutered', 'owner', 'is_alive']
@@ -87,7 +87,7 @@ class PatientViewSet(viewsets.ModelViewSet):
         return Response(serializer.data)
 
 class VaccinationViewSet(viewsets.ModelViewSet):
-    queryset = Vaccination.objects.all()
+    queryset = Vaccination.objects.select_related('patient')
     serializer_class = VaccinationSerializer
     filter_backends = [DjangoFilterBackend, filters.SearchFilter, filters.OrderingFilter]
     filterset_fields = ['patient', 'vaccine_name', 'veterinarian']
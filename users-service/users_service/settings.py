@@ -1,9 +1,14 @@
 import os
+import sys
 from pathlib import Path
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
 
+# Paquete clinic_common: en Docker se copia dentro del servicio, en local está en la raíz del repositorio
+if not (BASE_DIR / 'clinic_common').is_dir():
+    sys.path.append(str(BASE_DIR.parent))
+
 # SECURITY WARNING: keep the secret key used in production secret!
 SECRET_KEY = os.getenv('DJANGO_SECRET_KEY', 'django-insecure-users-service-key')
 
@@ -136,4 +141,31 @@ SWAGGER_SETTINGS = {
 }
 
 # Microservices URLs
-AUTH_SERVICE_URL = os.getenv('AUTH_SERVICE_URL', 'http://localhost:8001') 
\ No newline at end of file
+AUTH_SERVICE_URL = os.getenv('AUTH_SERVICE_URL', 'http://localhost:8001') 
+
+# Verificación de JWT: 'remote' consulta a auth-service en cada request,
+# 'local' valida firma y expiración con la llave compartida o el JWKS publicado
+JWT_VERIFICATION_MODE = os.getenv('JWT_VERIFICATION_MODE', 'remote')
+JWT_ALGORITHM = os.getenv('JWT_ALGORITHM', 'HS256')
+JWT_SIGNING_KEY = os.getenv('JWT_SECRET_KEY', 'your-super-secret-jwt-key')
+JWT_JWK_URL = os.getenv('JWT_JWK_URL') or None
+# Métodos HTTP que, aun en modo local, verifican revocación con auth-service
+JWT_REVOCATION_CHECK_METHODS = [m for m in os.getenv('JWT_REVOCATION_CHECK_METHODS', '').split(',') if m]
+
+# Caché de tokens verificados por auth-service (LRU por proceso + nivel Redis opcional)
+JWT_CACHE_TTL = int(os.getenv('JWT_CACHE_TTL', '300'))  # segundos
+JWT_CACHE_MAX_SIZE = int(os.getenv('JWT_CACHE_MAX_SIZE', '10000'))
+JWT_CACHE_REDIS_URL = os.getenv('JWT_CACHE_REDIS_URL') or None
+JWT_CACHE_SHARED = os.getenv('JWT_CACHE_SHARED', 'False') == 'True'
+TOKEN_INVALIDATION_CHANNEL = os.getenv('TOKEN_INVALIDATION_CHANNEL', 'auth:token-invalidation')
+
+# Cliente HTTP entre microservicios: pool keep-alive por servicio, reintentos
+# con jitter para llamadas idempotentes y circuit breaker por dependencia
+SERVICE_HTTP_CLIENT = {
+    'timeout': float(os.getenv('SERVICE_HTTP_TIMEOUT', '5')),
+    'retries': int(os.getenv('SERVICE_HTTP_RETRIES', '2')),
+    'backoff': float(os.getenv('SERVICE_HTTP_BACKOFF', '0.1')),
+    'pool_size': int(os.getenv('SERVICE_HTTP_POOL_SIZE', '10')),
+    'failure_threshold': int(os.getenv('SERVICE_HTTP_FAILURE_THRESHOLD', '5')),
+    'reset_timeout': float(os.getenv('SERVICE_HTTP_RESET_TIMEOUT', '30')),
+}
\ No newline at end of file
@@ -1,5 +1,6 @@
 from django.contrib import admin
 from django.urls import path, include
+from users_service.views import TokenCacheStatsView, ServiceDependencyStatsView
 from rest_framework import permissions
 from drf_yasg.views import get_schema_view
 from drf_yasg import openapi
@@ -21,6 +22,8 @@ urlpatterns = [
     path('admin/', admin.site.urls),
     path('api/owners/', include('owners.urls')),
     path('api/patients/', include('patients.urls')),
+    path('api/token-cache/stats/', TokenCacheStatsView.as_view(), name='token-cache-stats'),
+    path('api/dependencies/stats/', ServiceDependencyStatsView.as_view(), name='dependency-stats'),
     path('api/docs/', schema_view.with_ui('swagger', cache_timeout=0), name='schema-swagger-ui'),
     path('api/redoc/', schema_view.with_ui('redoc', cache_timeout=0), name='schema-redoc'),
 ] 
\ No newline at end of file
@@ -0,0 +1,16 @@
+from rest_framework.response import Response
+from rest_framework.views import APIView
+from clinic_common.http_client import get_clients_stats
+from clinic_common.token_cache import token_cache
+
+class TokenCacheStatsView(APIView):
+    """Contadores de aciertos y fallos del caché de tokens de este proceso"""
+
+    def get(self, request):
+        return Response(token_cache.stats())
+
+class ServiceDependencyStatsView(APIView):
+    """Estado del circuito y latencias por dependencia de este proceso"""
+
+    def get(self, request):
+        return Response(get_clients_stats())